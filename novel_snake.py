@@ -1,11 +1,22 @@
 import json
+import marshal
 import os
+import queue
 import random
+import sqlite3
+import struct
 import sys
+import threading
+import time
+import zlib
 import colorsys
 import math
 from array import array
+from collections import OrderedDict, deque
+from itertools import accumulate
+from operator import add, sub
 
+STARTUP_T0 = time.perf_counter()  # 启动计时（--trace-startup）的起点，放在导入 pygame 之前
 import pygame
 
 def resource_path(relative_path):
@@ -54,6 +65,7 @@ def resource_path(relative_path):
 
 7. 依赖
    - pip install pygame
+   - 批量训练环境 snake_env.py 另需 numpy
 """
 
 
@@ -64,11 +76,41 @@ GRID_HEIGHT = 25  # 网格高度（5的倍数）
 HUD_HEIGHT = 30   # 顶部 HUD 高度
 BOTTOM_BAR_HEIGHT = 30 # 底部提示栏高度
 
-SCREEN_WIDTH = CELL_SIZE * GRID_WIDTH
-SCREEN_HEIGHT = CELL_SIZE * GRID_HEIGHT + HUD_HEIGHT + BOTTOM_BAR_HEIGHT # 屏幕高度 = HUD + 游戏区域 + 底部栏
+# 大地图：窗口最多显示 VIEW_MAX_CELLS x VIEW_MAX_CELLS 格，超出部分由镜头跟随蛇头滚动
+VIEW_MAX_CELLS = 25
+VIEW_WIDTH = min(GRID_WIDTH, VIEW_MAX_CELLS)    # 视口宽度（格）
+VIEW_HEIGHT = min(GRID_HEIGHT, VIEW_MAX_CELLS)  # 视口高度（格）
+CAMERA_FOLLOW = 0.18  # 镜头每帧向目标靠近的比例（1 表示立即跟上）
+RANDOM_CELL_TRIES = 64  # 随机找空格子时先盲抽几次，抽不中再整图扫描
+
+SCREEN_WIDTH = CELL_SIZE * VIEW_WIDTH
+SCREEN_HEIGHT = CELL_SIZE * VIEW_HEIGHT + HUD_HEIGHT + BOTTOM_BAR_HEIGHT # 屏幕高度 = HUD + 游戏区域 + 底部栏
 GAME_AREA_Y = HUD_HEIGHT  # 游戏区域起始Y坐标
 
+
+def configure_board(width, height):
+    """设置地图大小（需在创建 SnakeGame 之前调用），窗口按视口大小重新计算"""
+    global GRID_WIDTH, GRID_HEIGHT, VIEW_WIDTH, VIEW_HEIGHT, SCREEN_WIDTH, SCREEN_HEIGHT
+    GRID_WIDTH = max(BOSS_SIZE + 2, int(width))
+    GRID_HEIGHT = max(BOSS_SIZE + 2, int(height))
+    VIEW_WIDTH = min(GRID_WIDTH, VIEW_MAX_CELLS)
+    VIEW_HEIGHT = min(GRID_HEIGHT, VIEW_MAX_CELLS)
+    SCREEN_WIDTH = CELL_SIZE * VIEW_WIDTH
+    SCREEN_HEIGHT = CELL_SIZE * VIEW_HEIGHT + HUD_HEIGHT + BOTTOM_BAR_HEIGHT
+
 RENDER_FPS = 60             # 渲染帧率，保证输入跟手
+
+# 显示方式：游戏始终画在逻辑分辨率（SCREEN_WIDTH x SCREEN_HEIGHT）的内部画面上，只是交给屏幕的方式不同
+DISPLAY_WINDOW = "window"  # 原生分辨率窗口
+DISPLAY_SCALED = "scaled"  # 全屏 + pygame.SCALED：SDL 用显卡放大，绘制开销与屏幕分辨率无关
+DISPLAY_SMOOTH = "smooth"  # 全屏窗口，每帧把内部画面 smoothscale 一次（保持比例，两边留黑边）
+DISPLAY_MODES = (DISPLAY_WINDOW, DISPLAY_SCALED, DISPLAY_SMOOTH)
+
+# 帧节奏：游戏进行中按 RENDER_FPS；开始界面、暂停、排行榜、输入名字这些静态画面降到 IDLE_FPS 省电
+IDLE_FPS = 20
+PACING_SLEEP = "sleep"  # clock.tick：睡眠等待，省 CPU，误差一两毫秒
+PACING_BUSY = "busy"    # clock.tick_busy_loop：忙等，节奏更准，但等待时占满一个核
+PACING_MODES = (PACING_SLEEP, PACING_BUSY)
 STEP_INTERVAL_MS = 120       # 蛇移动间隔（毫秒），决定实际速度
 
 # -------------------- 赛博朋克配色 --------------------
@@ -91,6 +133,11 @@ GHOST_DURATION = 5_000  # 幽灵模式持续时间（毫秒）
 FOOD_PER_OBSTACLE = 5   # 每吃多少普通食物生成一个障碍
 LEADERBOARD_FILE = "snake_leaderboard.json"  # 排行榜文件
 MAX_LEADERBOARD_ENTRIES = 10  # 排行榜最多保留多少条
+LEADERBOARD_BACKEND = "json"  # 排行榜存储后端："json"（只存前10）或 "sqlite"（保存每一局的完整记录）
+LEADERBOARD_DB_FILE = "snake_leaderboard.db"  # sqlite 后端的数据库文件
+LEADERBOARD_WRITE_QUEUE_SIZE = 16  # 后台写排行榜的队列上限
+LEADERBOARD_FSYNC = True  # 写排行榜后是否 fsync（SD 卡等掉电易丢数据的存储建议开启）
+FONT_CACHE_FILE = "snake_fonts.json"  # 系统字体查找结果的缓存（字体文件路径 + mtime）
 
 # -------------------- 新系统配置 --------------------
 # 道具颜色
@@ -165,6 +212,7 @@ PORTAL_TELEPORT_COOLDOWN_MS = 250
 GHOST_HUNTER_MOVE_INTERVAL_MS = 260
 DAMAGE_SHRINK_SEGMENTS = 5
 SHOCKWAVE_CLEAR_SIZE = 10
+PARTICLE_BUDGET = 2_000  # 同时存在的粒子上限
 SHOCKWAVE_DURATION_MS = 420
 BOSS_KILL_SLOW_DURATION_MS = 2_000
 BOSS_KILL_FLASH_DURATION_MS = 1_000
@@ -182,6 +230,872 @@ DAMAGE_BLINK_DURATION_MS = DAMAGE_BLINK_INTERVAL_MS * DAMAGE_BLINK_COUNT * 2
 
 BOMB_VFX_DURATION_MS = 520
 
+# -------------------- 时钟 --------------------
+# 游戏逻辑统一通过 get_ticks() 取时间；无头模拟时可换成手动推进的时钟
+_tick_source = pygame.time.get_ticks
+
+
+def get_ticks():
+    return _tick_source()
+
+
+def set_tick_source(source=None):
+    """设置毫秒时钟来源；传 None 恢复为 pygame 的真实时钟"""
+    global _tick_source
+    _tick_source = source if source is not None else pygame.time.get_ticks
+
+
+class ManualClock:
+    """手动推进的毫秒时钟（无头模拟 / 批量训练用）"""
+    def __init__(self, start_ms: int = 1_000):
+        # 从非 0 开始：部分逻辑用 0 表示"未开始"
+        self.now = int(start_ms)
+
+    def advance(self, ms):
+        self.now += int(ms)
+        return self.now
+
+    def __call__(self):
+        return self.now
+
+# -------------------- 存档快照 --------------------
+# 格式：固定头（魔数、版本、标志位、存档时的时钟）+ marshal 序列化的状态元组（可选 zlib 压缩）
+SNAPSHOT_MAGIC = b"CSNK"
+SNAPSHOT_VERSION = 2
+SNAPSHOT_FLAG_ZLIB = 1
+SNAPSHOT_HEADER = struct.Struct("<4sHHq")
+
+# 原样保存的对局字段（只含 int / float / str / tuple / list / dict / set）
+SNAPSHOT_FIELDS = (
+    "started", "step_interval_ms", "snake", "direction", "next_direction",
+    "score", "normal_food_eaten", "boss_food_eaten", "boss_spawn_progress",
+    "combo_streak", "combo_multiplier", "grow_pending", "shrink_remaining",
+    "items", "has_spawned_rotten_apple", "has_spawned_bomb", "fog_radius",
+    "portal_pairs", "portal_lookup", "portal_cooldown_color_id",
+    "obstacles", "normal_foods", "energy_foods", "normal_food_meta", "energy_food_meta",
+    "energy", "ghost_mode",
+    "glow_effect_active", "glow_effect_color", "glow_effect_duration",
+    "shockwave_active", "shockwave_color", "shockwave_center",
+    "score_anim_from", "score_anim_to",
+    "game_over", "game_over_reason", "paused", "paused_time_accum",
+)
+
+# 绝对时间戳字段：读档时按"当前时钟 - 存档时钟"整体平移（0 / None 表示未发生，保持不变）
+SNAPSHOT_TIME_FIELDS = (
+    "last_move_time", "last_food_eat_time", "combo_display_until",
+    "next_item_spawn_time", "reverse_controls_until", "rainbow_until", "last_shrink_time",
+    "magnet_active_until", "magnet_anim_start", "next_magnet_pull_time",
+    "next_fog_zone_refresh_time", "fog_active_until",
+    "next_portal_refresh_time", "portal_cooldown_until", "next_spike_refresh_time",
+    "next_shadow_spawn_time", "next_ghost_spawn_time", "last_ghost_hunter_move_time",
+    "ghost_end_time", "glow_effect_start", "shockwave_start_time",
+    "boss_kill_slow_until", "boss_kill_slow_start", "boss_kill_flash_until", "boss_kill_flash_start",
+    "damage_slow_until", "damage_blink_start", "damage_blink_until",
+    "score_anim_start", "score_anim_end", "score_burst_until", "score_burst_start",
+    "run_start_time", "run_end_time", "pause_started_at",
+)
+
+
+# -------------------- 字体 --------------------
+FONT_CACHE_VERSION = 1
+
+
+def make_font(path, size: int, fake_bold: bool = False):
+    font = pygame.font.Font(path, size)
+    if fake_bold:
+        font.set_bold(True)
+    return font
+
+
+class FontCache:
+    """记住 SysFont 找到的字体文件：Linux 上每次 SysFont 都要枚举全部系统字体（装了 CJK 字体要几百毫秒），
+    命中缓存且文件 mtime 没变时直接 Font(path) 打开，跳过枚举"""
+    def __init__(self, path: str = FONT_CACHE_FILE):
+        self.path = path
+        self.fonts = {}
+        self.dirty = False
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == FONT_CACHE_VERSION and isinstance(data.get("fonts"), dict):
+                self.fonts = data["fonts"]
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def font(self, candidates, size: int, bold: bool = False):
+        key = ",".join(candidates) + (":bold" if bold else "")
+        entry = self.fonts.get(key)
+        if entry:
+            try:
+                if os.path.getmtime(entry["path"]) == entry["mtime"]:
+                    return make_font(entry["path"], size, entry["fake_bold"])
+            except (OSError, KeyError, TypeError, pygame.error):
+                pass
+            del self.fonts[key]
+            self.dirty = True
+
+        found = {}
+
+        def constructor(path, size, set_bold, set_italic):
+            found["path"] = path
+            found["fake_bold"] = set_bold
+            return make_font(path, size, set_bold)
+
+        font = pygame.font.SysFont(candidates, size, bold=bold, constructor=constructor)
+        # 一个候选都没找到时用的是 pygame 自带字体，不缓存，下次启动再找
+        if found.get("path"):
+            self.fonts[key] = {"path": found["path"], "mtime": os.path.getmtime(found["path"]),
+                               "fake_bold": found["fake_bold"]}
+            self.dirty = True
+        return font
+
+    def save(self):
+        if not self.dirty:
+            return
+        tmp_path = self.path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"version": FONT_CACHE_VERSION, "fonts": self.fonts}, f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.path)
+            self.dirty = False
+        except OSError as e:
+            print(f"保存字体缓存失败: {e}")
+
+
+# -------------------- 精灵缓存 --------------------
+SPRITE_ATLAS_MAX = 1024  # 最多缓存多少张预渲染的小图，超出时淘汰最久没用的
+SPRITE_COLOR_STEP = 8    # 颜色按 8 级取整，渐变 / 彩虹色相近的节共用一张图
+SPRITE_ALPHA_STEP = 15
+
+
+class SpriteAtlas:
+    """按 key 缓存预渲染好的小图（LRU）：同样外观的东西只画一次，之后每帧一次 blit"""
+    def __init__(self, max_entries: int = SPRITE_ATLAS_MAX):
+        self.max_entries = max_entries
+        self.sprites = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, render):
+        """取 key 对应的图；没有时调用 render() 画一张并放进缓存"""
+        sprite = self.sprites.get(key)
+        if sprite is not None:
+            self.sprites.move_to_end(key)
+            self.hits += 1
+            return sprite
+        self.misses += 1
+        sprite = render()
+        self.sprites[key] = sprite
+        if len(self.sprites) > self.max_entries:
+            self.sprites.popitem(last=False)
+        return sprite
+
+    def clear(self):
+        self.sprites.clear()
+
+
+def quantize_color(color, step: int = SPRITE_COLOR_STEP):
+    r, g, b = color
+    half = step // 2
+    return (min(255, (r + half) // step * step), min(255, (g + half) // step * step), min(255, (b + half) // step * step))
+
+
+def quantize_alpha(alpha: int, step: int = SPRITE_ALPHA_STEP):
+    return min(255, (alpha + step // 2) // step * step)
+
+
+def render_snake_segment(radius, color, glow_color, alpha, glowing, ghost, glow_step=1):
+    """一节蛇身：外圈发光 + 圆球 + 两个高光，返回以圆心为中心的透明图；glow_step 是发光层间隔（0 不画）"""
+    glow_intensity = 6 if glowing else 4  # 刷光时加强发光
+    size = radius + glow_intensity
+    surf = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+
+    # 发光层（多层圆形，越外越淡）
+    for r in range(radius + glow_intensity, radius, -glow_step) if glow_step else ():
+        alpha_glow = int((30 if glowing else 20) * (1 - (r - radius) / glow_intensity))
+        if ghost:
+            alpha_glow = int(alpha_glow * (alpha / 255))
+        layer = pygame.Surface((r * 2, r * 2), pygame.SRCALPHA)
+        pygame.draw.circle(layer, (*glow_color, alpha_glow), (r, r), r)
+        surf.blit(layer, (size - r, size - r))
+
+    # 主体圆球
+    ball = pygame.Surface((radius * 2, radius * 2), pygame.SRCALPHA)
+    pygame.draw.circle(ball, (*color, alpha), (radius, radius), radius)
+
+    # 光泽（大高光）
+    highlight_radius = int(radius * 0.6)
+    highlight_offset = int(radius * 0.3)
+    highlight_color = tuple(min(c + 80, 255) for c in color)
+    highlight_alpha = int(alpha * 0.8) if alpha < 255 else 200
+    pygame.draw.circle(
+        ball, (*highlight_color, highlight_alpha),
+        (radius - highlight_offset, radius - highlight_offset),
+        highlight_radius
+    )
+
+    # 顶部小高光点
+    small_highlight_radius = int(radius * 0.3)
+    small_highlight_pos = int(radius * 0.4)
+    pygame.draw.circle(
+        ball, (255, 255, 255, min(alpha, 180)),
+        (radius - small_highlight_pos, radius - small_highlight_pos),
+        small_highlight_radius
+    )
+
+    surf.blit(ball, (size - radius, size - radius))
+    return surf
+
+
+def render_eye_glow(eye_size):
+    """眼睛外面的两圈白色光晕"""
+    size = eye_size + 2
+    surf = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+    for r in range(eye_size + 2, eye_size, -1):
+        eye_glow_alpha = int(60 * (1 - (r - eye_size) / 2))
+        layer = pygame.Surface((r * 2, r * 2), pygame.SRCALPHA)
+        pygame.draw.circle(layer, (255, 255, 255, eye_glow_alpha), (r, r), r)
+        surf.blit(layer, (size - r, size - r))
+    return surf
+
+
+def render_food(base_color, glow_color, r0, glow_radius, glow_step=1):
+    """普通食物：脉冲发光层 + 实体 + 高光"""
+    surf = pygame.Surface((glow_radius * 2, glow_radius * 2), pygame.SRCALPHA)
+    c = glow_radius
+    for r in range(glow_radius, r0, -2 * glow_step) if glow_step else ():
+        alpha = int(60 * (1 - (glow_radius - r) / max(1, glow_radius)))
+        layer = pygame.Surface((r * 2, r * 2), pygame.SRCALPHA)
+        pygame.draw.circle(layer, (*glow_color, alpha), (r, r), r)
+        surf.blit(layer, (c - r, c - r))
+    pygame.draw.circle(surf, base_color, (c, c), r0)
+    pygame.draw.circle(surf, (255, 150, 200), (c - 3, c - 3), max(2, r0 // 2))
+    return surf
+
+
+OBSTACLE_SPRITE_HALF = 18  # 障碍物发光层的最大半径
+
+
+def render_obstacle():
+    """荆棘障碍：发光层 + X 形 + 四个方向的尖刺 + 中心圆点"""
+    half = OBSTACLE_SPRITE_HALF
+    surf = pygame.Surface((half * 2, half * 2), pygame.SRCALPHA)
+    center_x = center_y = half
+
+    # 发光层（圆形扩散）
+    for r in range(18, 8, -2):
+        alpha = int(60 * (18 - r) / 18)
+        layer = pygame.Surface((r * 2, r * 2), pygame.SRCALPHA)
+        pygame.draw.circle(layer, (*OBSTACLE_GLOW, alpha), (r, r), r)
+        surf.blit(layer, (center_x - r, center_y - r))
+
+    # 中心危险标志（X形）
+    danger_color = OBSTACLE_COLOR
+    offset = CELL_SIZE // 3
+    pygame.draw.line(surf, danger_color, (center_x - offset, center_y - offset), (center_x + offset, center_y + offset), 3)
+    pygame.draw.line(surf, danger_color, (center_x + offset, center_y - offset), (center_x - offset, center_y + offset), 3)
+
+    # 四个方向的尖刺（上 / 下 / 左 / 右）
+    spike_length = CELL_SIZE // 2 - 2
+    spike_width = 6
+    spikes = [
+        [(center_x, center_y - spike_length), (center_x - spike_width, center_y), (center_x + spike_width, center_y)],
+        [(center_x, center_y + spike_length), (center_x - spike_width, center_y), (center_x + spike_width, center_y)],
+        [(center_x - spike_length, center_y), (center_x, center_y - spike_width), (center_x, center_y + spike_width)],
+        [(center_x + spike_length, center_y), (center_x, center_y - spike_width), (center_x, center_y + spike_width)],
+    ]
+    for pts in spikes:
+        pygame.draw.polygon(surf, danger_color, pts)
+        pygame.draw.polygon(surf, (255, 100, 255), pts, 2)
+
+    # 中心圆点
+    pygame.draw.circle(surf, (255, 0, 200), (center_x, center_y), 4)
+    pygame.draw.circle(surf, (255, 150, 255), (center_x, center_y), 2)
+    return surf
+
+
+TEXT_CACHE_MAX = 256  # HUD / 排行榜等文字图，文字或颜色变了才重新渲染
+GLOW_TEXT_PAD = 2
+GLOW_TEXT_OFFSETS = [(2, 2), (-2, 2), (2, -2), (-2, -2), (0, 2), (0, -2), (2, 0), (-2, 0)]
+
+
+def render_glow_text(font, text, color, glow_alpha=255):
+    """发光文字：8 个方向的暗色描边 + 主文字，合成到一张图上（四周各留 GLOW_TEXT_PAD 像素）"""
+    text_surf = font.render(text, True, color)
+    glow_color = tuple(max(0, c - 50) for c in color)
+    glow_surf = font.render(text, True, glow_color)
+    if glow_alpha < 255:
+        glow_surf.set_alpha(glow_alpha)
+    pad = GLOW_TEXT_PAD
+    w, h = text_surf.get_size()
+    surf = pygame.Surface((w + pad * 2, h + pad * 2), pygame.SRCALPHA)
+    for dx, dy in GLOW_TEXT_OFFSETS:
+        surf.blit(glow_surf, (pad + dx, pad + dy))
+    surf.blit(text_surf, (pad, pad))
+    return surf
+
+
+# -------------------- 动画帧缓存 --------------------
+ANIM_FRAMES = 24  # 周期动画每个周期预渲染多少帧
+
+PORTAL_HALO_PERIOD_MS = 2 * math.pi * 650   # 传送门光晕 sin(now / 650)
+MAGNET_RING_PERIOD_MS = 700                 # 磁铁道具收缩光环
+ENERGY_BLINK_PERIOD_MS = 2 * math.pi * 85   # 能量闪电闪烁 sin(now / 85)
+
+
+class FrameCache:
+    """周期动画的帧缓存：一个周期切成 frames 个相位，每个相位第一次用到时画一次，之后按时间取帧"""
+    def __init__(self, atlas: SpriteAtlas, frames: int = ANIM_FRAMES):
+        self.atlas = atlas
+        self.frames = frames
+
+    def frame(self, key, period_ms, now, render):
+        """render(phase) 画出相位 phase（0~1）的那一帧"""
+        k = int((now % period_ms) / period_ms * self.frames) % self.frames
+        return self.atlas.get(("anim", key, k), lambda: render(k / self.frames))
+
+
+def render_portal_halo(base, phase, glow_step=1):
+    """传送门光晕 + 边框 + 内部暗区，返回以传送门中心为中心的图"""
+    slow_pulse = 0.5 + 0.5 * math.sin(2 * math.pi * phase)
+    w = int(CELL_SIZE * 0.66)
+    h = int(CELL_SIZE * 1.00)
+    halo_pad = 18
+    halo = pygame.Surface((w + halo_pad * 2, h + halo_pad * 2), pygame.SRCALPHA)
+    hr = halo.get_rect()
+    glow_outer = int(max(w, h) * (0.62 + 0.10 * slow_pulse))
+    glow_inner = int(max(w, h) * 0.42)
+    steps = 8 // glow_step if glow_step else 0
+    for i in range(steps, 0, -1):
+        # keep a baseline so halo never fully disappears
+        a = int((28 + 55 * slow_pulse) * (i / steps))
+        expand = int((glow_outer - glow_inner) * (1.0 - i / steps))
+        rr = hr.inflate(-expand, -expand)
+        pygame.draw.ellipse(halo, (*base, a), rr, width=3)
+
+    outer_rect = pygame.Rect(0, 0, w, h)
+    outer_rect.center = (hr.width // 2, hr.height // 2)
+    # portal rim
+    pygame.draw.ellipse(halo, base, outer_rect, width=2)
+    # inner void gradient-ish
+    inner = outer_rect.inflate(-10, -12)
+    pygame.draw.ellipse(halo, (10, 5, 20), inner)
+    pygame.draw.ellipse(halo, (40, 10, 70), inner, width=2)
+    return halo
+
+
+def render_portal_highlight(a):
+    w = int(CELL_SIZE * 0.66)
+    h = int(CELL_SIZE * 1.00)
+    highlight = pygame.Surface((w, h), pygame.SRCALPHA)
+    pygame.draw.ellipse(highlight, (255, 255, 255, a), highlight.get_rect().inflate(-12, -18), width=2)
+    return highlight
+
+
+def render_item(t, color, glow_r, glow_step=1):
+    """道具：脉冲发光层 + 底板 + 图标（磁铁光环和炸弹另画），返回以格子中心为中心的图"""
+    surf = pygame.Surface((glow_r * 2, glow_r * 2), pygame.SRCALPHA)
+    cx = cy = glow_r
+    ox = oy = glow_r - CELL_SIZE // 2  # 格子左上角
+    for r in range(glow_r, CELL_SIZE // 3, -2 * glow_step) if glow_step else ():
+        a = int(50 * (1 - (glow_r - r) / max(1, glow_r)))
+        s = pygame.Surface((r * 2, r * 2), pygame.SRCALPHA)
+        pygame.draw.circle(s, (*color, a), (r, r), r)
+        surf.blit(s, (cx - r, cy - r))
+    pygame.draw.rect(surf, color, pygame.Rect(ox + 5, oy + 5, CELL_SIZE - 10, CELL_SIZE - 10), border_radius=6)
+
+    pr = pygame.Rect(ox + 8, oy + 8, CELL_SIZE - 16, CELL_SIZE - 16)
+    if t == ITEM_MAGNET:
+        head_r = max(6, pr.width // 3)
+        head = pygame.Surface((head_r * 4, head_r * 4), pygame.SRCALPHA)
+        hr = head.get_rect()
+        pygame.draw.circle(head, (*SNAKE_HEAD_COLOR, 230), hr.center, head_r)
+        pygame.draw.circle(head, (20, 20, 20, 180), hr.center, head_r, width=2)
+        eye_r = max(1, head_r // 5)
+        pygame.draw.circle(head, (255, 255, 255, 220), (hr.centerx - head_r // 3, hr.centery - head_r // 5), eye_r)
+        pygame.draw.circle(head, (255, 255, 255, 220), (hr.centerx + head_r // 3, hr.centery - head_r // 5), eye_r)
+        pygame.draw.circle(head, (0, 0, 0, 200), (hr.centerx - head_r // 3, hr.centery - head_r // 5), max(1, eye_r // 2))
+        pygame.draw.circle(head, (0, 0, 0, 200), (hr.centerx + head_r // 3, hr.centery - head_r // 5), max(1, eye_r // 2))
+        pygame.draw.circle(head, (255, 255, 255, 150), (hr.centerx - head_r // 3, hr.centery - head_r // 3), max(1, eye_r // 2))
+        surf.blit(head, (cx - hr.centerx, cy - hr.centery))
+
+    elif t == ITEM_SCISSORS:
+        pill_w = pr.width
+        pill_h = max(12, int(pr.height * 0.70))
+        pill = pygame.Surface((pill_w, pill_h), pygame.SRCALPHA)
+        pill_rect = pill.get_rect()
+        rr = pill_h // 2
+
+        left_col = (40, 220, 120)
+        right_col = (255, 220, 80)
+
+        # base capsule (green)
+        pygame.draw.rect(pill, left_col, pill_rect, border_radius=rr)
+        # overlay right half (yellow)
+        right = pygame.Surface((pill_w, pill_h), pygame.SRCALPHA)
+        pygame.draw.rect(right, right_col, pill_rect, border_radius=rr)
+        pill.blit(right, (0, 0), area=pygame.Rect(pill_w // 2, 0, pill_w - pill_w // 2, pill_h))
+
+        # seam
+        pygame.draw.line(pill, (255, 255, 255, 230), (pill_w // 2, 2), (pill_w // 2, pill_h - 3), 2)
+        pygame.draw.line(pill, (0, 0, 0, 70), (pill_w // 2 + 2, 3), (pill_w // 2 + 2, pill_h - 4), 1)
+
+        # glossy highlight (top-left)
+        gloss = pygame.Surface((pill_w, pill_h), pygame.SRCALPHA)
+        pygame.draw.ellipse(gloss, (255, 255, 255, 85), pygame.Rect(2, 1, int(pill_w * 0.55), int(pill_h * 0.55)))
+        pill.blit(gloss, (0, 0))
+
+        # subtle shadow (bottom-right)
+        shade = pygame.Surface((pill_w, pill_h), pygame.SRCALPHA)
+        pygame.draw.ellipse(shade, (0, 0, 0, 55), pygame.Rect(int(pill_w * 0.40), int(pill_h * 0.45), int(pill_w * 0.58), int(pill_h * 0.58)))
+        pill.blit(shade, (0, 0))
+
+        pygame.draw.rect(pill, (20, 20, 20, 190), pill_rect, width=2, border_radius=rr)
+        surf.blit(pill, (pr.centerx - pill_w // 2, pr.centery - pill_h // 2))
+
+    elif t == ITEM_ROTTEN_APPLE:
+        # rotten apple with bite + stem
+        body_r = pr.width // 2 - 2
+        body_col = (155, 55, 175)
+        shadow_col = (85, 25, 110)
+        pygame.draw.circle(surf, body_col, pr.center, body_r)
+        pygame.draw.circle(surf, shadow_col, (pr.centerx - 3, pr.centery + 2), max(2, body_r - 4))
+        pygame.draw.circle(surf, (255, 185, 220), (pr.centerx - 4, pr.centery - 5), max(2, body_r // 3))
+
+        for dx, dy, rr2, col in [
+            (-4, 2, 3, (70, 10, 90)),
+            (3, 4, 2, (60, 5, 80)),
+            (5, -1, 2, (75, 15, 95)),
+            (-1, -3, 2, (60, 8, 78)),
+        ]:
+            pygame.draw.circle(surf, col, (pr.centerx + dx, pr.centery + dy), rr2)
+
+        pygame.draw.circle(surf, BG_COLOR, (pr.centerx + pr.width // 4, pr.centery - 1), 6)
+        pygame.draw.circle(surf, (20, 20, 20), (pr.centerx + pr.width // 4 + 3, pr.centery - 2), 3)
+        pygame.draw.line(surf, (110, 70, 30), (pr.centerx, pr.y + 3), (pr.centerx + 2, pr.y + 10), 3)
+    return surf
+
+
+def render_magnet_ring(pp):
+    r_max = int(CELL_SIZE * 0.72)
+    r_min = int(CELL_SIZE * 0.32)
+    ring_r = int(r_max - (r_max - r_min) * pp)
+    ring_size = ring_r * 2 + 10
+    ring_surf = pygame.Surface((ring_size, ring_size), pygame.SRCALPHA)
+    rc = ring_size // 2
+    for w in (5, 3):
+        aa = int((70 + 70 * (1.0 - pp)) * (w / 5))
+        pygame.draw.circle(ring_surf, (255, 255, 0, aa), (rc, rc), ring_r, width=w)
+    return ring_surf
+
+
+def render_bomb(br):
+    bomb_s = pygame.Surface((br * 4, br * 4), pygame.SRCALPHA)
+    # black bomb body
+    pygame.draw.circle(bomb_s, (0, 0, 0, 240), (br * 2, br * 2), br)
+    # outline for visibility on dark background
+    pygame.draw.circle(bomb_s, (140, 140, 140, 200), (br * 2, br * 2), br, width=2)
+    # small highlight
+    pygame.draw.circle(bomb_s, (220, 220, 220, 140), (br * 2 - 3, br * 2 - 3), max(2, br // 3))
+    # red fuse
+    pygame.draw.line(bomb_s, (255, 60, 60, 220), (br * 2, br * 2 - br), (br * 2, br * 2 - br - 6), 3)
+    pygame.draw.circle(bomb_s, (255, 160, 80, 220), (br * 2 + 2, br * 2 - br - 8), 3)
+    return bomb_s
+
+
+def render_energy_glow(glow_color, glow_size, glow_step=1):
+    """能量食物的圆角方形发光层，返回以格子左上角外扩 6 + glow_size 为原点的图"""
+    edge = 6 + glow_size
+    surf = pygame.Surface((CELL_SIZE + edge * 2, CELL_SIZE + edge * 2), pygame.SRCALPHA)
+    for offset in range(6, 0, -glow_step) if glow_step else ():
+        glow_rect = pygame.Rect(
+            edge - offset - glow_size,
+            edge - offset - glow_size,
+            CELL_SIZE + (offset + glow_size) * 2,
+            CELL_SIZE + (offset + glow_size) * 2
+        )
+        alpha_surf = pygame.Surface((glow_rect.width, glow_rect.height), pygame.SRCALPHA)
+        alpha = 40 // offset
+        pygame.draw.rect(alpha_surf, (*glow_color, alpha), alpha_surf.get_rect(), border_radius=10)
+        surf.blit(alpha_surf, glow_rect)
+    return surf
+
+
+SPIKE_GLOW_R = 14
+
+
+def render_spike(glow_step=1):
+    """地刺：灰色光晕 + 三角尖刺，返回以格子中心为中心的图"""
+    half = max(SPIKE_GLOW_R, CELL_SIZE // 2)
+    surf = pygame.Surface((half * 2, half * 2), pygame.SRCALPHA)
+    color = (180, 180, 180)
+    for r in range(SPIKE_GLOW_R, 6, -2 * glow_step) if glow_step else ():
+        a = int(55 * (1 - (SPIKE_GLOW_R - r) / SPIKE_GLOW_R))
+        layer = pygame.Surface((r * 2, r * 2), pygame.SRCALPHA)
+        pygame.draw.circle(layer, (*color, a), (r, r), r)
+        surf.blit(layer, (half - r, half - r))
+    half_w = max(4, CELL_SIZE // 6)
+    pts = [
+        (half, half - CELL_SIZE // 2 + 4),
+        (half - half_w, half + CELL_SIZE // 4),
+        (half + half_w, half + CELL_SIZE // 4),
+    ]
+    pygame.draw.polygon(surf, (230, 230, 230), pts)
+    return surf
+
+
+def render_ghost_hunter(alpha, r):
+    """幽灵猎手的半透明身体（外圈 + 内圈），返回以中心为中心的图"""
+    surf = pygame.Surface((r * 2, r * 2), pygame.SRCALPHA)
+    pygame.draw.circle(surf, (255, 0, 0, alpha), (r, r), r)
+    # inner glow
+    pygame.draw.circle(surf, (255, 120, 120, max(0, alpha - 40)), (r, r), max(2, r - 5))
+    return surf
+
+
+def render_ghost_hunter_tail(r, glow_step=1):
+    """幽灵猎手显形时的拖尾（一串渐淡的圆）"""
+    tail = pygame.Surface((r * 3, r * 3), pygame.SRCALPHA)
+    tr = tail.get_rect()
+    for i in range(0, 6, glow_step) if glow_step else ():
+        a = int(55 * (1 - i / 6))
+        pygame.draw.circle(tail, (255, 80, 80, a), (tr.centerx, tr.centery + 6 + i * 2), max(1, r - 3 - i * 2))
+    return tail
+
+
+def render_shadow_segment(color, r, glow_step=1):
+    """影子蛇的一节：半透明外圈 + 实心圆，返回以中心为中心的图"""
+    surf = pygame.Surface((r * 2, r * 2), pygame.SRCALPHA)
+    if glow_step:
+        pygame.draw.circle(surf, (*color, 120), (r, r), r)
+    pygame.draw.circle(surf, color, (r, r), max(2, r - 2))
+    return surf
+
+
+def render_energy_bolt(base_color, rr, phase):
+    blink = 0.5 + 0.5 * math.sin(2 * math.pi * phase)
+    bright = 0.78 + 0.22 * blink
+    fill_col = (
+        min(255, int(base_color[0] * bright + 20)),
+        min(255, int(base_color[1] * bright + 20)),
+        min(255, int(base_color[2] * bright + 10)),
+        255,
+    )
+    glow_a = int(60 + 160 * blink)
+
+    bolt_size = rr * 2 + 6
+    bolt = pygame.Surface((bolt_size, bolt_size), pygame.SRCALPHA)
+    bx = bolt_size // 2
+    by = bolt_size // 2
+
+    pts = [
+        (bx - int(rr * 0.10), by - int(rr * 1.10)),
+        (bx + int(rr * 0.55), by - int(rr * 0.10)),
+        (bx + int(rr * 0.15), by - int(rr * 0.10)),
+        (bx + int(rr * 0.10), by + int(rr * 1.10)),
+        (bx - int(rr * 0.55), by + int(rr * 0.05)),
+        (bx - int(rr * 0.20), by + int(rr * 0.05)),
+    ]
+
+    # glow outline (blink)
+    pygame.draw.polygon(bolt, (255, 255, 255, glow_a), pts, width=6)
+    pygame.draw.polygon(bolt, (255, 255, 180, max(0, glow_a - 40)), pts, width=3)
+
+    # solid fill
+    pygame.draw.polygon(bolt, fill_col, pts)
+
+    pygame.draw.polygon(bolt, (20, 20, 20, 170), pts, width=2)
+    return bolt
+
+
+# -------------------- 批量绘制 --------------------
+class RenderQueue:
+    """一层里的 blit 先攒起来，flush 时用 Surface.blits 一次提交，省掉逐个 blit 的 Python 调用开销"""
+    def __init__(self):
+        self.items = []
+
+    def push(self, surface, dest, area=None, flags=0):
+        self.items.append((surface, dest, area, flags))
+
+    def flush(self, target, sort: bool = False):
+        """提交并清空；sort=True 时按混合模式和源图排序，只用于先后顺序不影响画面的一层"""
+        if not self.items:
+            return
+        if sort:
+            self.items.sort(key=lambda it: (it[3], id(it[0])))
+        target.blits(self.items, doreturn=False)
+        self.items.clear()
+
+
+# -------------------- 障碍物图层 --------------------
+OBSTACLE_TILE_CELLS = 10  # 障碍物图层按 10x10 格切块缓存
+OBSTACLE_TILE_MAX = 48    # 最多保留多少块（大地图上走远了的块会被淘汰，回来时重建）
+
+
+class ObstacleLayer:
+    """障碍物预先画进按块切分的透明大图；障碍物增删时只重画那一格，每帧只 blit 视口里的几块"""
+    def __init__(self, tile_cells: int = OBSTACLE_TILE_CELLS, max_tiles: int = OBSTACLE_TILE_MAX):
+        self.tile_cells = tile_cells
+        self.max_tiles = max_tiles
+        self.pad = OBSTACLE_SPRITE_HALF - CELL_SIZE // 2  # 边缘格子的发光会超出块的范围
+        self.tiles = OrderedDict()  # (tx, ty) -> [Surface, 有内容的区域]
+        self.pending = []           # 增删过、还没画进已有块的格子
+        self.version = 0            # 障碍物集合每变一次加 1
+        self.sprite = None
+
+    def invalidate(self):
+        """障碍物整体换掉（开局 / 读档）：丢掉所有块，下次绘制时按需重建"""
+        self.tiles.clear()
+        self.pending = []
+        self.version += 1
+
+    def mark(self, cell):
+        self.pending.append(cell)
+        self.version += 1
+
+    def _stamp(self, surf, tile, cells):
+        tx, ty = tile
+        base_x = tx * self.tile_cells
+        base_y = ty * self.tile_cells
+        surf.blits([
+            (self.sprite, ((x - base_x) * CELL_SIZE, (y - base_y) * CELL_SIZE))
+            for x, y in cells
+        ], doreturn=False)
+
+    def _build(self, tile, obstacles_in):
+        t = self.tile_cells
+        size = t * CELL_SIZE + self.pad * 2
+        surf = pygame.Surface((size, size), pygame.SRCALPHA)
+        x0, y0 = tile[0] * t, tile[1] * t
+        self._stamp(surf, tile, obstacles_in(x0, y0, x0 + t - 1, y0 + t - 1))
+        return [surf, surf.get_bounding_rect()]
+
+    def _redraw_cell(self, cell, obstacles_in):
+        """擦掉一格的范围，再把块内压到这片区域的障碍物（这一格和它周围一圈）重新盖上去"""
+        t = self.tile_cells
+        tile = (cell[0] // t, cell[1] // t)
+        entry = self.tiles.get(tile)
+        if entry is None:
+            return
+        surf = entry[0]
+        x0, y0 = tile[0] * t, tile[1] * t
+        rect = pygame.Rect((cell[0] - x0) * CELL_SIZE, (cell[1] - y0) * CELL_SIZE,
+                           OBSTACLE_SPRITE_HALF * 2, OBSTACLE_SPRITE_HALF * 2)
+        surf.fill((0, 0, 0, 0), rect)
+        nearby = obstacles_in(max(x0, cell[0] - 1), max(y0, cell[1] - 1),
+                              min(x0 + t - 1, cell[0] + 1), min(y0 + t - 1, cell[1] + 1))
+        surf.set_clip(rect)
+        self._stamp(surf, tile, nearby)
+        surf.set_clip(None)
+        entry[1] = surf.get_bounding_rect()
+
+    def draw(self, screen, origin, view_cells, obstacles_in, sprite):
+        """obstacles_in(x0, y0, x1, y1) 返回矩形内的障碍物格子"""
+        self.sprite = sprite
+        for cell in self.pending:
+            self._redraw_cell(cell, obstacles_in)
+        self.pending = []
+
+        t = self.tile_cells
+        vx0, vy0, vx1, vy1 = view_cells
+        view_x, view_y = origin
+        batch = []
+        for ty in range(max(0, vy0 - 1) // t, min(GRID_HEIGHT - 1, vy1 + 1) // t + 1):
+            for tx in range(max(0, vx0 - 1) // t, min(GRID_WIDTH - 1, vx1 + 1) // t + 1):
+                tile = (tx, ty)
+                entry = self.tiles.get(tile)
+                if entry is None:
+                    entry = self.tiles[tile] = self._build(tile, obstacles_in)
+                    if len(self.tiles) > self.max_tiles:
+                        self.tiles.popitem(last=False)
+                else:
+                    self.tiles.move_to_end(tile)
+                surf, used = entry
+                if used.width == 0:
+                    continue  # 这一块没有障碍物
+                x = view_x + tx * t * CELL_SIZE - self.pad + used.x
+                y = view_y + ty * t * CELL_SIZE - self.pad + used.y
+                batch.append((surf, (x, y), used))
+        screen.blits(batch, doreturn=False)
+
+
+# -------------------- 临时图层 --------------------
+class OverlayPool:
+    """整屏 / 整条的临时图层按尺寸复用：取用时先 fill 清空，不再每帧分配新的大图
+
+    取到的图层要在下一次取同一尺寸之前画完并 blit 出去；需要同时占用两张同尺寸图层时用不同的 slot。
+    """
+    def __init__(self):
+        self.surfaces = {}
+
+    def get(self, size, alpha: bool = True, fill=(0, 0, 0, 0), slot=0):
+        key = (size, alpha, slot)
+        surf = self.surfaces.get(key)
+        if surf is None:
+            surf = pygame.Surface(size, pygame.SRCALPHA) if alpha else pygame.Surface(size)
+            self.surfaces[key] = surf
+        surf.fill(fill)
+        return surf
+
+    def clear(self):
+        self.surfaces.clear()
+
+
+# -------------------- 输入 --------------------
+INPUT_QUEUE_MAX = 3            # 最多排队几次转向，每走一步消耗一个；再多按的丢掉
+INPUT_LATENCY_SAMPLES = 512    # 按键到生效的延迟保留最近多少次
+
+
+class LatencyStats:
+    """记录最近若干次"按键 → 蛇真正转向"的延迟（毫秒），给调试面板算分位数"""
+    def __init__(self, max_samples: int = INPUT_LATENCY_SAMPLES):
+        self.samples = deque(maxlen=max_samples)
+
+    def add(self, ms: int):
+        self.samples.append(ms)
+
+    def percentiles(self, *ps):
+        """最近邻秩分位数；没有样本时全部返回 None"""
+        if not self.samples:
+            return [None] * len(ps)
+        ordered = sorted(self.samples)
+        n = len(ordered)
+        return [ordered[min(n - 1, max(0, math.ceil(p / 100 * n) - 1))] for p in ps]
+
+
+# -------------------- 帧节奏 --------------------
+class FramePacer:
+    """每帧结束时的等待：游戏进行中按 fps（可选忙等），静态画面按 idle_fps 睡眠等待"""
+    def __init__(self, clock, mode: str = PACING_SLEEP, idle_fps: int = IDLE_FPS):
+        self.clock = clock
+        self.mode = mode
+        self.idle_fps = idle_fps
+        self.idle = False
+
+    def tick(self, fps: int, idle: bool = False) -> int:
+        self.idle = idle
+        if idle:
+            return self.clock.tick(min(fps, self.idle_fps))
+        if self.mode == PACING_BUSY:
+            return self.clock.tick_busy_loop(fps)
+        return self.clock.tick(fps)
+
+
+# -------------------- 启动计时 --------------------
+class StartupTrace:
+    """--trace-startup：mark(name) 记下从上一个 mark 到现在的耗时，report() 打印后清空"""
+    def __init__(self, start: float = None):
+        self.last = time.perf_counter() if start is None else start
+        self.phases = []
+
+    def mark(self, name: str):
+        now = time.perf_counter()
+        self.phases.append((name, (now - self.last) * 1000))
+        self.last = now
+
+    def report(self, title: str):
+        print(f"{title}：")
+        for name, ms in self.phases:
+            print(f"  {ms:8.1f} ms  {name}")
+        print(f"  {sum(ms for _, ms in self.phases):8.1f} ms  合计")
+        self.phases = []
+
+
+# -------------------- 画质调节 --------------------
+QUALITY_WINDOW = 90             # 按最近多少帧的平均耗时判断
+QUALITY_DOWNGRADE_RATIO = 1.0   # 平均耗时超过一帧预算就降一档
+QUALITY_UPGRADE_RATIO = 0.55    # 低于预算的 55% 才升回一档；两个阈值拉开，避免在两档之间来回跳
+
+# 从高到低的画质档位：发光层间隔（0 不画）、粒子数量比例、迷雾噪点、文字发光、是否允许整屏泛光
+QUALITY_TIERS = (
+    {"name": "高", "glow_step": 1, "particles": 1.0, "fog_noise": True, "text_glow": True, "bloom": True},
+    {"name": "中", "glow_step": 2, "particles": 0.5, "fog_noise": True, "text_glow": True, "bloom": True},
+    {"name": "低", "glow_step": 0, "particles": 0.25, "fog_noise": False, "text_glow": False, "bloom": False},
+)
+
+# 整屏泛光（F4 / --bloom 开启）：实体只画实心核心，光晕由一次后处理统一生成，开销与实体数量无关
+BLOOM_DOWNSCALE = 4     # 先缩到 1/4 再处理
+BLOOM_LEVELS = 2        # 在此基础上再对半缩小几次，越多光晕越宽
+BLOOM_THRESHOLD = 90    # 每个通道先减去这么多，背景和网格（都比它暗）不会发光
+BLOOM_INTENSITY = 220   # 叠加前乘的系数（/256）
+
+
+class QualityGovernor:
+    """根据实测帧耗时自动升降画质档位；每次换档后清空窗口，至少再观察一整个窗口才会再换"""
+    def __init__(self, budget_ms: float = 1000 / RENDER_FPS, window: int = QUALITY_WINDOW):
+        self.budget_ms = budget_ms
+        self.samples = deque(maxlen=window)
+        self.total = 0.0
+        self.level = 0
+        self.changes = 0
+
+    @property
+    def tier(self):
+        return QUALITY_TIERS[self.level]
+
+    def average_ms(self) -> float:
+        return self.total / len(self.samples) if self.samples else 0.0
+
+    def record(self, frame_ms: float) -> bool:
+        """记录一帧更新 + 绘制的耗时（不含翻页和 tick 等待）；换档时返回 True"""
+        if len(self.samples) == self.samples.maxlen:
+            self.total -= self.samples[0]
+        self.samples.append(frame_ms)
+        self.total += frame_ms
+        if len(self.samples) < self.samples.maxlen:
+            return False
+        avg = self.average_ms()
+        if avg > self.budget_ms * QUALITY_DOWNGRADE_RATIO and self.level < len(QUALITY_TIERS) - 1:
+            self.level += 1
+        elif avg < self.budget_ms * QUALITY_UPGRADE_RATIO and self.level > 0:
+            self.level -= 1
+        else:
+            return False
+        self.samples.clear()
+        self.total = 0.0
+        self.changes += 1
+        return True
+
+
+class BloomPass:
+    """整屏泛光：游戏区缩小 → 减阈值只留亮处 → 继续缩小 → 逐级放大回原尺寸（smoothscale 顺带完成模糊）→ 相加叠回去"""
+    def __init__(self, downscale: int = BLOOM_DOWNSCALE, levels: int = BLOOM_LEVELS):
+        self.downscale = downscale
+        self.levels = levels
+        self.size = None
+        self.chain = []   # 从大到小的缩略图，最后一张是放大回原尺寸用的整图
+
+    def _build(self, size, target):
+        w, h = size
+        chain = []
+        for i in range(self.levels + 1):
+            d = self.downscale << i
+            chain.append(pygame.Surface((max(1, w // d), max(1, h // d)), 0, target))
+        chain.append(pygame.Surface(size, 0, target))
+        self.size = size
+        self.chain = chain
+
+    def apply(self, target, rect):
+        area = target.subsurface(rect)
+        if self.size != rect.size:
+            self._build(rect.size, area)
+        chain = self.chain
+        pygame.transform.smoothscale(area, chain[0].get_size(), chain[0])
+        t = BLOOM_THRESHOLD
+        chain[0].fill((t, t, t), special_flags=pygame.BLEND_RGB_SUB)
+        for src, dst in zip(chain[:-2], chain[1:-1]):
+            pygame.transform.smoothscale(src, dst.get_size(), dst)
+        # 强度系数乘在最小的图上：与缩放可交换，整图上做要慢十几倍
+        k = BLOOM_INTENSITY
+        up = chain[-2]
+        up.fill((k, k, k), special_flags=pygame.BLEND_RGB_MULT)
+        # 逐级放大回去；一步放大会出块状，逐级放大的光晕更柔和
+        for dst in chain[-3::-1] + chain[-1:]:
+            pygame.transform.smoothscale(up, dst.get_size(), dst)
+            up = dst
+        area.blit(up, (0, 0), special_flags=pygame.BLEND_RGB_ADD)
+
+
 # -------------------- 粒子特效类 --------------------
 class Particle:
     """单个粒子"""
@@ -206,25 +1120,37 @@ class Particle:
     def is_alive(self):
         return self.life > 0
     
-    def draw(self, surface):
+    def draw(self, queue, atlas, offset=(0, 0)):
         # 根据剩余生命调整透明度
-        alpha = int(255 * (self.life / self.max_life))
-        color_with_alpha = (*self.color, alpha)
+        alpha = quantize_alpha(int(255 * (self.life / self.max_life)))
         size = int(self.size * (self.life / self.max_life))
         if size > 0:
-            # 绘制带发光效果的粒子
-            s = pygame.Surface((size*2, size*2), pygame.SRCALPHA)
-            pygame.draw.circle(s, color_with_alpha, (size, size), size)
-            surface.blit(s, (int(self.x - size), int(self.y - size)))
+            color = self.color
+            s = atlas.get(("particle", color, size, alpha), lambda: render_particle(color, size, alpha))
+            queue.push(s, (int(self.x - size + offset[0]), int(self.y - size + offset[1])))
+
+
+def render_particle(color, size, alpha):
+    s = pygame.Surface((size * 2, size * 2), pygame.SRCALPHA)
+    pygame.draw.circle(s, (*color, alpha), (size, size), size)
+    return s
 
 
 class ParticleSystem:
     """粒子系统管理器"""
-    def __init__(self):
+    def __init__(self, enabled: bool = True, max_particles: int = PARTICLE_BUDGET):
         self.particles = []
+        self.max_particles = max_particles  # 超出时丢掉最早发射的粒子
+        self.density = 1.0                  # 画质调节：实际发射数量 = count * density
+        self.enabled = enabled  # 无头模拟时关闭，粒子纯属视觉效果
+        self.atlas = SpriteAtlas()
+        self.queue = RenderQueue()
     
     def emit(self, x, y, color, count=20):
         """在指定位置发射粒子"""
+        if not self.enabled:
+            return
+        count = max(1, int(count * self.density))
         for _ in range(count):
             angle = random.uniform(0, 2 * 3.14159)
             speed = random.uniform(2, 8)
@@ -232,6 +1158,9 @@ class ParticleSystem:
             vy = speed * random.uniform(-3, 0)  # 向上喷射
             life = random.randint(20, 40)
             self.particles.append(Particle(x, y, color, vx, vy, life))
+        excess = len(self.particles) - self.max_particles
+        if excess > 0:
+            del self.particles[:excess]
     
     def update(self):
         """更新所有粒子"""
@@ -239,10 +1168,11 @@ class ParticleSystem:
         for p in self.particles:
             p.update()
     
-    def draw(self, surface):
-        """绘制所有粒子"""
+    def draw(self, surface, offset=(0, 0)):
+        """绘制所有粒子（粒子坐标是整张地图上的像素坐标，offset 为镜头偏移）"""
         for p in self.particles:
-            p.draw(surface)
+            p.draw(self.queue, self.atlas, offset)
+        self.queue.flush(surface)
 
 
 # -------------------- 新系统类 --------------------
@@ -270,15 +1200,25 @@ class Spike:
     def __init__(self, pos):
         self.pos = pos
         self.visible = True
-        self.last_toggle = pygame.time.get_ticks()
+        self.last_toggle = get_ticks()
     
     def update(self):
         """更新地刺的显示状态"""
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         if now - self.last_toggle >= SPIKE_TOGGLE_TIME:
             self.visible = not self.visible
             self.last_toggle = now
 
+    def to_state(self):
+        return (self.pos, self.visible, self.last_toggle)
+
+    @classmethod
+    def from_state(cls, state, shift=0):
+        sp = cls.__new__(cls)
+        sp.pos, sp.visible, last_toggle = state
+        sp.last_toggle = last_toggle + shift
+        return sp
+
 
 class ShadowSnake:
     """影子蛇AI"""
@@ -286,12 +1226,13 @@ class ShadowSnake:
         self.snake = [start_pos]
         self.length = max(2, int(length))
         self.direction = random.choice([(1, 0), (-1, 0), (0, 1), (0, -1)])
-        self.last_move_time = pygame.time.get_ticks()
+        self.last_move_time = get_ticks()
         self.move_interval = STEP_INTERVAL_MS
+        self.born = self.last_move_time
     
     def update(self, food_positions, obstacles, grid_width, grid_height, time_scale: float = 1.0):
         """更新影子蛇的位置（简单AI：朝最近的食物移动）"""
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         ts = max(0.05, float(time_scale))
         effective_interval = self.move_interval / ts
         if now - self.last_move_time < effective_interval:
@@ -359,19 +1300,31 @@ class ShadowSnake:
 
         return new_head, ate_food
 
+    def to_state(self):
+        return (list(self.snake), self.length, self.direction, self.last_move_time, self.move_interval, self.born)
+
+    @classmethod
+    def from_state(cls, state, shift=0):
+        ss = cls.__new__(cls)
+        snake, ss.length, ss.direction, last_move_time, ss.move_interval, born = state
+        ss.snake = list(snake)
+        ss.last_move_time = last_move_time + shift
+        ss.born = born + shift
+        return ss
+
 
 class GhostHunter:
     """幽灵猎手"""
     def __init__(self, pos):
         self.pos = pos
         self.visible = True
-        self.last_toggle = pygame.time.get_ticks()
+        self.last_toggle = get_ticks()
         self.visible_duration = random.randint(GHOST_HUNTER_VISIBLE_MIN, GHOST_HUNTER_VISIBLE_MAX)
         self.invisible_duration = random.randint(GHOST_HUNTER_INVISIBLE_MIN, GHOST_HUNTER_INVISIBLE_MAX)
     
     def update(self):
         """更新幽灵猎手的可见性"""
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         elapsed = now - self.last_toggle
         appeared = False
         
@@ -419,21 +1372,31 @@ class GhostHunter:
         new_pos = (new_pos[0] % grid_width, new_pos[1] % grid_height)
         self.pos = new_pos
 
+    def to_state(self):
+        return (self.pos, self.visible, self.last_toggle, self.visible_duration, self.invisible_duration)
+
+    @classmethod
+    def from_state(cls, state, shift=0):
+        gh = cls.__new__(cls)
+        gh.pos, gh.visible, last_toggle, gh.visible_duration, gh.invisible_duration = state
+        gh.last_toggle = last_toggle + shift
+        return gh
+
 
 class Boss:
     """Boss"""
     def __init__(self, pos):
         self.pos = pos  # 中心位置
         self.shield_active = True
-        self.shield_start_time = pygame.time.get_ticks()
+        self.shield_start_time = get_ticks()
         self.bullets = []  # 子弹列表
-        self.last_bullet_time = pygame.time.get_ticks()
+        self.last_bullet_time = get_ticks()
         self.bullet_interval = 1_000  # 每秒发射一颗子弹
-        self.last_update_time = pygame.time.get_ticks()
+        self.last_update_time = get_ticks()
     
     def update(self, grid_width, grid_height, time_scale: float = 1.0):
         """更新Boss状态"""
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         dt_ms = max(0, now - self.last_update_time)
         self.last_update_time = now
         ts = max(0.05, float(time_scale))
@@ -480,11 +1443,917 @@ class Boss:
                 cells.append((self.pos[0] + dx, self.pos[1] + dy))
         return cells
 
+    def to_state(self):
+        bullets = [(b['x'], b['y'], b['dx'], b['dy']) for b in self.bullets]
+        return (
+            self.pos, self.shield_active, self.shield_start_time, bullets,
+            self.last_bullet_time, self.bullet_interval, self.last_update_time,
+        )
+
+    @classmethod
+    def from_state(cls, state, shift=0):
+        boss = cls.__new__(cls)
+        (boss.pos, boss.shield_active, shield_start_time, bullets,
+         last_bullet_time, boss.bullet_interval, last_update_time) = state
+        boss.shield_start_time = shield_start_time + shift
+        boss.last_bullet_time = last_bullet_time + shift
+        boss.last_update_time = last_update_time + shift
+        boss.bullets = [{'x': x, 'y': y, 'dx': dx, 'dy': dy} for x, y, dx, dy in bullets]
+        return boss
+
+
+# -------------------- 空间索引 --------------------
+SPATIAL_CHUNK = 8  # 每个桶覆盖 8x8 格
+
+# 索引里的实体种类；所有种类都在生成 / 移动 / 消失时立即登记或注销，查询时不再整体重建
+SPATIAL_FOOD = "food"
+SPATIAL_ENERGY = "energy"
+SPATIAL_OBSTACLE = "obstacle"
+SPATIAL_ITEM = "item"
+SPATIAL_SPIKE = "spike"
+SPATIAL_PORTAL = "portal"
+SPATIAL_HUNTER = "hunter"
+SPATIAL_SHADOW = "shadow"
+SPATIAL_BULLET = "bullet"
+SPATIAL_OBJECT_KINDS = (SPATIAL_ITEM, SPATIAL_SPIKE, SPATIAL_PORTAL, SPATIAL_HUNTER, SPATIAL_SHADOW, SPATIAL_BULLET)
+
+
+class SpatialHash:
+    """按 SPATIAL_CHUNK 分桶的格子索引：区域查询只扫覆盖到的桶，代价与面积成正比，与实体总数无关"""
+    def __init__(self, chunk: int = SPATIAL_CHUNK):
+        self.chunk = chunk
+        self.buckets = {}  # (bx, by) -> {kind: {key: obj}}
+        self.where = {}    # kind -> {key: pos}
+
+    def add(self, kind, pos, obj=None, key=None):
+        """登记一个实体；key 默认是坐标本身（纯坐标实体）或对象 id，同一 key 再次登记视为移动"""
+        if obj is None:
+            obj = pos
+        if key is None:
+            key = pos if obj is pos else id(obj)
+        where = self.where.setdefault(kind, {})
+        old = where.get(key)
+        if old is not None:
+            self._unlink(kind, key, old)
+        where[key] = pos
+        c = self.chunk
+        bucket = self.buckets.setdefault((pos[0] // c, pos[1] // c), {})
+        bucket.setdefault(kind, {})[key] = obj
+
+    def remove(self, kind, key):
+        pos = self.where.get(kind, {}).pop(key, None)
+        if pos is not None:
+            self._unlink(kind, key, pos)
+
+    def _unlink(self, kind, key, pos):
+        c = self.chunk
+        bpos = (pos[0] // c, pos[1] // c)
+        bucket = self.buckets[bpos]
+        entries = bucket[kind]
+        del entries[key]
+        if not entries:
+            del bucket[kind]
+            if not bucket:
+                del self.buckets[bpos]
+
+    def clear_kind(self, kind):
+        for key, pos in self.where.pop(kind, {}).items():
+            self._unlink(kind, key, pos)
+
+    def query_rect(self, x0, y0, x1, y1, kinds=None):
+        """返回矩形 [x0, x1] x [y0, y1] 内的实体，按种类分组：{kind: [obj, ...]}
+
+        每组按坐标排序（保证快照恢复后结果顺序一致），同一对象占多格时只出现一次。
+        """
+        c = self.chunk
+        hits = {}
+        for bx in range(x0 // c, x1 // c + 1):
+            for by in range(y0 // c, y1 // c + 1):
+                bucket = self.buckets.get((bx, by))
+                if not bucket:
+                    continue
+                for kind, entries in bucket.items():
+                    if kinds is not None and kind not in kinds:
+                        continue
+                    where = self.where[kind]
+                    for key, obj in entries.items():
+                        x, y = where[key]
+                        if x0 <= x <= x1 and y0 <= y <= y1:
+                            hits.setdefault(kind, []).append(((x, y), obj))
+
+        result = {}
+        for kind, found in hits.items():
+            found.sort(key=lambda h: h[0])
+            seen = set()
+            objs = []
+            for _pos, obj in found:
+                if id(obj) not in seen:
+                    seen.add(id(obj))
+                    objs.append(obj)
+            result[kind] = objs
+        return result
+
+    def query_radius(self, center, radius, kinds=None):
+        """以 center 为中心、半径 radius 的方形区域（切比雪夫距离，和磁铁 / 炸弹的判定一致）"""
+        cx, cy = center
+        return self.query_rect(cx - radius, cy - radius, cx + radius, cy + radius, kinds)
+
+
+def summed_area_table(rows):
+    """二维前缀和：sat[y][x] = 左上角 (0, 0) 到 (x - 1, y - 1) 矩形里各格数值之和"""
+    sat = [[0] * (len(rows[0]) + 1)]
+    for row in rows:
+        sat.append(list(map(add, sat[-1], accumulate(row, initial=0))))
+    return sat
+
+
+def window_sums(sat, k: int):
+    """所有 k×k 窗口里的格子数，sums[y][x] 对应左上角为 (x, y) 的窗口；一次扫完整张表"""
+    sums = []
+    for y in range(len(sat) - k):
+        strip = list(map(sub, sat[y + k], sat[y]))  # 第 y..y+k-1 行的列前缀和
+        sums.append(list(map(sub, strip[k:], strip)))
+    return sums
+
+
+# -------------------- 位棋盘 --------------------
+# 除空间索引里的种类外，位棋盘还有这几层；它们变得太频繁（或列表会被整体替换），每次用时按当前状态重新生成
+BIT_SNAKE = "snake"
+BIT_FOG = "fog"
+BIT_BOSS = "boss"
+BIT_VOLATILE_KINDS = (BIT_SNAKE, BIT_FOG, BIT_BOSS)
+
+
+class BitBoard:
+    """每层一个大整数，第 y * width + x 位为 1 表示格子 (x, y) 被占；区域清除 / 重叠判断都变成几次位运算"""
+    def __init__(self, width: int, height: int):
+        self.width = width
+        self.height = height
+        self.full = (1 << (width * height)) - 1
+        self.layers = {}
+        self._shapes = {}  # (w, h) -> 左上角在 (0, 0) 的矩形掩码，用时平移
+
+    def inside(self, cell):
+        x, y = cell
+        return 0 <= x < self.width and 0 <= y < self.height
+
+    def add(self, kind, cell):
+        if self.inside(cell):
+            self.layers[kind] = self.layers.get(kind, 0) | (1 << (cell[1] * self.width + cell[0]))
+
+    def discard(self, kind, cell):
+        if self.inside(cell):
+            self.layers[kind] = self.layers.get(kind, 0) & ~(1 << (cell[1] * self.width + cell[0]))
+
+    def load(self, kind, cells):
+        """整层重建：先在 bytearray 里置位，再一次转成整数"""
+        if not cells:
+            self.layers[kind] = 0
+            return
+        buf = bytearray((self.width * self.height + 7) // 8)
+        w = self.width
+        for cell in cells:
+            if self.inside(cell):
+                i = cell[1] * w + cell[0]
+                buf[i >> 3] |= 1 << (i & 7)
+        self.layers[kind] = int.from_bytes(buf, "little")
+
+    def get(self, kind):
+        return self.layers.get(kind, 0)
+
+    def rect(self, x0, y0, x1, y1):
+        """矩形 [x0, x1] x [y0, y1]（含边界，超出地图的部分裁掉）的掩码"""
+        x0 = max(0, x0)
+        y0 = max(0, y0)
+        x1 = min(self.width - 1, x1)
+        y1 = min(self.height - 1, y1)
+        if x0 > x1 or y0 > y1:
+            return 0
+        size = (x1 - x0 + 1, y1 - y0 + 1)
+        shape = self._shapes.get(size)
+        if shape is None:
+            row = (1 << size[0]) - 1
+            shape = 0
+            for y in range(size[1]):
+                shape |= row << (y * self.width)
+            self._shapes[size] = shape
+        return shape << (y0 * self.width + x0)
+
+    def around(self, center, radius: int):
+        cx, cy = center
+        return self.rect(cx - radius, cy - radius, cx + radius, cy + radius)
+
+    def test(self, bits, cell):
+        return self.inside(cell) and (bits >> (cell[1] * self.width + cell[0])) & 1 == 1
+
+    def cells(self, bits):
+        """把掩码解回格子列表（按行优先顺序）"""
+        if not bits:
+            return []
+        base = (bits & -bits).bit_length() - 1
+        bits >>= base
+        w = self.width
+        out = []
+        for byte_i, b in enumerate(bits.to_bytes((bits.bit_length() + 7) // 8, "little")):
+            while b:
+                low = b & -b
+                i = base + byte_i * 8 + low.bit_length() - 1
+                out.append((i % w, i // w))
+                b ^= low
+        return out
+
+
+# -------------------- 实体预算 --------------------
+# 超出上限时先删哪些：最早出现的 / 离蛇头最远的
+DESPAWN_OLDEST = "oldest"
+DESPAWN_FARTHEST = "farthest"
+
+# 每类实体的 (上限, 存活时间 ms 或 None, 超上限时的删除策略)；长时间挂机时实体数量不再无限增长
+ENTITY_BUDGETS = {
+    SPATIAL_OBSTACLE: (400, None, DESPAWN_FARTHEST),
+    SPATIAL_FOOD: (40, None, DESPAWN_FARTHEST),
+    SPATIAL_ENERGY: (8, None, DESPAWN_FARTHEST),
+    SPATIAL_ITEM: (ITEM_MAX_ON_MAP, None, DESPAWN_OLDEST),
+    SPATIAL_SPIKE: (SPIKE_COUNT_MAX, None, DESPAWN_OLDEST),
+    SPATIAL_HUNTER: (GHOST_HUNTER_COUNT_MAX, None, DESPAWN_OLDEST),
+    SPATIAL_SHADOW: (6, None, DESPAWN_OLDEST),
+}
+
+# 可选的存活时间（挂机 / 展示模式用，开启自动驾驶时启用）：影子蛇平时不会主动消失，长时间挂机时 90 秒后清理
+SOAK_ENTITY_TTLS = {
+    SPATIAL_SHADOW: 90_000,
+}
+
+
+class EntityBudget:
+    """按种类限制实体数量：到了存活时间或超过上限就按策略挑出要删的；live / despawned 计数给调试面板看"""
+    def __init__(self, budgets=None, ttls=None):
+        self.defaults = dict(ENTITY_BUDGETS if budgets is None else budgets)
+        self.budgets = {}
+        self.set_ttls(ttls)
+        self.live = {}
+        self.despawned = {kind: 0 for kind in self.defaults}
+
+    def set_ttls(self, ttls=None):
+        """ttls：{种类: 存活时间 ms}，覆盖默认的存活时间；传 None 恢复默认。计数不清零"""
+        self.budgets = dict(self.defaults)
+        for kind, ttl in (ttls or {}).items():
+            cap, _ttl, policy = self.budgets[kind]
+            self.budgets[kind] = (cap, ttl, policy)
+
+    def over(self, kind, count: int) -> bool:
+        """是否需要处理这一类（超上限，或者有存活时间限制）"""
+        cap, ttl, _policy = self.budgets[kind]
+        return count > cap or (ttl is not None and count > 0)
+
+    def pick(self, kind, entries, now: int, head):
+        """entries 是 (坐标, 对象, 出生时间或 None) 列表，返回要删掉的对象；DESPAWN_OLDEST 要求按出现先后排好"""
+        cap, ttl, policy = self.budgets[kind]
+        doomed = []
+        keep = entries
+        if ttl is not None:
+            keep = []
+            for entry in entries:
+                born = entry[2]
+                if born is not None and now - born >= ttl:
+                    doomed.append(entry[1])
+                else:
+                    keep.append(entry)
+        excess = len(keep) - cap
+        if excess > 0:
+            if policy == DESPAWN_FARTHEST:
+                hx, hy = head
+                keep = sorted(keep, key=lambda e: -max(abs(e[0][0] - hx), abs(e[0][1] - hy)))
+            doomed.extend(e[1] for e in keep[:excess])
+        self.despawned[kind] += len(doomed)
+        return doomed
+
+
+# -------------------- 自动驾驶 --------------------
+AUTOPILOT_RESTART_DELAY_MS = 1_500  # 自动驾驶下游戏结束后自动重开的等待时间
+AUTOPILOT_SAFETY_CANDIDATES = 3     # 最多检查几个最近的食物是否安全
+AUTOPILOT_DIRECTIONS = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+
+
+class Autopilot:
+    """自动驾驶：每个移动步对棋盘做 BFS，吃最近且吃完还能追到尾巴的食物（无人值守压力测试用）"""
+    BLOCKED = 1 << 30
+
+    def __init__(self, game):
+        self.game = game
+        self.last_decision_ms = 0.0
+        self.max_decision_ms = 0.0
+
+    def steer(self):
+        """在蛇移动前调用，直接写入 game.next_direction"""
+        t0 = time.perf_counter()
+        try:
+            self._steer()
+        finally:
+            self.last_decision_ms = (time.perf_counter() - t0) * 1000.0
+            self.max_decision_ms = max(self.max_decision_ms, self.last_decision_ms)
+
+    def _steer(self):
+        g = self.game
+        w = GRID_WIDTH
+        h = GRID_HEIGHT
+        now = get_ticks()
+        step_ms = g.step_interval_ms / max(0.05, g.get_time_scale(now))
+        ghost_steps = int((g.ghost_end_time - now) // step_ms) if g.ghost_mode else 0
+
+        free_at, danger_now = self._build_hazards(now, step_ms)
+        portal_dest = {}
+        for a, b in g.portal_pairs.values():
+            portal_dest[a[1] * w + a[0]] = b[1] * w + b[0]
+            portal_dest[b[1] * w + b[0]] = a[1] * w + a[0]
+        portal_ready_step = max(0, math.ceil((g.portal_cooldown_until - now) / step_ms))
+
+        hx, hy = g.snake[0]
+        head = hy * w + hx
+        back = (-g.direction[0], -g.direction[1])
+        dist, parent, first = self._search(head, back, free_at, danger_now, portal_dest, portal_ready_step, ghost_steps)
+
+        # 1. 最近的几个食物中，选吃完之后还能追到尾巴的
+        targets = list(g.normal_foods) + list(g.energy_foods)
+        if g.ghost_mode and g.boss and not g.boss.shield_active:
+            targets.extend(g.boss.get_cells())
+        reachable = sorted(
+            (dist[y * w + x], y * w + x)
+            for x, y in targets
+            if 0 <= x < w and 0 <= y < h and dist[y * w + x] > 0
+        )
+        for _d, target in reachable[:AUTOPILOT_SAFETY_CANDIDATES]:
+            path = self._path(parent, target)
+            if self._tail_reachable_after(path, free_at):
+                self._apply(first[target])
+                return
+
+        # 2. 没有安全的食物：追着自己的尾巴走
+        tx, ty = g.snake[-1]
+        tail = ty * w + tx
+        if len(g.snake) > 2 and dist[tail] > 0:
+            self._apply(first[tail])
+            return
+
+        # 3. 选一个能活动空间最大的方向
+        best = None
+        best_area = -1
+        for k, (dx, dy) in enumerate(AUTOPILOT_DIRECTIONS):
+            if (dx, dy) == back:
+                continue
+            nx, ny = hx + dx, hy + dy
+            if not (0 <= nx < w and 0 <= ny < h):
+                continue
+            j = ny * w + nx
+            if dist[j] != 1:
+                continue
+            area = self._flood_area(j, free_at, limit=len(g.snake) * 2 + 8)
+            if area > best_area:
+                best, best_area = k, area
+        if best is not None:
+            self._apply(best)
+            return
+
+        # 4. 无路可走：有能量就开幽灵模式保命
+        if not g.ghost_mode and g.energy > 0:
+            g.toggle_ghost_mode()
+
+    def _apply(self, k):
+        if k is not None and k >= 0:
+            self.game.next_direction = AUTOPILOT_DIRECTIONS[k]
+
+    def _build_hazards(self, now, step_ms):
+        """free_at[i]：第几步之后才能进入格子 i；danger_now：只影响下一步的危险格"""
+        g = self.game
+        w = GRID_WIDTH
+        h = GRID_HEIGHT
+        blocked = self.BLOCKED
+        free_at = [0] * (w * h)
+        danger_now = set()
+
+        def block(pos, value=blocked):
+            x, y = pos
+            if 0 <= x < w and 0 <= y < h:
+                i = y * w + x
+                if free_at[i] < value:
+                    free_at[i] = value
+
+        # 自身：第 k 节在 (长度 - k + 1) 步后才会让出来（碰撞判定发生在去尾之前）
+        n = len(g.snake)
+        grow = g.grow_pending
+        for k, pos in enumerate(g.snake):
+            block(pos, n - k + 1 + grow)
+
+        for pos in g.obstacles:
+            block(pos)
+        # 地刺的显隐节奏和蛇步长对不上：当前可见的下一步不能踩，更远的一律绕开
+        for sp in g.spikes:
+            if sp.visible:
+                danger_now.add(sp.pos)
+            block(sp.pos, 2)
+        for ss in g.shadow_snakes:
+            for pos in ss.snake:
+                block(pos)
+            sx, sy = ss.snake[0]
+            for dx, dy in AUTOPILOT_DIRECTIONS:
+                danger_now.add(((sx + dx) % w, (sy + dy) % h))
+        for gh in g.ghost_hunters:
+            gx, gy = gh.pos
+            block(gh.pos)
+            for dx, dy in AUTOPILOT_DIRECTIONS:
+                block(((gx + dx) % w, (gy + dy) % h))
+        if g.boss:
+            for pos in g.boss.get_cells():
+                block(pos)
+            cells_per_step = BOSS_BULLET_SPEED * step_ms / 1000.0
+            for b in g.boss.bullets:
+                for t in range(4):
+                    block((int(round(b["x"] + b["dx"] * cells_per_step * t)), int(round(b["y"] + b["dy"] * cells_per_step * t))))
+        if len(g.snake) <= 4:
+            # 太短时剪刀会直接导致游戏结束
+            for it in g.items:
+                if it["type"] == ITEM_SCISSORS:
+                    block(it["pos"])
+        return free_at, {y * w + x for x, y in danger_now if 0 <= x < w and 0 <= y < h}
+
+    def _search(self, head, back, free_at, danger_now, portal_dest, portal_ready_step, ghost_steps):
+        """从蛇头出发的分层 BFS，考虑传送门、幽灵模式和身体随时间让出的格子"""
+        g = self.game
+        w = GRID_WIDTH
+        h = GRID_HEIGHT
+        size = w * h
+        dist = [-1] * size
+        parent = [-1] * size
+        first = [-1] * size
+        shield_cells = set()
+        if g.boss and g.boss.shield_active:
+            shield_cells = {y * w + x for x, y in g.boss.get_cells() if 0 <= x < w and 0 <= y < h}
+
+        dist[head] = 0
+        frontier = deque([head])
+        while frontier:
+            i = frontier.popleft()
+            d = dist[i] + 1
+            x = i % w
+            y = i // w
+            ghost = d <= ghost_steps
+            for k, (dx, dy) in enumerate(AUTOPILOT_DIRECTIONS):
+                if d == 1 and (dx, dy) == back:
+                    continue
+                nx = x + dx
+                ny = y + dy
+                if not (0 <= nx < w and 0 <= ny < h):
+                    if not ghost:
+                        continue
+                    nx %= w
+                    ny %= h
+                j = ny * w + nx
+                if d >= portal_ready_step and j in portal_dest:
+                    j = portal_dest[j]
+                if dist[j] != -1:
+                    continue
+                if j in shield_cells:
+                    continue
+                if not ghost:
+                    if free_at[j] >= d:
+                        continue
+                    if d == 1 and j in danger_now:
+                        continue
+                dist[j] = d
+                parent[j] = i
+                first[j] = k if d == 1 else first[i]
+                frontier.append(j)
+        return dist, parent, first
+
+    @staticmethod
+    def _path(parent, target):
+        path = []
+        i = target
+        while parent[i] != -1:
+            path.append(i)
+            i = parent[i]
+        path.reverse()
+        return path
+
+    def _tail_reachable_after(self, path, free_at):
+        """沿 path 吃到食物后，新蛇头还能走到新蛇尾（或有足够的活动空间）"""
+        g = self.game
+        w = GRID_WIDTH
+        body = [y * w + x for x, y in g.snake]
+        virtual = (path[::-1] + body)[: len(body) + 1]
+        if len(virtual) < 2:
+            return True
+        head = virtual[0]
+        tail = virtual[-1]
+        occupied = set(virtual[:-1])
+        limit = len(virtual) * 2
+        return self._flood_area(head, free_at, limit=limit, occupied=occupied, goal=tail) >= limit
+
+    def _flood_area(self, start, free_at, limit, occupied=None, goal=None):
+        """从 start 出发可到达的格子数（静态估计，达到 limit 或找到 goal 即提前返回 limit）"""
+        w = GRID_WIDTH
+        h = GRID_HEIGHT
+        blocked = self.BLOCKED
+        seen = {start}
+        frontier = deque([start])
+        while frontier:
+            i = frontier.popleft()
+            x = i % w
+            y = i // w
+            for dx, dy in AUTOPILOT_DIRECTIONS:
+                nx = x + dx
+                ny = y + dy
+                if not (0 <= nx < w and 0 <= ny < h):
+                    continue
+                j = ny * w + nx
+                if j == goal:
+                    return limit
+                if j in seen:
+                    continue
+                if occupied is not None:
+                    if j in occupied or free_at[j] >= blocked:
+                        continue
+                elif free_at[j] > 1:
+                    continue
+                seen.add(j)
+                if len(seen) >= limit:
+                    return limit
+                frontier.append(j)
+        return len(seen)
+
+
+# -------------------- 时光回溯 --------------------
+REWIND_WINDOW_MS = 60_000          # 至少能回溯多长的游戏时间
+REWIND_MAX_BYTES = 8 * 1024 * 1024  # 回溯缓冲区的内存上限（大地图时优先保证不超过它）
+REWIND_KEYFRAME_INTERVAL = 20      # 每隔多少个移动步存一个完整关键帧
+REWIND_SECONDS = 5_000             # 玩家按一次回溯退回的时间
+REWIND_CHARGES = 3                 # 每局可用的回溯次数
+
+
+class RewindBuffer:
+    """按移动步记录对局状态的环形缓冲：关键帧存全量，其余帧只存与上一步相比变化的字段"""
+    def __init__(self, window_ms=REWIND_WINDOW_MS, max_bytes=REWIND_MAX_BYTES, keyframe_interval=REWIND_KEYFRAME_INTERVAL):
+        self.window_ms = window_ms
+        self.max_bytes = max_bytes
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.snake_slot = SNAPSHOT_FIELDS.index("snake")
+        self.clear()
+
+    def clear(self):
+        self.segments = deque()  # 每段：[关键帧, 增量帧, ...]，帧都是 bytes
+        self.segment_elapsed = deque()  # 与 segments 对应：每帧的对局时间，查找时不用解码
+        self.segment_bytes = deque()
+        self.total_bytes = 0
+        self.prev_slots = None
+        self.prev_snake = None
+        self.prev_rng_words = None
+
+    def __len__(self):
+        return sum(len(seg) for seg in self.segments)
+
+    # -------- 编码 --------
+    def _slots(self, state):
+        """把状态元组拆成逐字段的 marshal 字节串，蛇身和随机数状态单独做增量"""
+        values, times = state[0], state[1]
+        slots = [marshal.dumps(v) for v in values]
+        slots[self.snake_slot] = b""
+        slots.extend(marshal.dumps(t) for t in times)
+        slots.extend(marshal.dumps(part) for part in state[2:-1])
+        return slots
+
+    def record(self, game, now):
+        """在每个移动步开始前调用（此时蛇还没动）"""
+        state = game.capture_state()
+        elapsed = game.get_run_elapsed_ms(now)
+        slots = self._slots(state)
+        snake = tuple(game.snake)
+        rng_version, rng_internal, rng_gauss = state[-1]
+        rng_words = rng_internal[:-1]
+
+        last = self.segments[-1] if self.segments else None
+        if last is None or len(last) >= self.keyframe_interval:
+            frame = zlib.compress(marshal.dumps((now, elapsed, slots, snake, state[-1])), 1)
+            self.segments.append([frame])
+            self.segment_elapsed.append([elapsed])
+            self.segment_bytes.append(len(frame))
+        else:
+            changes = [(i, b) for i, (a, b) in enumerate(zip(self.prev_slots, slots)) if a != b]
+            snake_delta = self._snake_delta(self.prev_snake, snake)
+            if rng_words == self.prev_rng_words:
+                rng_delta = (rng_internal[-1], rng_gauss)
+            else:
+                rng_delta = state[-1]
+            frame = marshal.dumps((now, elapsed, changes, snake_delta, rng_delta))
+            last.append(frame)
+            self.segment_elapsed[-1].append(elapsed)
+            self.segment_bytes[-1] += len(frame)
+        self.total_bytes += len(frame)
+        self.prev_slots = slots
+        self.prev_snake = snake
+        self.prev_rng_words = rng_words
+        self._evict(elapsed)
+
+    @staticmethod
+    def _snake_delta(prev, snake):
+        """蛇身一般只是头部加一格、尾部少几格：记成 (新头, 新长度)；其余情况存整条"""
+        n = len(snake)
+        for k in (1, 0):
+            if n >= k and snake[k:] == prev[:n - k]:
+                return (k, snake[:k], n)
+        return snake
+
+    def _evict(self, newest_elapsed):
+        # 时间窗：去掉最老一段后仍能覆盖整个窗口就丢弃；内存超限时无条件丢弃最老一段
+        while len(self.segments) > 1:
+            over_window = newest_elapsed - self.segment_elapsed[1][0] >= self.window_ms
+            if not over_window and self.total_bytes <= self.max_bytes:
+                break
+            self.segments.popleft()
+            self.segment_elapsed.popleft()
+            self.total_bytes -= self.segment_bytes.popleft()
+
+    # -------- 解码 --------
+    def _decode(self, seg_index, frame_index):
+        """从所在段的关键帧开始顺序应用增量，最多 keyframe_interval 步"""
+        seg = self.segments[seg_index]
+        now, elapsed, slots, snake, rng_state = marshal.loads(zlib.decompress(seg[0]))
+        slots = list(slots)
+        snake = list(snake)
+        for frame in seg[1:frame_index + 1]:
+            now, elapsed, changes, snake_delta, rng_delta = marshal.loads(frame)
+            for i, b in changes:
+                slots[i] = b
+            if len(snake_delta) == 3 and isinstance(snake_delta[0], int):
+                k, heads, n = snake_delta
+                snake = list(heads) + snake[:n - k]
+            else:
+                snake = list(snake_delta)
+            if len(rng_delta) == 2:
+                version, internal, _gauss = rng_state
+                rng_state = (version, internal[:-1] + (rng_delta[0],), rng_delta[1])
+            else:
+                rng_state = rng_delta
+
+        n_values = len(SNAPSHOT_FIELDS)
+        n_times = len(SNAPSHOT_TIME_FIELDS)
+        values = [marshal.loads(b) if b else None for b in slots[:n_values]]
+        values[self.snake_slot] = snake
+        times = tuple(marshal.loads(b) for b in slots[n_values:n_values + n_times])
+        parts = tuple(marshal.loads(b) for b in slots[n_values + n_times:])
+        state = (tuple(values), times) + parts + (rng_state,)
+        return now, elapsed, state
+
+    def _locate(self, target_elapsed):
+        """找到不晚于 target_elapsed 的最后一帧；都比它晚时返回最早的一帧"""
+        for si in range(len(self.segments) - 1, 0, -1):
+            if self.segment_elapsed[si][0] <= target_elapsed:
+                break
+        else:
+            si = 0
+        elapsed = self.segment_elapsed[si]
+        for fi in range(len(elapsed) - 1, 0, -1):
+            if elapsed[fi] <= target_elapsed:
+                return si, fi
+        return si, 0
+
+    def _restore(self, game, seg_index, frame_index):
+        now, _elapsed, state = self._decode(seg_index, frame_index)
+        # 目标帧之后（含目标帧）的记录全部作废；恢复后的下一步会重新记录它
+        while len(self.segments) > seg_index + 1:
+            self.segments.pop()
+            self.segment_elapsed.pop()
+            self.total_bytes -= self.segment_bytes.pop()
+        seg = self.segments[seg_index]
+        for frame in seg[frame_index:]:
+            self.segment_bytes[-1] -= len(frame)
+            self.total_bytes -= len(frame)
+        del seg[frame_index:]
+        del self.segment_elapsed[-1][frame_index:]
+        if not seg:
+            self.segments.pop()
+            self.segment_elapsed.pop()
+            self.segment_bytes.pop()
+        self.prev_slots = None
+        self.prev_snake = None
+        self.prev_rng_words = None
+        if self.segments:
+            # 下一帧的增量需要以当前段最后一帧为基准
+            _n, _e, prev_state = self._decode(len(self.segments) - 1, len(self.segments[-1]) - 1)
+            self.prev_slots = self._slots(prev_state)
+            self.prev_snake = tuple(prev_state[0][self.snake_slot])
+            self.prev_rng_words = prev_state[-1][1][:-1]
+        game.apply_state(state, now)
+        return True
+
+    def rewind(self, game, ms):
+        """退回 ms 毫秒（按对局时间算，不含暂停）；缓冲区为空时返回 False"""
+        if not self.segments:
+            return False
+        target = self._locate(game.get_run_elapsed_ms(get_ticks()) - ms)
+        return self._restore(game, *target)
+
+    def step_back(self, game):
+        """退回一个移动步（QA 逐步排查用）"""
+        if not self.segments:
+            return False
+        return self._restore(game, len(self.segments) - 1, len(self.segments[-1]) - 1)
+
+
+# -------------------- 排行榜存储 --------------------
+class SqliteLeaderboard:
+    """SQLite 排行榜：保存每一局的完整记录，排行榜只是一次带 LIMIT 的索引查询"""
+    def __init__(self, path, fsync: bool = True):
+        self.path = path
+        # 写入在后台写线程进行，读取在主线程，连接由锁保护
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA synchronous = FULL" if fsync else "PRAGMA synchronous = OFF")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT,
+                score INTEGER NOT NULL,
+                length INTEGER NOT NULL DEFAULT 0,
+                duration_ms INTEGER NOT NULL DEFAULT 0,
+                cause TEXT NOT NULL DEFAULT '',
+                created_at REAL NOT NULL
+            );
+            -- 只有留了名字的局才参与排行，未留名的局只作为历史记录
+            CREATE INDEX IF NOT EXISTS idx_runs_score ON runs(score DESC, id) WHERE name IS NOT NULL;
+            CREATE INDEX IF NOT EXISTS idx_runs_player ON runs(name, score DESC);
+            """
+        )
+        self.conn.commit()
+
+    def is_empty(self):
+        with self.lock:
+            return self.conn.execute("SELECT 1 FROM runs LIMIT 1").fetchone() is None
+
+    def import_entries(self, entries):
+        """导入旧的 JSON 排行榜（只有名字和分数）"""
+        now = time.time()
+        rows = [
+            (str(e["name"]), int(e["score"]), now)
+            for e in entries
+            if isinstance(e, dict) and "name" in e and "score" in e
+        ]
+        with self.lock:
+            self.conn.executemany("INSERT INTO runs (name, score, created_at) VALUES (?, ?, ?)", rows)
+            self.conn.commit()
+
+    def record_run(self, score, length, duration_ms, cause, name=None, created_at=None):
+        """记录一局；name 为 None 表示未留名（只进历史，不参与排行）"""
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO runs (name, score, length, duration_ms, cause, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    name,
+                    int(score),
+                    int(length),
+                    int(duration_ms),
+                    str(cause),
+                    time.time() if created_at is None else float(created_at),
+                ),
+            )
+            self.conn.commit()
+
+    def top(self, limit):
+        """前 limit 名，格式与 JSON 排行榜一致：[{"name": 玩家名, "score": 分数}, ...]"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT name, score FROM runs WHERE name IS NOT NULL ORDER BY score DESC, id LIMIT ?",
+                (int(limit),),
+            ).fetchall()
+        return [{"name": name, "score": score} for name, score in rows]
+
+    def player_history(self, name, limit=20):
+        """某个玩家最近的对局记录"""
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT score, length, duration_ms, cause, created_at FROM runs WHERE name = ? ORDER BY id DESC LIMIT ?",
+                (name, int(limit)),
+            ).fetchall()
+        return [
+            {"score": score, "length": length, "duration_ms": duration_ms, "cause": cause, "created_at": created_at}
+            for score, length, duration_ms, cause, created_at in rows
+        ]
+
+    def player_best(self, name):
+        with self.lock:
+            row = self.conn.execute("SELECT MAX(score) FROM runs WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else None
+
+    def close(self):
+        with self.lock:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+
+
+class LeaderboardWriter:
+    """后台排行榜写线程：有界队列 + 同 key 合并写入，渲染线程只负责入队，从不碰磁盘"""
+    _WAKE = object()  # 只用来叫醒写线程去处理 overflow，pending 里没有对应任务
+
+    def __init__(self, maxsize=LEADERBOARD_WRITE_QUEUE_SIZE):
+        self.queue = queue.Queue(maxsize=max(1, int(maxsize)))
+        self.pending = {}    # key -> 最新的写入任务
+        self.overflow = []   # 队列满时没能入队的 key，任务仍在 pending 里，由写线程顺带处理
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, name="leaderboard-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, key, job):
+        """提交无参写入任务；同一 key 还没写出时只保留最新的任务"""
+        with self.lock:
+            coalesced = key in self.pending
+            self.pending[key] = job
+        if coalesced:
+            return
+        try:
+            self.queue.put_nowait(key)
+        except queue.Full:
+            # 队列满说明磁盘跟不上：记进 overflow，写线程处理完手上的任务会接着写，渲染线程不等磁盘
+            with self.lock:
+                self.overflow.append(key)
+            try:
+                # 如果此刻写线程已经把队列清空并睡下了，叫醒它；仍然满则队列里的任务处理完时会顺带处理
+                self.queue.put_nowait(self._WAKE)
+            except queue.Full:
+                pass
+
+    def _execute(self, job):
+        if job is None:
+            return
+        try:
+            job()
+        except Exception as e:
+            print(f"保存排行榜失败: {e}")
+
+    def _run(self):
+        while True:
+            key = self.queue.get()
+            try:
+                if key is None:
+                    self._drain_overflow()
+                    return
+                with self.lock:
+                    job = self.pending.pop(key, None)
+                self._execute(job)
+                self._drain_overflow()
+            finally:
+                self.queue.task_done()
+
+    def _drain_overflow(self):
+        while True:
+            with self.lock:
+                if not self.overflow:
+                    return
+                job = self.pending.pop(self.overflow.pop(0), None)
+            self._execute(job)
+
+    def flush(self):
+        """等待已提交的写入全部完成"""
+        if self.thread.is_alive():
+            self.queue.join()
+
+    def close(self):
+        """写完剩余任务后结束写线程"""
+        if self.thread.is_alive():
+            self.queue.put(None)
+            self.thread.join()
+
 
 class SnakeGame:
-    def __init__(self):
+    def __init__(self, headless: bool = False, display: str = DISPLAY_WINDOW, bloom: bool = False,
+                 vsync: bool = False, pacing: str = PACING_SLEEP, lazy: bool = False, trace_startup: bool = False):
+        # headless=True：不打开窗口、不加载音频和排行榜，只跑游戏规则（批量模拟 / AI 训练用）
+        # display：DISPLAY_MODES 之一，决定内部画面怎么显示到屏幕上；bloom：开局即开启整屏泛光
+        # vsync：等垂直同步再翻页；pacing：PACING_MODES 之一，游戏进行中每帧怎么等
+        # lazy：只初始化显示和字体就画开始界面，音频和对局状态等第一次按键再准备
+        # trace_startup：打印从进程启动到第一帧各阶段的耗时
+        self.headless = headless
+        if headless:
+            self.init_headless()
+            return
+
+        self.trace_startup = trace_startup
+        self.startup_trace = StartupTrace(STARTUP_T0)
+        self.startup_trace.mark("导入模块 / 解析参数")
+        self.deferred_init = lazy
+
         pygame.mixer.pre_init(44100, -16, 1, 512)
-        pygame.init()
+        if lazy:
+            pygame.display.init()
+            pygame.font.init()
+            # pygame.init() 之前 pygame.time.get_ticks() 恒为 0；SDL 的毫秒计数从显示初始化开始，先用同一起点顶上
+            base = time.perf_counter()
+            set_tick_source(lambda: int((time.perf_counter() - base) * 1000))
+            self.startup_trace.mark("显示 / 字体子系统")
+        else:
+            pygame.init()
+            self.startup_trace.mark("pygame.init")
         pygame.display.set_caption("技能贪吃蛇 - 幽灵模式 + 动态障碍")
 
         # 设置窗口图标
@@ -495,20 +2364,30 @@ class SnakeGame:
         except Exception as e:
             print(f"加载图标失败: {e}")
 
-        self.screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+        self.open_display(display, vsync)
         self.clock = pygame.time.Clock()
+        self.pacer = FramePacer(self.clock, pacing)
+        self.startup_trace.mark("图标 / 窗口")
         # 使用支持中文的字体列表，前面优先中文，后面兜底英文
         font_candidates = ["Microsoft YaHei", "SimHei", "Noto Sans CJK SC", "consolas"]
-        self.font_small = pygame.font.SysFont(font_candidates, 18)
-        self.font_medium = pygame.font.SysFont(font_candidates, 24, bold=True)  # 中等字体，用于最高分
-        self.font_big = pygame.font.SysFont(font_candidates, 36, bold=True)
-        self.font_xlarge = pygame.font.SysFont(font_candidates, 48, bold=True)  # 特大字体，用于标题
+        fonts = FontCache()
+        self.font_small = fonts.font(font_candidates, 18)
+        self.font_medium = fonts.font(font_candidates, 24, bold=True)  # 中等字体，用于最高分
+        self.font_big = fonts.font(font_candidates, 36, bold=True)
+        self.font_xlarge = fonts.font(font_candidates, 48, bold=True)  # 特大字体，用于标题
+        fonts.save()
+        self.startup_trace.mark("字体")
 
         # 渲染帧率（固定）
         self.fps = RENDER_FPS
 
         # 排行榜相关
+        self.leaderboard_store = self.open_leaderboard_store()
+        self.leaderboard_writer = LeaderboardWriter()
+        self.pending_run = None        # sqlite 后端：等待玩家留名后再写入的本局记录
+        self.leaderboard_write_seq = 0
         self.leaderboard = self.load_leaderboard()
+        self.startup_trace.mark("排行榜")
         self.show_leaderboard = False  # 是否显示排行榜界面
         self.entering_name = False     # 是否正在输入名字
         self.player_name_input = ""    # 输入的名字
@@ -520,11 +2399,105 @@ class SnakeGame:
         # 粒子系统
         self.particle_system = ParticleSystem()
 
+        # 预渲染小图缓存（蛇身等每帧重复绘制的图形）和按层批量提交的 blit 队列
+        self.sprite_atlas = SpriteAtlas()
+        self.render_queue = RenderQueue()
+        self.obstacle_layer = ObstacleLayer()
+        self.frame_cache = FrameCache(self.sprite_atlas)
+        self.overlays = OverlayPool()
+        self.text_cache = SpriteAtlas(TEXT_CACHE_MAX)
+
+        # 各类实体的数量上限 / 存活时间；F3 打开调试面板查看实时数量
+        self.entity_budget = EntityBudget()
+        self.show_debug = False
+
+        # 按实测帧耗时自动调整画质
+        self.quality = QualityGovernor()
+        self.input_latency = LatencyStats()
+        # 整屏泛光（F4 开关），最低画质档会自动跳过
+        self.bloom = BloomPass()
+        self.bloom_enabled = bloom
+
+        # 自动驾驶（F2 开关），用于无人值守的长时间压力测试
+        self.autopilot = None
+
+        # 快速存档（F5 存 / F9 读），保存在内存里
+        self.quicksave = None
+
+        # 时光回溯（Backspace 退回 5 秒；QA 模式下暂停时按 , 逐步后退）
+        self.rewind_buffer = RewindBuffer()
+        self.qa_mode = False
+        self.startup_trace.mark("缓存 / 子系统对象")
+
         self.audio_enabled = False
         self.sfx = {}
+        if lazy:
+            self.started = False
+            return
         self.init_audio()
+        self.startup_trace.mark("音频")
+
+        self.reset(start_with_intro=True)
+        self.startup_trace.mark("对局状态")
 
+    def finish_deferred_init(self):
+        """lazy 模式：第一次按键（或自动驾驶开局）时补上其余子系统、音频和对局状态"""
+        if not self.deferred_init:
+            return
+        self.deferred_init = False
+        trace = StartupTrace()
+        pygame.init()
+        set_tick_source(None)
+        trace.mark("pygame.init（其余子系统）")
+        self.init_audio()
+        trace.mark("音频")
         self.reset(start_with_intro=True)
+        trace.mark("对局状态")
+        if self.trace_startup:
+            trace.report("延迟初始化")
+
+    def init_headless(self, populate: bool = True):
+        # populate=False：只搭空壳，随后由 restore() 填入对局状态
+        self.screen = None
+        self.window = None
+        self.display_mode = None
+        self.clock = None
+        self.pacer = None
+        self.deferred_init = False
+        self.startup_trace = None
+        self.fps = RENDER_FPS
+
+        self.leaderboard_store = None
+        self.leaderboard_writer = None
+        self.pending_run = None
+        self.leaderboard_write_seq = 0
+        self.leaderboard = []
+        self.show_leaderboard = False
+        self.entering_name = False
+        self.player_name_input = ""
+        self.paused = False
+        self.show_help = False
+        self.help_page = 0
+        self.help_paused_game = False
+
+        self.particle_system = ParticleSystem(enabled=False)
+        self.obstacle_layer = None
+        self.entity_budget = EntityBudget()
+        self.show_debug = False
+        self.quality = QualityGovernor()
+        self.input_latency = LatencyStats()
+        self.bloom = None
+        self.bloom_enabled = False
+        self.autopilot = None
+        self.quicksave = None
+        self.rewind_buffer = None  # 无头模式不记录，省下每步的编码开销
+        self.qa_mode = False
+
+        self.audio_enabled = False
+        self.sfx = {}
+
+        if populate:
+            self.reset(start_with_intro=False)
 
     def init_audio(self):
         try:
@@ -649,8 +2622,13 @@ class SnakeGame:
     def reset(self, start_with_intro: bool = False):
         # start_with_intro=True 表示回到启动界面，仅首次进入使用；
         # 复盘（按 R）时使用 start_with_intro=False，直接开新局。
+        if self.pending_run is not None:
+            self.commit_pending_run()
         self.started = not start_with_intro
-        self.last_move_time = pygame.time.get_ticks()
+        self.rewind_charges = REWIND_CHARGES
+        if getattr(self, "rewind_buffer", None) is not None:
+            self.rewind_buffer.clear()
+        self.last_move_time = get_ticks()
         self.step_interval_ms = STEP_INTERVAL_MS
         center = (GRID_WIDTH // 2, GRID_HEIGHT // 2)
         self.snake = [
@@ -660,6 +2638,12 @@ class SnakeGame:
         ]
         self.direction = (1, 0)  # 初始向右
         self.next_direction = self.direction
+        # 排队的转向：(方向, 按下时刻)，每次移动取一个
+        self.input_queue = deque()
+        self.camera_x = 0.0
+        self.camera_y = 0.0
+        self.view_cells = (0, 0, VIEW_WIDTH - 1, VIEW_HEIGHT - 1)
+        self.update_camera(snap=True)
 
         self.score = 0
         self.normal_food_eaten = 0
@@ -680,7 +2664,7 @@ class SnakeGame:
         self.rainbow_until = 0
 
         self.shrink_remaining = 0
-        self.last_shrink_time = pygame.time.get_ticks()
+        self.last_shrink_time = get_ticks()
 
         self.magnet_flights = []
         self.magnet_active_until = 0
@@ -722,6 +2706,9 @@ class SnakeGame:
 
         self.normal_food_meta = {}
         self.energy_food_meta = {}
+        self.rebuild_spatial_index()
+        if self.obstacle_layer is not None:
+            self.obstacle_layer.invalidate()
 
         self.energy = 1  # 初始给一点能量试试新玩法
         self.ghost_mode = False
@@ -764,14 +2751,14 @@ class SnakeGame:
 
         self.spawn_fog_zone(force=True)
 
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         self.next_portal_refresh_time = now + random.randint(PORTAL_REFRESH_MIN, PORTAL_REFRESH_MAX)
         self.next_spike_refresh_time = now + random.randint(SPIKE_REFRESH_MIN, SPIKE_REFRESH_MAX)
         self.next_shadow_spawn_time = now + random.randint(SHADOW_SNAKE_SPAWN_MIN, SHADOW_SNAKE_SPAWN_MAX)
         self.next_ghost_spawn_time = now + random.randint(GHOST_HUNTER_INVISIBLE_MIN, GHOST_HUNTER_INVISIBLE_MAX)
         self.next_fog_zone_refresh_time = now + random.randint(FOG_ZONE_REFRESH_MIN_MS, FOG_ZONE_REFRESH_MAX_MS)
 
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         self.next_item_spawn_time = now + random.randint(ITEM_SPAWN_MIN, ITEM_SPAWN_MAX)
 
         self.game_over = False
@@ -782,7 +2769,7 @@ class SnakeGame:
         self.help_page = 0
         self.help_paused_game = False
 
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         self.run_start_time = now if self.started else 0
         self.run_end_time = None
         self.paused_time_accum = 0
@@ -790,9 +2777,146 @@ class SnakeGame:
 
         self.clear_start_path()
 
+    # -------------------- 存档快照 --------------------
+    def capture_state(self):
+        """对局状态元组（只含基本类型，但会引用游戏里的可变列表，需要立即序列化）"""
+        return (
+            tuple(getattr(self, name) for name in SNAPSHOT_FIELDS),
+            tuple(getattr(self, name) for name in SNAPSHOT_TIME_FIELDS),
+            [sp.to_state() for sp in self.spikes],
+            [ss.to_state() for ss in self.shadow_snakes],
+            [gh.to_state() for gh in self.ghost_hunters],
+            self.boss.to_state() if self.boss else None,
+            self.fog_zones,
+            self.magnet_flights,
+            self.bomb_explosions,
+            random.getstate(),
+        )
+
+    def snapshot(self, compress: bool = True) -> bytes:
+        """把完整对局状态（含随机数状态）打包成紧凑的二进制；粒子等纯视觉效果不保存"""
+        payload = marshal.dumps(self.capture_state())
+        flags = 0
+        if compress:
+            payload = zlib.compress(payload, 1)
+            flags |= SNAPSHOT_FLAG_ZLIB
+        return SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_VERSION, flags, get_ticks()) + payload
+
+    def restore(self, data: bytes, restore_rng: bool = True):
+        """从 snapshot() 的结果恢复对局；所有计时按当前时钟平移，读档后倒计时从存档那一刻继续"""
+        magic, version, flags, saved_now = SNAPSHOT_HEADER.unpack_from(data)
+        if magic != SNAPSHOT_MAGIC:
+            raise ValueError("不是贪吃蛇存档")
+        if version != SNAPSHOT_VERSION:
+            raise ValueError(f"不支持的存档版本: {version}")
+        payload = memoryview(data)[SNAPSHOT_HEADER.size:]
+        if flags & SNAPSHOT_FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+        self.apply_state(marshal.loads(payload), saved_now, restore_rng)
+
+    def apply_state(self, state, saved_now: int, restore_rng: bool = True):
+        """把 capture_state() 的结果（必须是独立的副本）装回对局，计时按 saved_now 平移"""
+        (values, times, spikes, shadow_snakes, ghost_hunters, boss,
+         fog_zones, magnet_flights, bomb_explosions, rng_state) = state
+
+        shift = get_ticks() - saved_now
+        for name, value in zip(SNAPSHOT_FIELDS, values):
+            setattr(self, name, value)
+        for name, t in zip(SNAPSHOT_TIME_FIELDS, times):
+            setattr(self, name, t + shift if t else t)
+
+        self.spikes = [Spike.from_state(st, shift) for st in spikes]
+        self.shadow_snakes = [ShadowSnake.from_state(st, shift) for st in shadow_snakes]
+        self.ghost_hunters = [GhostHunter.from_state(st, shift) for st in ghost_hunters]
+        self.boss = Boss.from_state(boss, shift) if boss is not None else None
+        for z in fog_zones:
+            z["spawn"] += shift
+        for f in magnet_flights:
+            f["start"] += shift
+        for e in bomb_explosions:
+            e["start"] += shift
+        self.fog_zones = fog_zones
+        self.magnet_flights = magnet_flights
+        self.bomb_explosions = bomb_explosions
+
+        self.input_queue = deque()
+        # 传送门不进快照，由 portal_pairs 重新生成
+        self.portals = []
+        self.rebuild_spatial_index()
+        self.rebuild_portals()
+        if self.obstacle_layer is not None:
+            self.obstacle_layer.invalidate()
+        self.particle_system.particles = []
+        if restore_rng:
+            random.setstate(rng_state)
+
+    @classmethod
+    def from_snapshot(cls, data: bytes, restore_rng: bool = True):
+        """直接用快照建一个无头对局（不跑 reset），给机器人前瞻搜索复制局面用"""
+        game = cls.__new__(cls)
+        game.headless = True
+        game.init_headless(populate=False)
+        game.restore(data, restore_rng)
+        return game
+
+    def quick_save(self):
+        if self.started and not self.entering_name:
+            self.quicksave = self.snapshot()
+
+    def quick_load(self):
+        if self.quicksave is None or self.entering_name:
+            return
+        if self.pending_run is not None:
+            self.commit_pending_run()
+        self.restore(self.quicksave)
+        self.show_leaderboard = False
+        if self.rewind_buffer is not None:
+            self.rewind_buffer.clear()
+
+    def rewind(self):
+        """消耗一次回溯，退回 REWIND_SECONDS 之前的局面（回溯次数本身不随局面回退）"""
+        if self.rewind_buffer is None or self.rewind_charges <= 0:
+            return
+        if self.rewind_buffer.rewind(self, REWIND_SECONDS):
+            self.rewind_charges -= 1
+            self.play_sfx("portal_02")
+
+    def rewind_step_back(self):
+        """QA：暂停状态下逐个移动步往回退，保持暂停"""
+        if self.rewind_buffer is None or not self.paused:
+            return
+        if self.rewind_buffer.step_back(self):
+            self.set_paused(True)
+
     # -------------------- 排行榜相关 --------------------
+    def open_leaderboard_store(self):
+        """按 LEADERBOARD_BACKEND 打开 sqlite 存储；json 后端或打开失败时返回 None"""
+        if LEADERBOARD_BACKEND != "sqlite":
+            return None
+        try:
+            store = SqliteLeaderboard(LEADERBOARD_DB_FILE, fsync=LEADERBOARD_FSYNC)
+            # 首次启用 sqlite 时把旧的 JSON 排行榜导入进来
+            if store.is_empty():
+                legacy = self.load_leaderboard_json()
+                if legacy:
+                    store.import_entries(legacy)
+            return store
+        except Exception as e:
+            print(f"打开排行榜数据库失败，改用 JSON: {e}")
+            return None
+
     def load_leaderboard(self):
-        """从文件加载排行榜，格式：[{"name": "玩家名", "score": 分数}, ...]"""
+        """加载排行榜，格式：[{"name": "玩家名", "score": 分数}, ...]"""
+        if self.leaderboard_store is not None:
+            try:
+                return self.leaderboard_store.top(MAX_LEADERBOARD_ENTRIES)
+            except Exception as e:
+                print(f"读取排行榜数据库失败: {e}")
+                return []
+        return self.load_leaderboard_json()
+
+    def load_leaderboard_json(self):
+        """从 JSON 文件加载排行榜"""
         if not os.path.exists(LEADERBOARD_FILE):
             return []
         try:
@@ -803,12 +2927,23 @@ class SnakeGame:
             return []
 
     def save_leaderboard(self):
-        """保存排行榜到文件"""
-        try:
-            with open(LEADERBOARD_FILE, "w", encoding="utf-8") as f:
-                json.dump(self.leaderboard, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            print(f"保存排行榜失败: {e}")
+        """把排行榜交给后台写线程保存（sqlite 后端在写入对局记录时已落盘）"""
+        if self.leaderboard_store is not None or self.leaderboard_writer is None:
+            return
+        snapshot = [dict(e) for e in self.leaderboard]
+        # 同一时刻只需要最新的排行榜，未写出的旧快照会被合并掉
+        self.leaderboard_writer.submit("json", lambda: self.write_leaderboard_json(snapshot))
+
+    @staticmethod
+    def write_leaderboard_json(entries):
+        """写临时文件后原子替换，避免写到一半断电损坏排行榜"""
+        tmp_path = LEADERBOARD_FILE + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entries, f, ensure_ascii=False, indent=2)
+            f.flush()
+            if LEADERBOARD_FSYNC:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, LEADERBOARD_FILE)
 
     def is_high_score(self, score):
         """判断分数是否能进入排行榜"""
@@ -816,47 +2951,313 @@ class SnakeGame:
             return True
         return score > self.leaderboard[-1]["score"]
 
+    def record_run(self):
+        """sqlite 后端：每局结束都记录分数、时长、长度和死因，留名（或跳过）后再写入"""
+        self.pending_run = None
+        if self.leaderboard_store is None:
+            return
+        self.pending_run = {
+            "score": self.score,
+            "length": len(self.snake),
+            "duration_ms": self.get_run_elapsed_ms(get_ticks()),
+            "cause": self.game_over_reason,
+            "created_at": time.time(),
+        }
+
+    def commit_pending_run(self, name=None):
+        """把本局记录交给后台写线程；name 为 None 表示未留名"""
+        run = self.pending_run
+        self.pending_run = None
+        if run is None or self.leaderboard_store is None or self.leaderboard_writer is None:
+            return
+        store = self.leaderboard_store
+        self.leaderboard_write_seq += 1
+        self.leaderboard_writer.submit(("run", self.leaderboard_write_seq), lambda: store.record_run(name=name, **run))
+
+    def flush_leaderboard(self):
+        """退出前把未写出的排行榜数据全部落盘"""
+        self.commit_pending_run()
+        if self.leaderboard_writer is not None:
+            self.leaderboard_writer.close()
+        if self.leaderboard_store is not None:
+            self.leaderboard_store.close()
+
     def add_to_leaderboard(self, name, score):
-        """添加记录到排行榜并排序"""
+        """添加记录到排行榜并排序（内存中立即生效，落盘在后台进行）"""
+        if self.leaderboard_store is not None:
+            if self.pending_run is None:
+                self.pending_run = {"score": score, "length": len(self.snake), "duration_ms": 0, "cause": ""}
+            self.commit_pending_run(name)
         self.leaderboard.append({"name": name, "score": score})
         self.leaderboard.sort(key=lambda x: x["score"], reverse=True)
         self.leaderboard = self.leaderboard[:MAX_LEADERBOARD_ENTRIES]
         self.save_leaderboard()
 
-    # -------------------- 工具函数 --------------------
-    def random_empty_cell(self):
-        """从空白位置里随机挑一个网格坐标"""
-        occupied = set(self.snake) | self.obstacles
-        if getattr(self, "fog_zones", None):
-            occupied |= set(self.get_fog_zone_cells_all())
+    # -------------------- 空间索引 --------------------
+    def rebuild_spatial_index(self):
+        """按当前实体列表重建整个空间索引（开局 / 读档后调用）"""
+        self.spatial = SpatialHash()
         for pos in self.normal_foods:
-            occupied.add(pos)
+            self.spatial.add(SPATIAL_FOOD, pos)
         for pos in self.energy_foods:
-            occupied.add(pos)
-        for it in self.items:
-            occupied.add(it["pos"])
+            self.spatial.add(SPATIAL_ENERGY, pos)
+        for pos in self.obstacles:
+            self.spatial.add(SPATIAL_OBSTACLE, pos)
+        self.bits = BitBoard(GRID_WIDTH, GRID_HEIGHT)
+        self.bits.load(SPATIAL_FOOD, self.normal_foods)
+        self.bits.load(SPATIAL_ENERGY, self.energy_foods)
+        self.bits.load(SPATIAL_OBSTACLE, self.obstacles)
+        self.bits_dirty = set()
+        for kind in SPATIAL_OBJECT_KINDS:
+            for obj in self.entity_list(kind):
+                self.index_entity(kind, obj)
+
+    def entity_list(self, kind):
+        """按对象登记的种类对应的实体列表"""
+        if kind == SPATIAL_ITEM:
+            return self.items
+        if kind == SPATIAL_SPIKE:
+            return self.spikes
+        if kind == SPATIAL_PORTAL:
+            return self.portals
+        if kind == SPATIAL_HUNTER:
+            return self.ghost_hunters
+        if kind == SPATIAL_SHADOW:
+            return self.shadow_snakes
+        if kind == SPATIAL_BULLET and self.boss:
+            return self.boss.bullets
+        return []
+
+    def entity_cells(self, kind, obj):
+        """实体在索引里的 (坐标, key) 列表；影子蛇每一节都登记一次，key 带上节序号"""
+        if kind == SPATIAL_ITEM:
+            return [(obj["pos"], id(obj))]
+        if kind == SPATIAL_SHADOW:
+            return [(seg, (id(obj), i)) for i, seg in enumerate(obj.snake)]
+        if kind == SPATIAL_BULLET:
+            return [((int(round(obj["x"])), int(round(obj["y"]))), id(obj))]
+        return [(obj.pos, id(obj))]
+
+    def index_entity(self, kind, obj):
+        """登记一个实体；已经登记过的再调用一次就是移动"""
+        for pos, key in self.entity_cells(kind, obj):
+            self.spatial.add(kind, pos, obj, key)
+        if kind == SPATIAL_SHADOW:
+            # 影子蛇变短时注销多出来的节
+            where = self.spatial.where.get(kind, {})
+            i = len(obj.snake)
+            while (id(obj), i) in where:
+                self.spatial.remove(kind, (id(obj), i))
+                i += 1
+        self.bits_dirty.add(kind)
+
+    def unindex_entity(self, kind, obj):
+        if kind == SPATIAL_SHADOW:
+            where = self.spatial.where.get(kind, {})
+            i = 0
+            while (id(obj), i) in where:
+                self.spatial.remove(kind, (id(obj), i))
+                i += 1
+        else:
+            self.spatial.remove(kind, id(obj))
+        self.bits_dirty.add(kind)
+
+    def index_bullets(self):
+        """子弹每步都在飞：逐颗更新位置，已经飞出地图的注销"""
+        bullets = self.boss.bullets if self.boss else []
+        live = {id(b) for b in bullets}
+        for key in [k for k in self.spatial.where.get(SPATIAL_BULLET, {}) if k not in live]:
+            self.spatial.remove(SPATIAL_BULLET, key)
+        for b in bullets:
+            self.index_entity(SPATIAL_BULLET, b)
+        self.bits_dirty.add(SPATIAL_BULLET)
+
+    def query_area(self, x0, y0, x1, y1, kinds=None):
+        """查询地图内矩形 [x0, x1] x [y0, y1] 里的实体，返回 {kind: [obj, ...]}"""
+        return self.spatial.query_rect(
+            max(0, x0), max(0, y0), min(GRID_WIDTH - 1, x1), min(GRID_HEIGHT - 1, y1), kinds
+        )
+
+    def query_around(self, center, radius, kinds=None):
+        cx, cy = center
+        return self.query_area(cx - radius, cy - radius, cx + radius, cy + radius, kinds)
+
+    def layer_cells(self, kind):
+        if kind == BIT_SNAKE:
+            return self.snake
+        if kind == BIT_FOG:
+            return self.get_fog_zone_cells_all() if self.fog_zones else ()
+        if kind == BIT_BOSS:
+            return self.boss.get_cells() if self.boss else ()
+        return list(self.spatial.where.get(kind, {}).values())
+
+    def layer_bits(self, *kinds):
+        """几层位棋盘的并集；食物 / 能量 / 障碍物随增删更新，其余种类登记变动后用到时按索引重新载入"""
+        bits = 0
+        for kind in kinds:
+            if kind in BIT_VOLATILE_KINDS or kind in self.bits_dirty:
+                self.bits.load(kind, self.layer_cells(kind))
+                self.bits_dirty.discard(kind)
+            bits |= self.bits.get(kind)
+        return bits
+
+    def occupied_bits(self, include_fog: bool = True):
+        """生成新东西时不能占用的格子"""
+        kinds = (
+            BIT_SNAKE, SPATIAL_OBSTACLE, SPATIAL_FOOD, SPATIAL_ENERGY, SPATIAL_ITEM,
+            SPATIAL_PORTAL, SPATIAL_SPIKE, SPATIAL_SHADOW, SPATIAL_HUNTER, BIT_BOSS,
+        )
+        if include_fog:
+            kinds += (BIT_FOG,)
+        return self.layer_bits(*kinds)
+
+    def fog_zone_mask(self, center):
+        return self.bits.around(center, FOG_ZONE_SIZE // 2)
+
+    def clear_fog_zones(self, area):
+        """删掉和掩码 area 有重叠的迷雾区"""
+        if self.fog_zones:
+            self.fog_zones = [z for z in self.fog_zones if not (self.fog_zone_mask(z["center"]) & area)]
+
+    def clear_cell_layers(self, area):
+        """清掉掩码 area 里的障碍物 / 普通食物 / 能量食物，返回被清掉的障碍物格子"""
+        for c in self.bits.cells(self.bits.get(SPATIAL_FOOD) & area):
+            self.remove_normal_food(c)
+        for c in self.bits.cells(self.bits.get(SPATIAL_ENERGY) & area):
+            self.remove_energy_food(c)
+        removed = self.bits.cells(self.bits.get(SPATIAL_OBSTACLE) & area)
+        for c in removed:
+            self.remove_obstacle(c)
+        return removed
+
+    def remove_spatial_hits(self, hits, kinds):
+        """把查询命中的尖刺 / 道具 / 猎手 / 影子蛇 / 子弹从各自列表里删掉"""
+        for kind in kinds:
+            found = hits.get(kind)
+            if not found:
+                continue
+            gone = {id(obj) for obj in found}
+            for obj in found:
+                self.unindex_entity(kind, obj)
+            if kind == SPATIAL_SPIKE:
+                self.spikes = [sp for sp in self.spikes if id(sp) not in gone]
+            elif kind == SPATIAL_ITEM:
+                self.items = [it for it in self.items if id(it) not in gone]
+            elif kind == SPATIAL_HUNTER:
+                self.ghost_hunters = [gh for gh in self.ghost_hunters if id(gh) not in gone]
+            elif kind == SPATIAL_SHADOW:
+                self.shadow_snakes = [ss for ss in self.shadow_snakes if id(ss) not in gone]
+            elif kind == SPATIAL_BULLET and self.boss:
+                self.boss.bullets = [b for b in self.boss.bullets if id(b) not in gone]
+
+    def rebuild_portals(self):
         for p in self.portals:
-            occupied.add(p.pos)
-        for s in self.spikes:
-            occupied.add(s.pos)
-        for ss in self.shadow_snakes:
-            for seg in ss.snake:
-                occupied.add(seg)
-        for gh in self.ghost_hunters:
-            occupied.add(gh.pos)
-        if self.boss:
-            for cell in self.boss.get_cells():
-                occupied.add(cell)
-
-        all_cells = [
-            (x, y)
-            for x in range(GRID_WIDTH)
-            for y in range(GRID_HEIGHT)
-            if (x, y) not in occupied
-        ]
-        if not all_cells:
-            return None
-        return random.choice(all_cells)
+            self.unindex_entity(SPATIAL_PORTAL, p)
+        self.portals = []
+        for cid, (a, b) in self.portal_pairs.items():
+            self.portals.append(Portal(a, cid))
+            self.portals.append(Portal(b, cid))
+        for p in self.portals:
+            self.index_entity(SPATIAL_PORTAL, p)
+
+    def add_normal_food(self, cell, meta=None):
+        self.normal_foods.append(cell)
+        self.spatial.add(SPATIAL_FOOD, cell)
+        self.bits.add(SPATIAL_FOOD, cell)
+        if meta is not None:
+            self.normal_food_meta[cell] = meta
+        elif cell in self.normal_food_meta:
+            del self.normal_food_meta[cell]
+
+    def remove_normal_food(self, cell):
+        """移除一个普通食物，返回它的 meta（没有则 None）"""
+        self.normal_foods.remove(cell)
+        self.spatial.remove(SPATIAL_FOOD, cell)
+        self.bits.discard(SPATIAL_FOOD, cell)
+        return self.normal_food_meta.pop(cell, None)
+
+    def add_energy_food(self, cell, meta=None):
+        self.energy_foods.append(cell)
+        self.spatial.add(SPATIAL_ENERGY, cell)
+        self.bits.add(SPATIAL_ENERGY, cell)
+        if meta is not None:
+            self.energy_food_meta[cell] = meta
+        elif cell in self.energy_food_meta:
+            del self.energy_food_meta[cell]
+
+    def remove_energy_food(self, cell):
+        self.energy_foods.remove(cell)
+        self.spatial.remove(SPATIAL_ENERGY, cell)
+        self.bits.discard(SPATIAL_ENERGY, cell)
+        return self.energy_food_meta.pop(cell, None)
+
+    def add_obstacle(self, cell):
+        self.obstacles.add(cell)
+        self.spatial.add(SPATIAL_OBSTACLE, cell)
+        self.bits.add(SPATIAL_OBSTACLE, cell)
+        if self.obstacle_layer is not None:
+            self.obstacle_layer.mark(cell)
+
+    def remove_obstacle(self, cell):
+        self.obstacles.discard(cell)
+        self.spatial.remove(SPATIAL_OBSTACLE, cell)
+        self.bits.discard(SPATIAL_OBSTACLE, cell)
+        if self.obstacle_layer is not None:
+            self.obstacle_layer.mark(cell)
+
+    # -------------------- 实体预算 --------------------
+    def entity_counts(self):
+        return {
+            SPATIAL_OBSTACLE: len(self.obstacles),
+            SPATIAL_FOOD: len(self.normal_foods),
+            SPATIAL_ENERGY: len(self.energy_foods),
+            SPATIAL_ITEM: len(self.items),
+            SPATIAL_SPIKE: len(self.spikes),
+            SPATIAL_HUNTER: len(self.ghost_hunters),
+            SPATIAL_SHADOW: len(self.shadow_snakes),
+        }
+
+    def budget_entries(self, kind):
+        """(坐标, 对象, 出生时间或 None) 列表：列表里的实体按出现先后排；
+        障碍物和食物存在 set 里没有先后，它们用 DESPAWN_FARTHEST，不依赖顺序"""
+        if kind == SPATIAL_OBSTACLE:
+            return [(c, c, None) for c in self.obstacles]
+        if kind == SPATIAL_FOOD:
+            return [(c, c, None) for c in self.normal_foods]
+        if kind == SPATIAL_ENERGY:
+            return [(c, c, None) for c in self.energy_foods]
+        if kind == SPATIAL_SHADOW:
+            return [(ss.snake[0], ss, ss.born) for ss in self.shadow_snakes]
+        return [(pos, obj, None) for obj in self.entity_list(kind) for pos, _key in self.entity_cells(kind, obj)]
+
+    def enforce_entity_budget(self, now):
+        """每个逻辑步检查一次；平时只比较数量，超限或到期时才挑出要删的实体"""
+        budget = self.entity_budget
+        counts = self.entity_counts()
+        for kind, count in counts.items():
+            if kind not in budget.budgets or not budget.over(kind, count):
+                continue
+            doomed = budget.pick(kind, self.budget_entries(kind), now, self.snake[0])
+            if not doomed:
+                continue
+            if kind == SPATIAL_OBSTACLE:
+                for c in doomed:
+                    self.remove_obstacle(c)
+            elif kind == SPATIAL_FOOD:
+                for c in doomed:
+                    self.remove_normal_food(c)
+            elif kind == SPATIAL_ENERGY:
+                for c in doomed:
+                    self.remove_energy_food(c)
+            else:
+                self.remove_spatial_hits({kind: doomed}, (kind,))
+            counts[kind] -= len(doomed)
+        budget.live = counts
+
+    # -------------------- 工具函数 --------------------
+    def random_empty_cell(self):
+        """从空白位置里随机挑一个网格坐标"""
+        return self.sample_free_cell(self.occupied_bits())
 
     def get_fog_zone_cells(self, center):
         cx, cy = center
@@ -872,35 +3273,17 @@ class SnakeGame:
     def random_empty_cell_avoid_head(self, avoid_radius: int):
         if avoid_radius <= 0:
             return self.random_empty_cell()
-        hx, hy = self.snake[0]
-        occupied = set(self.snake) | self.obstacles
-        if getattr(self, "fog_zones", None):
-            occupied |= set(self.get_fog_zone_cells_all())
-        for pos in self.normal_foods:
-            occupied.add(pos)
-        for pos in self.energy_foods:
-            occupied.add(pos)
-        for it in self.items:
-            occupied.add(it["pos"])
-        for p in self.portals:
-            occupied.add(p.pos)
-        for s in self.spikes:
-            occupied.add(s.pos)
-        for ss in self.shadow_snakes:
-            for seg in ss.snake:
-                occupied.add(seg)
-        for gh in self.ghost_hunters:
-            occupied.add(gh.pos)
-        if self.boss:
-            for cell in self.boss.get_cells():
-                occupied.add(cell)
-
-        all_cells = [
-            (x, y)
-            for x in range(GRID_WIDTH)
-            for y in range(GRID_HEIGHT)
-            if (x, y) not in occupied and (abs(x - hx) > avoid_radius or abs(y - hy) > avoid_radius)
-        ]
+        occupied = self.occupied_bits() | self.bits.around(self.snake[0], avoid_radius)
+        return self.sample_free_cell(occupied)
+
+    def sample_free_cell(self, occupied):
+        """occupied 是位棋盘掩码；先随机抽格子（大地图上几乎一次命中），连续抽不中再退回整图扫描"""
+        for _ in range(RANDOM_CELL_TRIES):
+            x = random.randrange(GRID_WIDTH)
+            y = random.randrange(GRID_HEIGHT)
+            if not (occupied >> (y * GRID_WIDTH + x)) & 1:
+                return (x, y)
+        all_cells = self.bits.cells(self.bits.full & ~occupied)
         if not all_cells:
             return None
         return random.choice(all_cells)
@@ -911,17 +3294,13 @@ class SnakeGame:
             cell = self.random_empty_cell()
             if cell is None:
                 break
-            if cell in self.normal_food_meta:
-                del self.normal_food_meta[cell]
-            self.normal_foods.append(cell)
+            self.add_normal_food(cell)
 
         # 30% 概率生成能量食物（如果当前没有）
         if not self.energy_foods and random.random() < 0.3:
             cell = self.random_empty_cell()
             if cell is not None:
-                if cell in self.energy_food_meta:
-                    del self.energy_food_meta[cell]
-                self.energy_foods.append(cell)
+                self.add_energy_food(cell)
 
     def spawn_item(self):
         if len(self.items) >= ITEM_MAX_ON_MAP:
@@ -947,10 +3326,12 @@ class SnakeGame:
                 self.has_spawned_rotten_apple = True
             if item_type == ITEM_BOMB:
                 self.has_spawned_bomb = True
-        self.items.append({"type": item_type, "pos": cell})
+        item = {"type": item_type, "pos": cell}
+        self.items.append(item)
+        self.index_entity(SPATIAL_ITEM, item)
 
     def on_normal_food_eaten(self, pos, counts_for_boss: bool = True, color_override=None):
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         if now - self.last_food_eat_time <= COMBO_WINDOW:
             self.combo_streak = min(3, self.combo_streak + 1)
         else:
@@ -989,6 +3370,8 @@ class SnakeGame:
             self.spawn_boss()
 
     def spawn_portals(self):
+        for p in self.portals:
+            self.unindex_entity(SPATIAL_PORTAL, p)
         self.portals = []
         self.portal_pairs = {}
         self.portal_lookup = {}
@@ -1002,6 +3385,8 @@ class SnakeGame:
             portal1 = Portal(p1, color_id)
             portal2 = Portal(p2, color_id)
             self.portals.extend([portal1, portal2])
+            self.index_entity(SPATIAL_PORTAL, portal1)
+            self.index_entity(SPATIAL_PORTAL, portal2)
             self.portal_pairs[color_id] = (p1, p2)
             self.portal_lookup[p1] = color_id
             self.portal_lookup[p2] = color_id
@@ -1025,58 +3410,39 @@ class SnakeGame:
         self.portal_lookup[p1] = color_id
         self.portal_lookup[p2] = color_id
 
-        self.portals = []
-        for cid, (a, b) in self.portal_pairs.items():
-            self.portals.append(Portal(a, cid))
-            self.portals.append(Portal(b, cid))
+        self.rebuild_portals()
 
     def draw_portals(self):
-        now = pygame.time.get_ticks()
+        view_x, view_y = self.view_origin()
+        now = get_ticks()
+        glow_step = self.entity_glow_step()
         pulse = abs((now % 1000) / 500 - 1)
-        slow_pulse = 0.5 + 0.5 * math.sin(now / 650.0)
+        w = int(CELL_SIZE * 0.66)
+        h = int(CELL_SIZE * 1.00)
+        # subtle highlight
+        a = int(24 + 38 * (1.0 - pulse))
+        highlight = self.sprite_atlas.get(("portal_highlight", a), lambda: render_portal_highlight(a))
+        queue = self.render_queue
         for p in self.portals:
             x, y = p.pos
-            cx = x * CELL_SIZE + CELL_SIZE // 2
-            cy = GAME_AREA_Y + y * CELL_SIZE + CELL_SIZE // 2
+            if not self.in_view(x, y):
+                continue
+            cx = view_x + x * CELL_SIZE + CELL_SIZE // 2
+            cy = view_y + y * CELL_SIZE + CELL_SIZE // 2
             base = p.color
 
-            # vertical ellipse portal body
-            w = int(CELL_SIZE * 0.66)
-            h = int(CELL_SIZE * 1.00)
-            outer_rect = pygame.Rect(0, 0, w, h)
-            outer_rect.center = (cx, cy)
-
-            # glow halo
-            halo_pad = 18
-            halo = pygame.Surface((w + halo_pad * 2, h + halo_pad * 2), pygame.SRCALPHA)
-            hr = halo.get_rect()
-            glow_outer = int(max(w, h) * (0.62 + 0.10 * slow_pulse))
-            glow_inner = int(max(w, h) * 0.42)
-            steps = 8
-            for i in range(steps, 0, -1):
-                # keep a baseline so halo never fully disappears
-                a = int((28 + 55 * slow_pulse) * (i / steps))
-                expand = int((glow_outer - glow_inner) * (1.0 - i / steps))
-                rr = hr.inflate(-expand, -expand)
-                pygame.draw.ellipse(halo, (*base, a), rr, width=3)
-            self.screen.blit(halo, (outer_rect.centerx - hr.width // 2, outer_rect.centery - hr.height // 2))
-
-            # portal rim
-            pygame.draw.ellipse(self.screen, base, outer_rect, width=2)
-
-            # inner void gradient-ish
-            inner = outer_rect.inflate(-10, -12)
-            pygame.draw.ellipse(self.screen, (10, 5, 20), inner)
-            pygame.draw.ellipse(self.screen, (40, 10, 70), inner, width=2)
-
-            # subtle highlight
-            highlight = pygame.Surface((w, h), pygame.SRCALPHA)
-            hl_rect = highlight.get_rect()
-            a = int(24 + 38 * (1.0 - pulse))
-            pygame.draw.ellipse(highlight, (255, 255, 255, a), hl_rect.inflate(-12, -18), width=2)
-            self.screen.blit(highlight, outer_rect.topleft)
+            # glow halo + rim + inner void（随 sin(now / 650) 呼吸）
+            halo = self.frame_cache.frame(
+                ("portal", base, glow_step), PORTAL_HALO_PERIOD_MS, now,
+                lambda phase: render_portal_halo(base, phase, glow_step),
+            )
+            queue.push(halo, (cx - halo.get_width() // 2, cy - halo.get_height() // 2))
+            queue.push(highlight, (cx - w // 2, cy - h // 2))
+        queue.flush(self.screen)
 
     def spawn_spikes(self):
+        for sp in self.spikes:
+            self.unindex_entity(SPATIAL_SPIKE, sp)
         self.spikes = []
         count = random.randint(SPIKE_COUNT_MIN, SPIKE_COUNT_MAX)
         for _ in range(count):
@@ -1089,7 +3455,9 @@ class SnakeGame:
                 break
             if cell is None:
                 break
-            self.spikes.append(Spike(cell))
+            spike = Spike(cell)
+            self.spikes.append(spike)
+            self.index_entity(SPATIAL_SPIKE, spike)
 
     def refresh_one_spike(self):
         if not self.spikes:
@@ -1106,88 +3474,66 @@ class SnakeGame:
             return
         spike.pos = cell
         spike.visible = True
-        spike.last_toggle = pygame.time.get_ticks()
+        spike.last_toggle = get_ticks()
+        self.index_entity(SPATIAL_SPIKE, spike)
 
     def draw_spikes(self):
+        view_x, view_y = self.view_origin()
+        glow_step = self.entity_glow_step()
+        sprite = self.sprite_atlas.get(("spike", glow_step), lambda: render_spike(glow_step))
+        half = sprite.get_width() // 2
         for s in self.spikes:
             if not s.visible:
                 continue
             x, y = s.pos
-            cx = x * CELL_SIZE + CELL_SIZE // 2
-            cy = GAME_AREA_Y + y * CELL_SIZE + CELL_SIZE // 2
-            color = (180, 180, 180)
-            for r in range(14, 6, -2):
-                a = int(55 * (1 - (14 - r) / 14))
-                surf = pygame.Surface((r * 2, r * 2), pygame.SRCALPHA)
-                pygame.draw.circle(surf, (*color, a), (r, r), r)
-                self.screen.blit(surf, (cx - r, cy - r))
-            half_w = max(4, CELL_SIZE // 6)
-            pts = [
-                (cx, cy - CELL_SIZE // 2 + 4),
-                (cx - half_w, cy + CELL_SIZE // 4),
-                (cx + half_w, cy + CELL_SIZE // 4),
-            ]
-            pygame.draw.polygon(self.screen, (230, 230, 230), pts)
+            if not self.in_view(x, y):
+                continue
+            cx = view_x + x * CELL_SIZE + CELL_SIZE // 2
+            cy = view_y + y * CELL_SIZE + CELL_SIZE // 2
+            self.screen.blit(sprite, (cx - half, cy - half))
 
     def draw_fog(self):
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         if now >= self.fog_active_until:
             return
         radius = self.fog_radius
         hx, hy = self.snake[0]
+        view_x, view_y = self.view_origin()
         vis_rect = pygame.Rect(
-            (hx - radius) * CELL_SIZE,
-            (hy - radius) * CELL_SIZE,
+            view_x + (hx - radius) * CELL_SIZE,
+            view_y - GAME_AREA_Y + (hy - radius) * CELL_SIZE,
             (radius * 2 + 1) * CELL_SIZE,
             (radius * 2 + 1) * CELL_SIZE,
         )
 
-        fog = pygame.Surface((SCREEN_WIDTH, CELL_SIZE * GRID_HEIGHT), pygame.SRCALPHA)
-        fog.fill((0, 0, 0, 235))
+        fog = self.overlays.get((SCREEN_WIDTH, CELL_SIZE * VIEW_HEIGHT), fill=(0, 0, 0, 235))
         pygame.draw.rect(fog, (0, 0, 0, 0), vis_rect)
         self.screen.blit(fog, (0, GAME_AREA_Y))
 
     def spawn_fog_zone(self, force: bool = False):
         if not force and len(self.fog_zones) >= FOG_ZONE_MAX_ON_MAP:
             return
-        occupied = set(self.snake) | self.obstacles | set(self.normal_foods) | set(self.energy_foods)
-        for it in self.items:
-            occupied.add(it["pos"])
-        for p in self.portals:
-            occupied.add(p.pos)
-        for s in self.spikes:
-            occupied.add(s.pos)
-        for ss in self.shadow_snakes:
-            for seg in ss.snake:
-                occupied.add(seg)
-        for gh in self.ghost_hunters:
-            occupied.add(gh.pos)
-        if self.boss:
-            for cell in self.boss.get_cells():
-                occupied.add(cell)
+        # 不压任何东西、不和已有迷雾区重叠、离蛇头 2 格以外
+        blocked = self.occupied_bits() | self.bits.around(self.snake[0], 2)
 
         half = FOG_ZONE_SIZE // 2
         for _try in range(120):
             cx = random.randint(half, GRID_WIDTH - 1 - half)
             cy = random.randint(half, GRID_HEIGHT - 1 - half)
-            cells = self.get_fog_zone_cells((cx, cy))
-            hx, hy = self.snake[0]
-            if any(abs(x - hx) <= 2 and abs(y - hy) <= 2 for x, y in cells):
-                continue
-            if any(c in occupied for c in cells):
-                continue
-            if any(c in self.get_fog_zone_cells_all() for c in cells):
+            if self.fog_zone_mask((cx, cy)) & blocked:
                 continue
 
-            self.fog_zones.append({"center": (cx, cy), "spawn": pygame.time.get_ticks()})
+            self.fog_zones.append({"center": (cx, cy), "spawn": get_ticks()})
             if len(self.fog_zones) > FOG_ZONE_MAX_ON_MAP:
                 self.fog_zones = self.fog_zones[-FOG_ZONE_MAX_ON_MAP:]
             return
 
     def draw_fog_zone(self):
+        view_x, view_y = self.view_origin()
         if not self.fog_zones:
             return
-        now = pygame.time.get_ticks()
+        now = get_ticks()
+        fog_noise = self.quality.tier["fog_noise"]
 
         for z in self.fog_zones:
             t = (now - z["spawn"]) % FOG_ZONE_ALPHA_PERIOD_MS
@@ -1197,14 +3543,19 @@ class SnakeGame:
             a = int((60 + 160 * wave) * spawn_fade)
             cx, cy = z["center"]
             half = FOG_ZONE_SIZE // 2
+            if not self.in_view(cx, cy, margin=half + 1):
+                continue
             for x in range(cx - half, cx + half + 1):
                 for y in range(cy - half, cy + half + 1):
                     if not (0 <= x < GRID_WIDTH and 0 <= y < GRID_HEIGHT):
                         continue
-                    rect = pygame.Rect(x * CELL_SIZE + 3, GAME_AREA_Y + y * CELL_SIZE + 3, CELL_SIZE - 6, CELL_SIZE - 6)
+                    rect = pygame.Rect(view_x + x * CELL_SIZE + 3, view_y + y * CELL_SIZE + 3, CELL_SIZE - 6, CELL_SIZE - 6)
                     surf = pygame.Surface((CELL_SIZE - 6, CELL_SIZE - 6), pygame.SRCALPHA)
                     pygame.draw.rect(surf, (40, 0, 60, a), surf.get_rect(), border_radius=6)
                     pygame.draw.rect(surf, (180, 0, 255, min(255, a + 55)), surf.get_rect(), 2, border_radius=6)
+                    if not fog_noise:
+                        self.screen.blit(surf, rect.topleft)
+                        continue
                     seed = ((x << 16) ^ (y << 4) ^ (now // 90)) & 0xFFFFFFFF
                     rr = random.Random(seed)
                     for _ in range(3):
@@ -1236,17 +3587,10 @@ class SnakeGame:
         if not cells:
             return
 
+        path = 0
         for c in cells:
-            if c in self.obstacles:
-                self.obstacles.remove(c)
-            if c in self.normal_foods:
-                self.normal_foods.remove(c)
-                if c in self.normal_food_meta:
-                    del self.normal_food_meta[c]
-            if c in self.energy_foods:
-                self.energy_foods.remove(c)
-                if c in self.energy_food_meta:
-                    del self.energy_food_meta[c]
+            path |= self.bits.around(c, 0)
+        self.clear_cell_layers(path)
 
         for sp in self.spikes:
             if sp.pos in cells:
@@ -1262,15 +3606,10 @@ class SnakeGame:
                 if new_pos is not None:
                     sp.pos = new_pos
                     sp.visible = True
-                    sp.last_toggle = pygame.time.get_ticks()
+                    sp.last_toggle = get_ticks()
+                    self.index_entity(SPATIAL_SPIKE, sp)
 
-        if self.fog_zones:
-            remaining = []
-            for z in self.fog_zones:
-                if set(cells).intersection(self.get_fog_zone_cells(z["center"])):
-                    continue
-                remaining.append(z)
-            self.fog_zones = remaining
+        self.clear_fog_zones(path)
 
         self.spawn_food()
 
@@ -1279,7 +3618,9 @@ class SnakeGame:
         if start is None:
             return
         length = random.randint(4, 7)
-        self.shadow_snakes.append(ShadowSnake(start, length=length))
+        ss = ShadowSnake(start, length=length)
+        self.shadow_snakes.append(ss)
+        self.index_entity(SPATIAL_SHADOW, ss)
 
     def shadow_snake_die(self, ss):
         self.play_sfx("destroy_enemy_01")
@@ -1299,8 +3640,7 @@ class SnakeGame:
                     continue
                 if p in self.snake:
                     continue
-                self.normal_foods.append(p)
-                self.normal_food_meta[p] = {"counts_for_boss": False, "color": (180, 180, 255)}
+                self.add_normal_food(p, {"counts_for_boss": False, "color": (180, 180, 255)})
                 break
 
         for seg in body:
@@ -1317,41 +3657,45 @@ class SnakeGame:
             res = ss.update(food_targets, self.obstacles, GRID_WIDTH, GRID_HEIGHT, time_scale=time_scale)
             if not res:
                 continue
+            # 每条移动后立即登记：下面抢食物后补刷食物会用到占用情况
+            self.index_entity(SPATIAL_SHADOW, ss)
             new_head, ate = res
 
             # 抢食物
             if new_head in self.normal_foods:
                 self.play_sfx("food_stolen")
-                self.normal_foods.remove(new_head)
-                if new_head in self.normal_food_meta:
-                    del self.normal_food_meta[new_head]
+                self.remove_normal_food(new_head)
                 self.spawn_food()
             if new_head in self.energy_foods:
                 self.play_sfx("energy_stolen")
-                self.energy_foods.remove(new_head)
-                if new_head in self.energy_food_meta:
-                    del self.energy_food_meta[new_head]
+                self.remove_energy_food(new_head)
                 self.spawn_food()
 
             # 它的头撞到你：它死
             if new_head in self.snake:
                 self.shadow_snakes.remove(ss)
+                self.unindex_entity(SPATIAL_SHADOW, ss)
                 self.shadow_snake_die(ss)
                 continue
 
             # 影子蛇不会因撞到障碍死亡；穿墙已处理
 
     def draw_shadow_snakes(self):
+        view_x, view_y = self.view_origin()
+        glow_step = self.entity_glow_step()
+        head = self.sprite_atlas.get(
+            ("shadow", True, glow_step), lambda: render_shadow_segment((180, 180, 255), CELL_SIZE // 2 - 3, glow_step))
+        body = self.sprite_atlas.get(
+            ("shadow", False, glow_step), lambda: render_shadow_segment((120, 120, 180), int(CELL_SIZE * 0.35), glow_step))
         for ss in self.shadow_snakes:
             for i, (x, y) in enumerate(ss.snake):
-                cx = x * CELL_SIZE + CELL_SIZE // 2
-                cy = GAME_AREA_Y + y * CELL_SIZE + CELL_SIZE // 2
-                col = (120, 120, 180) if i > 0 else (180, 180, 255)
-                r = CELL_SIZE // 2 - 3 if i == 0 else int(CELL_SIZE * 0.35)
-                s = pygame.Surface((r * 2, r * 2), pygame.SRCALPHA)
-                pygame.draw.circle(s, (*col, 120), (r, r), r)
-                self.screen.blit(s, (cx - r, cy - r))
-                pygame.draw.circle(self.screen, col, (cx, cy), max(2, r - 2))
+                if not self.in_view(x, y):
+                    continue
+                sprite = head if i == 0 else body
+                r = sprite.get_width() // 2
+                cx = view_x + x * CELL_SIZE + CELL_SIZE // 2
+                cy = view_y + y * CELL_SIZE + CELL_SIZE // 2
+                self.screen.blit(sprite, (cx - r, cy - r))
 
     def spawn_ghost_hunter(self):
         if len(self.ghost_hunters) >= GHOST_HUNTER_COUNT_MAX:
@@ -1359,10 +3703,12 @@ class SnakeGame:
         cell = self.random_empty_cell_avoid_head(2)
         if cell is None:
             return
-        self.ghost_hunters.append(GhostHunter(cell))
+        gh = GhostHunter(cell)
+        self.ghost_hunters.append(gh)
+        self.index_entity(SPATIAL_HUNTER, gh)
 
     def update_ghost_hunters(self, time_scale: float = 1.0):
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         for gh in self.ghost_hunters:
             appeared = gh.update()
             if appeared:
@@ -1375,35 +3721,35 @@ class SnakeGame:
             target = self.snake[0]
             for gh in self.ghost_hunters:
                 gh.move_towards(target, GRID_WIDTH, GRID_HEIGHT)
+                self.index_entity(SPATIAL_HUNTER, gh)
 
     def draw_ghost_hunters(self):
+        view_x, view_y = self.view_origin()
+        glow_step = self.entity_glow_step()
+        r = CELL_SIZE // 2 - 4
         for gh in self.ghost_hunters:
             x, y = gh.pos
-            cx = x * CELL_SIZE + CELL_SIZE // 2
-            cy = GAME_AREA_Y + y * CELL_SIZE + CELL_SIZE // 2
-            base = (255, 0, 0)
+            if not self.in_view(x, y):
+                continue
+            cx = view_x + x * CELL_SIZE + CELL_SIZE // 2
+            cy = view_y + y * CELL_SIZE + CELL_SIZE // 2
             alpha = 150 if gh.visible else 45
-            r = CELL_SIZE // 2 - 4
-            surf = pygame.Surface((r * 2, r * 2), pygame.SRCALPHA)
-            pygame.draw.circle(surf, (*base, alpha), (r, r), r)
-            # inner glow
-            pygame.draw.circle(surf, (255, 120, 120, max(0, alpha - 40)), (r, r), max(2, r - 5))
-            self.screen.blit(surf, (cx - r, cy - r))
+            body = self.sprite_atlas.get(("hunter", alpha, r), lambda: render_ghost_hunter(alpha, r))
+            self.screen.blit(body, (cx - r, cy - r))
             if gh.visible:
                 pygame.draw.circle(self.screen, (255, 80, 80), (cx - 4, cy - 4), 3)
                 pygame.draw.circle(self.screen, (255, 80, 80), (cx + 4, cy - 4), 3)
                 # wispy tail
-                tail = pygame.Surface((r * 3, r * 3), pygame.SRCALPHA)
-                tr = tail.get_rect()
-                for i in range(6):
-                    a = int(55 * (1 - i / 6))
-                    pygame.draw.circle(tail, (255, 80, 80, a), (tr.centerx, tr.centery + 6 + i * 2), max(1, r - 3 - i * 2))
-                self.screen.blit(tail, (cx - tr.centerx, cy - tr.centery + 10))
+                if glow_step:
+                    tail = self.sprite_atlas.get(("hunter_tail", r, glow_step), lambda: render_ghost_hunter_tail(r, glow_step))
+                    tr = tail.get_rect()
+                    self.screen.blit(tail, (cx - tr.centerx, cy - tr.centery + 10))
 
     def draw_shockwave(self):
+        view_x, view_y = self.view_origin()
         if not self.shockwave_active or not self.shockwave_center:
             return
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         elapsed = now - self.shockwave_start_time
         if elapsed >= SHOCKWAVE_DURATION_MS:
             self.shockwave_active = False
@@ -1411,12 +3757,12 @@ class SnakeGame:
         p = max(0.0, min(1.0, elapsed / max(1, SHOCKWAVE_DURATION_MS)))
 
         cx, cy = self.shockwave_center
-        sx = cx * CELL_SIZE + CELL_SIZE // 2
-        sy = GAME_AREA_Y + cy * CELL_SIZE + CELL_SIZE // 2
+        sx = view_x + cx * CELL_SIZE + CELL_SIZE // 2
+        sy = view_y + cy * CELL_SIZE + CELL_SIZE // 2
         max_r = int(max(SCREEN_WIDTH, SCREEN_HEIGHT) * 0.85)
         r = int(18 + (max_r - 18) * (p ** 0.85))
 
-        surf = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
+        surf = self.overlays.get((SCREEN_WIDTH, SCREEN_HEIGHT))
         base = self.shockwave_color
         a0 = int(160 * (1.0 - p))
         for w in (10, 6, 3):
@@ -1425,19 +3771,18 @@ class SnakeGame:
         self.screen.blit(surf, (0, 0))
 
     def draw_boss_kill_flash(self):
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         if now >= self.boss_kill_flash_until:
             return
         elapsed = now - self.boss_kill_flash_start
         p = max(0.0, min(1.0, elapsed / max(1, BOSS_KILL_FLASH_DURATION_MS)))
         pulse = 0.5 + 0.5 * math.sin(elapsed / 55.0)
         alpha = int((60 + 120 * pulse) * (1.0 - p))
-        surf = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        surf.fill((255, 255, 255, alpha))
+        surf = self.overlays.get((SCREEN_WIDTH, SCREEN_HEIGHT), fill=(255, 255, 255, alpha))
         self.screen.blit(surf, (0, 0))
 
     def draw_boss_kill_freeze_overlay(self):
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         if now >= self.boss_kill_slow_until:
             return
         start = self.boss_kill_slow_start
@@ -1447,68 +3792,80 @@ class SnakeGame:
         p = max(0.0, min(1.0, (now - start) / dur))
         fade = 0.5 - 0.5 * math.cos(2.0 * math.pi * p)
         alpha = int(120 * fade)
-        surf = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        surf.fill((40, 80, 140, alpha))
+        surf = self.overlays.get((SCREEN_WIDTH, SCREEN_HEIGHT), fill=(40, 80, 140, alpha))
         self.screen.blit(surf, (0, 0))
 
-    def spawn_boss(self):
-        hx, hy = self.snake[0]
-        # candidate centers (boss is 3x3); avoid head 5x5
-        candidates = []
-        for x in range(1, GRID_WIDTH - 1):
-            for y in range(1, GRID_HEIGHT - 1):
-                if abs(x - hx) <= 2 and abs(y - hy) <= 2:
-                    continue
-                candidates.append((x, y))
-        random.shuffle(candidates)
-
-        def clear_cell(c):
-            if c in self.obstacles:
-                self.obstacles.remove(c)
-            if c in self.normal_foods:
-                self.normal_foods.remove(c)
-                if c in self.normal_food_meta:
-                    del self.normal_food_meta[c]
-            if c in self.energy_foods:
-                self.energy_foods.remove(c)
-                if c in self.energy_food_meta:
-                    del self.energy_food_meta[c]
-            if self.items:
-                self.items = [it for it in self.items if it.get("pos") != c]
-            if self.spikes:
-                self.spikes = [sp for sp in self.spikes if sp.pos != c]
-            if self.ghost_hunters:
-                self.ghost_hunters = [gh for gh in self.ghost_hunters if gh.pos != c]
-            if self.fog_zones:
-                self.fog_zones = [z for z in self.fog_zones if c not in self.get_fog_zone_cells(z["center"]) ]
-
-        for pos in candidates[:80]:
-            x, y = pos
-            cells = [(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)]
-            # clear anything occupying the footprint (except snake)
-            if any(c in self.snake for c in cells):
+    def pick_footprint(self, k: int, hard, soft):
+        """随机挑一个能放下 k×k 实体的位置（返回左上角）：不碰 hard 里的格子，且压到的 soft 格子最少；放不下返回 None"""
+        if k > GRID_WIDTH or k > GRID_HEIGHT:
+            return None
+        # 占用网格：soft 记 1，hard 记一个比任何合法窗口都大的值，一张前缀和表算出每个窗口的代价
+        blocked = k * k + 1
+        # k >= 16 时 blocked 超过 255，用 array('I') 而不是 bytearray
+        grid = [array("I", [0]) * GRID_WIDTH for _ in range(GRID_HEIGHT)]
+        for cells, value in ((soft, 1), (hard, blocked)):
+            for x, y in cells:
+                if 0 <= x < GRID_WIDTH and 0 <= y < GRID_HEIGHT:
+                    grid[y][x] = value
+        best = blocked
+        rows = []
+        for y, cost in enumerate(window_sums(summed_area_table(grid), k)):
+            m = min(cost)
+            if m < best:
+                best = m
+                rows = []
+            if m == best and m < blocked:
+                rows.append((y, cost, cost.count(m)))
+        if not rows:
+            return None
+        # 在所有最优窗口里均匀抽一个
+        r = random.randrange(sum(n for _y, _cost, n in rows))
+        for y, cost, n in rows:
+            if r >= n:
+                r -= n
                 continue
-            for c in cells:
-                clear_cell(c)
+            x = -1
+            for _ in range(r + 1):
+                x = cost.index(best, x + 1)
+            return x, y
+        return None
 
-            if self.shadow_snakes:
-                for ss in self.shadow_snakes[:]:
-                    if any(seg in cells for seg in ss.snake):
-                        self.shadow_snakes.remove(ss)
-
-            self.boss = Boss(pos)
-            self.play_sfx("boss_appear_01")
+    def spawn_boss(self):
+        # Boss 占 3x3，中心离蛇头至少 3 格（等价于不压蛇头周围 3x3）；蛇身不能压，其余东西能避开就避开，避不开再清掉
+        hard = self.layer_bits(BIT_SNAKE) | self.bits.around(self.snake[0], 1)
+        soft = self.layer_bits(
+            SPATIAL_OBSTACLE, SPATIAL_FOOD, SPATIAL_ENERGY, SPATIAL_ITEM,
+            SPATIAL_SPIKE, SPATIAL_HUNTER, SPATIAL_SHADOW, BIT_FOG,
+        )
+        footprint = self.pick_footprint(3, self.bits.cells(hard), self.bits.cells(soft))
+        if footprint is None:
             return
+        x0, y0 = footprint
+        pos = (x0 + 1, y0 + 1)
+        area = self.bits.around(pos, 1)
+
+        # clear anything occupying the footprint (except snake)
+        self.clear_cell_layers(area)
+        hits = self.query_around(pos, 1, (SPATIAL_ITEM, SPATIAL_SPIKE, SPATIAL_HUNTER, SPATIAL_SHADOW))
+        self.remove_spatial_hits(hits, (SPATIAL_ITEM, SPATIAL_SPIKE, SPATIAL_HUNTER, SPATIAL_SHADOW))
+        self.clear_fog_zones(area)
+
+        self.boss = Boss(pos)
+        self.index_bullets()
+        self.play_sfx("boss_appear_01")
 
     def draw_boss(self):
+        view_x, view_y = self.view_origin()
         if not self.boss:
             return
         # Boss body
         for cell in self.boss.get_cells():
             x, y = cell
+            if not self.in_view(x, y):
+                continue
             if not (0 <= x < GRID_WIDTH and 0 <= y < GRID_HEIGHT):
                 continue
-            rect = pygame.Rect(x * CELL_SIZE + 2, GAME_AREA_Y + y * CELL_SIZE + 2, CELL_SIZE - 4, CELL_SIZE - 4)
+            rect = pygame.Rect(view_x + x * CELL_SIZE + 2, view_y + y * CELL_SIZE + 2, CELL_SIZE - 4, CELL_SIZE - 4)
 
             glow_pad = 8
             glow_s = pygame.Surface((rect.width + glow_pad * 2, rect.height + glow_pad * 2), pygame.SRCALPHA)
@@ -1528,10 +3885,10 @@ class SnakeGame:
             pygame.draw.line(self.screen, (255, 120, 40), (inner.left + 3, inner.bottom - 4), (inner.right - 3, inner.bottom - 4), 1)
 
         # core energy effect (does not change shield)
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         bx, by = self.boss.pos
-        core_x = bx * CELL_SIZE + CELL_SIZE // 2
-        core_y = GAME_AREA_Y + by * CELL_SIZE + CELL_SIZE // 2
+        core_x = view_x + bx * CELL_SIZE + CELL_SIZE // 2
+        core_y = view_y + by * CELL_SIZE + CELL_SIZE // 2
         pulse = 0.5 + 0.5 * math.sin(now / 120.0)
         core_r = int(CELL_SIZE * (0.22 + 0.10 * pulse))
         core = pygame.Surface((core_r * 6, core_r * 6), pygame.SRCALPHA)
@@ -1543,8 +3900,8 @@ class SnakeGame:
         self.screen.blit(core, (core_x - cr.centerx, core_y - cr.centery))
 
         # Shield effect (fade)
-        if self.boss.shield_active:
-            now = pygame.time.get_ticks()
+        if self.boss.shield_active and self.in_view(*self.boss.pos, margin=BOSS_SIZE):
+            now = get_ticks()
             t = min(1.0, (now - self.boss.shield_start_time) / max(1, BOSS_SHIELD_DURATION))
             alpha_scale = 1.0 - 0.65 * t
             flash = 0.5 + 0.5 * math.sin(now / 120.0)
@@ -1593,18 +3950,20 @@ class SnakeGame:
                     pygame.draw.polygon(surf, (0, 200, 255, fill_a), pts)
                     pygame.draw.polygon(surf, (200, 255, 255, line_a), pts, width=2)
 
-            blit_x = min_x * CELL_SIZE - pad
-            blit_y = GAME_AREA_Y + min_y * CELL_SIZE - pad
+            blit_x = view_x + min_x * CELL_SIZE - pad
+            blit_y = view_y + min_y * CELL_SIZE - pad
             self.screen.blit(surf, (blit_x, blit_y))
 
         # Bullets
         for bullet in self.boss.bullets:
             bx = int(round(bullet["x"]))
             by = int(round(bullet["y"]))
+            if not self.in_view(bx, by):
+                continue
             if not (0 <= bx < GRID_WIDTH and 0 <= by < GRID_HEIGHT):
                 continue
-            cx = bx * CELL_SIZE + CELL_SIZE // 2
-            cy = GAME_AREA_Y + by * CELL_SIZE + CELL_SIZE // 2
+            cx = view_x + bx * CELL_SIZE + CELL_SIZE // 2
+            cy = view_y + by * CELL_SIZE + CELL_SIZE // 2
             pygame.draw.circle(self.screen, (255, 255, 255), (cx, cy), 4)
             pygame.draw.circle(self.screen, (255, 120, 0), (cx, cy), 8, width=2)
 
@@ -1618,7 +3977,7 @@ class SnakeGame:
         self.play_sfx("collect_energy_01")
 
     def apply_item(self, item_type, head_pos):
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         if item_type == ITEM_MAGNET:
             self.play_sfx("magnet_01")
             self.magnet_active_until = now + random.randint(MAGNET_DURATION_MIN_MS, MAGNET_DURATION_MAX_MS)
@@ -1629,43 +3988,20 @@ class SnakeGame:
         elif item_type == ITEM_BOMB:
             self.play_sfx("bomb_01")
             radius = 2
-            cells = []
-            cx, cy = head_pos
-            for x in range(cx - radius, cx + radius + 1):
-                for y in range(cy - radius, cy + radius + 1):
-                    if 0 <= x < GRID_WIDTH and 0 <= y < GRID_HEIGHT:
-                        cells.append((x, y))
-            cell_set = set(cells)
+            area = self.bits.around(head_pos, radius)
+            hits = self.query_around(head_pos, radius, (SPATIAL_SPIKE, SPATIAL_HUNTER, SPATIAL_SHADOW, SPATIAL_BULLET))
 
             removed = 0
-            for c in list(cell_set):
-                if c in self.obstacles:
-                    self.obstacles.remove(c)
-                    removed += 1
-                    sx = c[0] * CELL_SIZE + CELL_SIZE // 2
-                    sy = GAME_AREA_Y + c[1] * CELL_SIZE + CELL_SIZE // 2
-                    self.particle_system.emit(sx, sy, (80, 80, 80), count=18)
-
-            if self.spikes:
-                self.spikes = [sp for sp in self.spikes if sp.pos not in cell_set]
-
-            if self.ghost_hunters:
-                self.ghost_hunters = [gh for gh in self.ghost_hunters if gh.pos not in cell_set]
-
-            if self.shadow_snakes:
-                for ss in self.shadow_snakes[:]:
-                    if any(seg in cell_set for seg in ss.snake):
-                        self.shadow_snakes.remove(ss)
-
-            if self.fog_zones:
-                self.fog_zones = [z for z in self.fog_zones if not (self.get_fog_zone_cells(z["center"]) & cell_set)]
-
-            if self.boss:
-                self.boss.bullets = [
-                    b
-                    for b in self.boss.bullets
-                    if (int(round(b["x"])), int(round(b["y"]))) not in cell_set
-                ]
+            for c in self.bits.cells(self.bits.get(SPATIAL_OBSTACLE) & area):
+                self.remove_obstacle(c)
+                removed += 1
+                sx = c[0] * CELL_SIZE + CELL_SIZE // 2
+                sy = GAME_AREA_Y + c[1] * CELL_SIZE + CELL_SIZE // 2
+                self.particle_system.emit(sx, sy, (80, 80, 80), count=18)
+
+            self.remove_spatial_hits(hits, (SPATIAL_SPIKE, SPATIAL_HUNTER, SPATIAL_SHADOW, SPATIAL_BULLET))
+
+            self.clear_fog_zones(area)
 
             self.bomb_explosions.append({"center": head_pos, "start": now, "dur": BOMB_VFX_DURATION_MS})
 
@@ -1692,54 +4028,47 @@ class SnakeGame:
     def try_magnet_pull(self, now):
         if now >= self.magnet_active_until:
             return
-        hx, hy = self.snake[0]
         in_flight = {fl["pos"] for fl in self.magnet_flights}
-
-        candidates_normal = [p for p in self.normal_foods if abs(p[0] - hx) <= MAGNET_PULL_RADIUS and abs(p[1] - hy) <= MAGNET_PULL_RADIUS]
-        candidates_energy = [p for p in self.energy_foods if abs(p[0] - hx) <= MAGNET_PULL_RADIUS and abs(p[1] - hy) <= MAGNET_PULL_RADIUS]
-        candidates_bombs = [
-            it
-            for it in self.items
-            if it.get("type") == ITEM_BOMB
-            and abs(it["pos"][0] - hx) <= MAGNET_PULL_RADIUS
-            and abs(it["pos"][1] - hy) <= MAGNET_PULL_RADIUS
-        ]
+        hits = self.query_around(self.snake[0], MAGNET_PULL_RADIUS, (SPATIAL_FOOD, SPATIAL_ENERGY, SPATIAL_ITEM))
+        candidates_normal = hits.get(SPATIAL_FOOD, ())
+        candidates_energy = hits.get(SPATIAL_ENERGY, ())
+        candidates_bombs = [it for it in hits.get(SPATIAL_ITEM, ()) if it.get("type") == ITEM_BOMB]
 
         for p in candidates_normal:
             if p in in_flight:
                 continue
-            if p in self.normal_foods:
-                self.normal_foods.remove(p)
-            meta = None
-            if p in self.normal_food_meta:
-                meta = self.normal_food_meta[p]
-                del self.normal_food_meta[p]
+            meta = self.remove_normal_food(p)
             self.magnet_flights.append({"pos": p, "type": "normal", "start": now, "dur": random.randint(140, 240), "meta": meta})
 
         for p in candidates_energy:
             if p in in_flight:
                 continue
-            if p in self.energy_foods:
-                self.energy_foods.remove(p)
-            meta = None
-            if p in self.energy_food_meta:
-                meta = self.energy_food_meta[p]
-                del self.energy_food_meta[p]
+            meta = self.remove_energy_food(p)
             self.magnet_flights.append({"pos": p, "type": "energy", "start": now, "dur": random.randint(140, 240), "meta": meta})
 
         for it in candidates_bombs:
             p = it["pos"]
-            if p in in_flight:
+            if p in in_flight or it not in self.items:
                 continue
-            if it in self.items:
-                self.items.remove(it)
+            self.items.remove(it)
+            self.unindex_entity(SPATIAL_ITEM, it)
             self.magnet_flights.append({"pos": p, "type": "bomb", "start": now, "dur": random.randint(160, 260)})
 
     def draw_items(self):
+        view_x, view_y = self.view_origin()
+        now = get_ticks()
+        pulse = abs((now % 900) / 450 - 1)
+        glow_r = int(CELL_SIZE * 0.7 + pulse * 6)
+        pulse2 = abs((now % 800) / 400 - 1)
+        br = int(CELL_SIZE * (0.26 + 0.12 * pulse2))
+        glow_step = self.entity_glow_step()
+        queue = self.render_queue
         for it in self.items:
             x, y = it["pos"]
-            cx = x * CELL_SIZE + CELL_SIZE // 2
-            cy = GAME_AREA_Y + y * CELL_SIZE + CELL_SIZE // 2
+            if not self.in_view(x, y):
+                continue
+            cx = view_x + x * CELL_SIZE + CELL_SIZE // 2
+            cy = view_y + y * CELL_SIZE + CELL_SIZE // 2
             t = it["type"]
             if t == ITEM_MAGNET:
                 color = MAGNET_COLOR
@@ -1750,122 +4079,24 @@ class SnakeGame:
             else:
                 color = ROTTEN_APPLE_COLOR
 
-            pulse = abs((pygame.time.get_ticks() % 900) / 450 - 1)
-            glow_r = int(CELL_SIZE * 0.7 + pulse * 6)
-            for r in range(glow_r, CELL_SIZE // 3, -2):
-                a = int(50 * (1 - (glow_r - r) / max(1, glow_r)))
-                s = pygame.Surface((r * 2, r * 2), pygame.SRCALPHA)
-                pygame.draw.circle(s, (*color, a), (r, r), r)
-                self.screen.blit(s, (cx - r, cy - r))
-            pygame.draw.rect(self.screen, color, pygame.Rect(x * CELL_SIZE + 5, GAME_AREA_Y + y * CELL_SIZE + 5, CELL_SIZE - 10, CELL_SIZE - 10), border_radius=6)
+            # 发光层 + 底板 + 图标
+            sprite = self.sprite_atlas.get(("item", t, glow_r, glow_step), lambda: render_item(t, color, glow_r, glow_step))
+            queue.push(sprite, (cx - glow_r, cy - glow_r))
 
-            # icon details
             if t == ITEM_MAGNET:
-                pr = pygame.Rect(x * CELL_SIZE + 8, GAME_AREA_Y + y * CELL_SIZE + 8, CELL_SIZE - 16, CELL_SIZE - 16)
-                head_r = max(6, pr.width // 3)
-                head = pygame.Surface((head_r * 4, head_r * 4), pygame.SRCALPHA)
-                hr = head.get_rect()
-                pygame.draw.circle(head, (*SNAKE_HEAD_COLOR, 230), hr.center, head_r)
-                pygame.draw.circle(head, (20, 20, 20, 180), hr.center, head_r, width=2)
-                eye_r = max(1, head_r // 5)
-                pygame.draw.circle(head, (255, 255, 255, 220), (hr.centerx - head_r // 3, hr.centery - head_r // 5), eye_r)
-                pygame.draw.circle(head, (255, 255, 255, 220), (hr.centerx + head_r // 3, hr.centery - head_r // 5), eye_r)
-                pygame.draw.circle(head, (0, 0, 0, 200), (hr.centerx - head_r // 3, hr.centery - head_r // 5), max(1, eye_r // 2))
-                pygame.draw.circle(head, (0, 0, 0, 200), (hr.centerx + head_r // 3, hr.centery - head_r // 5), max(1, eye_r // 2))
-                pygame.draw.circle(head, (255, 255, 255, 150), (hr.centerx - head_r // 3, hr.centery - head_r // 3), max(1, eye_r // 2))
-                self.screen.blit(head, (cx - hr.centerx, cy - hr.centery))
-
-                now = pygame.time.get_ticks()
-                cycle_ms = 700
-                tt = (now // 1) % cycle_ms
-                pp = tt / cycle_ms
-                r_max = int(CELL_SIZE * 0.72)
-                r_min = int(CELL_SIZE * 0.32)
-                ring_r = int(r_max - (r_max - r_min) * pp)
-                ring_size = ring_r * 2 + 10
-                ring_surf = pygame.Surface((ring_size, ring_size), pygame.SRCALPHA)
-                rc = ring_size // 2
-                for w in (5, 3):
-                    aa = int((70 + 70 * (1.0 - pp)) * (w / 5))
-                    pygame.draw.circle(ring_surf, (255, 255, 0, aa), (rc, rc), ring_r, width=w)
-                self.screen.blit(ring_surf, (cx - rc, cy - rc))
-
-            elif t == ITEM_SCISSORS:
-                pr = pygame.Rect(x * CELL_SIZE + 8, GAME_AREA_Y + y * CELL_SIZE + 8, CELL_SIZE - 16, CELL_SIZE - 16)
-                pill_w = pr.width
-                pill_h = max(12, int(pr.height * 0.70))
-                pill = pygame.Surface((pill_w, pill_h), pygame.SRCALPHA)
-                pill_rect = pill.get_rect()
-                rr = pill_h // 2
-
-                left_col = (40, 220, 120)
-                right_col = (255, 220, 80)
-
-                # base capsule (green)
-                pygame.draw.rect(pill, left_col, pill_rect, border_radius=rr)
-                # overlay right half (yellow)
-                right = pygame.Surface((pill_w, pill_h), pygame.SRCALPHA)
-                pygame.draw.rect(right, right_col, pill_rect, border_radius=rr)
-                pill.blit(right, (0, 0), area=pygame.Rect(pill_w // 2, 0, pill_w - pill_w // 2, pill_h))
-
-                # seam
-                pygame.draw.line(pill, (255, 255, 255, 230), (pill_w // 2, 2), (pill_w // 2, pill_h - 3), 2)
-                pygame.draw.line(pill, (0, 0, 0, 70), (pill_w // 2 + 2, 3), (pill_w // 2 + 2, pill_h - 4), 1)
-
-                # glossy highlight (top-left)
-                gloss = pygame.Surface((pill_w, pill_h), pygame.SRCALPHA)
-                pygame.draw.ellipse(gloss, (255, 255, 255, 85), pygame.Rect(2, 1, int(pill_w * 0.55), int(pill_h * 0.55)))
-                pill.blit(gloss, (0, 0))
-
-                # subtle shadow (bottom-right)
-                shade = pygame.Surface((pill_w, pill_h), pygame.SRCALPHA)
-                pygame.draw.ellipse(shade, (0, 0, 0, 55), pygame.Rect(int(pill_w * 0.40), int(pill_h * 0.45), int(pill_w * 0.58), int(pill_h * 0.58)))
-                pill.blit(shade, (0, 0))
-
-                pygame.draw.rect(pill, (20, 20, 20, 190), pill_rect, width=2, border_radius=rr)
-                self.screen.blit(pill, (pr.centerx - pill_w // 2, pr.centery - pill_h // 2))
-
-            elif t == ITEM_ROTTEN_APPLE:
-                # rotten apple with bite + stem
-                pr = pygame.Rect(x * CELL_SIZE + 8, GAME_AREA_Y + y * CELL_SIZE + 8, CELL_SIZE - 16, CELL_SIZE - 16)
-                body_r = pr.width // 2 - 2
-                body_col = (155, 55, 175)
-                shadow_col = (85, 25, 110)
-                pygame.draw.circle(self.screen, body_col, pr.center, body_r)
-                pygame.draw.circle(self.screen, shadow_col, (pr.centerx - 3, pr.centery + 2), max(2, body_r - 4))
-                pygame.draw.circle(self.screen, (255, 185, 220), (pr.centerx - 4, pr.centery - 5), max(2, body_r // 3))
-
-                for dx, dy, rr2, col in [
-                    (-4, 2, 3, (70, 10, 90)),
-                    (3, 4, 2, (60, 5, 80)),
-                    (5, -1, 2, (75, 15, 95)),
-                    (-1, -3, 2, (60, 8, 78)),
-                ]:
-                    pygame.draw.circle(self.screen, col, (pr.centerx + dx, pr.centery + dy), rr2)
-
-                pygame.draw.circle(self.screen, BG_COLOR, (pr.centerx + pr.width // 4, pr.centery - 1), 6)
-                pygame.draw.circle(self.screen, (20, 20, 20), (pr.centerx + pr.width // 4 + 3, pr.centery - 2), 3)
-                pygame.draw.line(self.screen, (110, 70, 30), (pr.centerx, pr.y + 3), (pr.centerx + 2, pr.y + 10), 3)
+                ring = self.frame_cache.frame("magnet_ring", MAGNET_RING_PERIOD_MS, now, render_magnet_ring)
+                rc = ring.get_width() // 2
+                queue.push(ring, (cx - rc, cy - rc))
 
             if t == ITEM_BOMB:
-                pulse2 = abs((pygame.time.get_ticks() % 800) / 400 - 1)
-                br = int(CELL_SIZE * (0.26 + 0.12 * pulse2))
-                bomb_s = pygame.Surface((br * 4, br * 4), pygame.SRCALPHA)
-                # black bomb body
-                pygame.draw.circle(bomb_s, (0, 0, 0, 240), (br * 2, br * 2), br)
-                # outline for visibility on dark background
-                pygame.draw.circle(bomb_s, (140, 140, 140, 200), (br * 2, br * 2), br, width=2)
-                # small highlight
-                pygame.draw.circle(bomb_s, (220, 220, 220, 140), (br * 2 - 3, br * 2 - 3), max(2, br // 3))
-                # red fuse
-                pygame.draw.line(bomb_s, (255, 60, 60, 220), (br * 2, br * 2 - br), (br * 2, br * 2 - br - 6), 3)
-                pygame.draw.circle(bomb_s, (255, 160, 80, 220), (br * 2 + 2, br * 2 - br - 8), 3)
-                self.screen.blit(bomb_s, (cx - br * 2, cy - br * 2))
+                bomb_s = self.sprite_atlas.get(("bomb", br), lambda: render_bomb(br))
+                queue.push(bomb_s, (cx - br * 2, cy - br * 2))
+        queue.flush(self.screen)
 
     def draw_bomb_explosions(self):
         if not self.bomb_explosions:
             return
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         alive = []
         for ex in self.bomb_explosions:
             start = ex.get("start", 0)
@@ -1877,8 +4108,11 @@ class SnakeGame:
 
             cx, cy = ex["center"]
             half = 2
+            if not self.in_view(cx, cy, margin=half + 1):
+                continue
             alpha = int(200 * (1.0 - t))
-            surf = pygame.Surface((CELL_SIZE * GRID_WIDTH, CELL_SIZE * GRID_HEIGHT), pygame.SRCALPHA)
+            # 只画爆炸范围（5x5 格）大小的图层
+            surf = self.overlays.get((CELL_SIZE * (half * 2 + 1), CELL_SIZE * (half * 2 + 1)))
 
             for gx in range(cx - half, cx + half + 1):
                 for gy in range(cy - half, cy + half + 1):
@@ -1887,8 +4121,8 @@ class SnakeGame:
                     # deterministic shard layout per cell
                     seed = (start ^ (gx << 8) ^ gy) & 0xFFFFFFFF
                     rr = random.Random(seed)
-                    base_x = gx * CELL_SIZE
-                    base_y = gy * CELL_SIZE
+                    base_x = (gx - cx + half) * CELL_SIZE
+                    base_y = (gy - cy + half) * CELL_SIZE
                     shard_count = 3 + rr.randint(0, 3)
                     for _ in range(shard_count):
                         w = rr.randint(3, 7)
@@ -1904,17 +4138,19 @@ class SnakeGame:
                     # cell outline flash
                     pygame.draw.rect(surf, (255, 220, 180, max(0, int(alpha * 0.25))), pygame.Rect(base_x + 2, base_y + 2, CELL_SIZE - 4, CELL_SIZE - 4), width=2, border_radius=4)
 
-            self.screen.blit(surf, (0, GAME_AREA_Y))
+            view_x, view_y = self.view_origin()
+            self.screen.blit(surf, (view_x + (cx - half) * CELL_SIZE, view_y + (cy - half) * CELL_SIZE))
 
         self.bomb_explosions = alive
 
     def draw_magnet_flights(self):
-        now = pygame.time.get_ticks()
+        view_x, view_y = self.view_origin()
+        now = get_ticks()
         if not self.magnet_flights and now >= self.magnet_active_until:
             return
         hx, hy = self.snake[0]
-        end_x = hx * CELL_SIZE + CELL_SIZE // 2
-        end_y = GAME_AREA_Y + hy * CELL_SIZE + CELL_SIZE // 2
+        end_x = view_x + hx * CELL_SIZE + CELL_SIZE // 2
+        end_y = view_y + hy * CELL_SIZE + CELL_SIZE // 2
 
         if now < self.magnet_active_until:
             cx, cy = end_x, end_y
@@ -1936,8 +4172,8 @@ class SnakeGame:
             return
         for fl in self.magnet_flights:
             p = fl["pos"]
-            sx = p[0] * CELL_SIZE + CELL_SIZE // 2
-            sy = GAME_AREA_Y + p[1] * CELL_SIZE + CELL_SIZE // 2
+            sx = view_x + p[0] * CELL_SIZE + CELL_SIZE // 2
+            sy = view_y + p[1] * CELL_SIZE + CELL_SIZE // 2
             dur = max(1, fl["dur"])
             t = min(1.0, (now - fl["start"]) / dur)
             ix = int(sx + (end_x - sx) * (t * t))
@@ -1962,10 +4198,10 @@ class SnakeGame:
     def spawn_obstacle(self):
         cell = self.random_empty_cell_avoid_head(2)
         if cell is not None:
-            self.obstacles.add(cell)
+            self.add_obstacle(cell)
 
     def set_paused(self, paused: bool):
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         paused = bool(paused)
         if paused and not self.paused:
             self.paused = True
@@ -1975,6 +4211,8 @@ class SnakeGame:
             if self.pause_started_at is not None:
                 self.paused_time_accum += max(0, now - self.pause_started_at)
             self.pause_started_at = None
+            # 暂停期间按下的转向从恢复时开始计延迟
+            self.input_queue = deque((d, now) for d, _ in self.input_queue)
 
     def toggle_help(self):
         if not self.show_help:
@@ -1996,13 +4234,30 @@ class SnakeGame:
     def handle_input(self):
         for event in pygame.event.get():
             if event.type == pygame.QUIT:
-                pygame.quit()
-                sys.exit()
+                self.quit_game()
             elif event.type == pygame.KEYDOWN:
+                self.finish_deferred_init()
                 if event.key == pygame.K_h:
                     self.toggle_help()
                     return
 
+                if event.key == pygame.K_F2:
+                    self.toggle_autopilot()
+                    return
+                if event.key == pygame.K_F3:
+                    self.show_debug = not self.show_debug
+                    return
+                if event.key == pygame.K_F4:
+                    self.bloom_enabled = not self.bloom_enabled
+                    return
+
+                if event.key == pygame.K_F5:
+                    self.quick_save()
+                    return
+                if event.key == pygame.K_F9:
+                    self.quick_load()
+                    return
+
                 if self.show_help:
                     if event.key == pygame.K_LEFT:
                         self.help_page = max(0, self.help_page - 1)
@@ -2016,6 +4271,8 @@ class SnakeGame:
                         # 回车确认，添加到排行榜
                         if self.player_name_input.strip():
                             self.add_to_leaderboard(self.player_name_input.strip(), self.score)
+                        else:
+                            self.commit_pending_run()
                         self.entering_name = False
                         self.player_name_input = ""
                     elif event.key == pygame.K_BACKSPACE:
@@ -2023,6 +4280,7 @@ class SnakeGame:
                         self.player_name_input = self.player_name_input[:-1]
                     elif event.key == pygame.K_ESCAPE:
                         # ESC 取消输入
+                        self.commit_pending_run()
                         self.entering_name = False
                         self.player_name_input = ""
                     else:
@@ -2052,47 +4310,101 @@ class SnakeGame:
                 # 启动画面：按空格键开始（ESC 直接退出）
                 if not self.started:
                     if event.key == pygame.K_ESCAPE:
-                        pygame.quit()
-                        sys.exit()
+                        self.quit_game()
                     elif event.key == pygame.K_SPACE:
-                        self.started = True
-                        now = pygame.time.get_ticks()
-                        self.run_start_time = now
-                        self.run_end_time = None
-                        self.paused_time_accum = 0
-                        self.pause_started_at = None
+                        self.start_run()
                     return
 
                 if event.key == pygame.K_ESCAPE:
-                    pygame.quit()
-                    sys.exit()
+                    self.quit_game()
                 elif event.key == pygame.K_p:
                     if (not self.game_over) and self.started and (not self.show_leaderboard) and (not self.entering_name):
                         self.set_paused(not self.paused)
                     return
                 # 方向键 / WASD
                 elif event.key in (pygame.K_UP, pygame.K_w, pygame.K_DOWN, pygame.K_s, pygame.K_LEFT, pygame.K_a, pygame.K_RIGHT, pygame.K_d):
-                    reversed_controls = pygame.time.get_ticks() < self.reverse_controls_until
                     key = event.key
                     if key in (pygame.K_UP, pygame.K_w):
-                        desired = (0, 1) if reversed_controls else (0, -1)
+                        self.press_direction((0, -1))
                     elif key in (pygame.K_DOWN, pygame.K_s):
-                        desired = (0, -1) if reversed_controls else (0, 1)
+                        self.press_direction((0, 1))
                     elif key in (pygame.K_LEFT, pygame.K_a):
-                        desired = (1, 0) if reversed_controls else (-1, 0)
+                        self.press_direction((-1, 0))
                     else:
-                        desired = (-1, 0) if reversed_controls else (1, 0)
-
-                    if (desired[0], desired[1]) != (-self.direction[0], -self.direction[1]):
-                        self.next_direction = desired
+                        self.press_direction((1, 0))
                 # 幽灵模式开关（游戏结束时不能开启）
                 elif event.key == pygame.K_SPACE:
                     if not self.game_over:
                         self.toggle_ghost_mode()
+                elif event.key == pygame.K_BACKSPACE:
+                    if not self.game_over and not self.paused:
+                        self.rewind()
+                elif event.key == pygame.K_COMMA:
+                    if self.qa_mode:
+                        self.rewind_step_back()
+
+
+    def start_run(self):
+        """从开始界面进入游戏"""
+        self.finish_deferred_init()
+        self.started = True
+        now = get_ticks()
+        self.run_start_time = now
+        self.run_end_time = None
+        self.paused_time_accum = 0
+        self.pause_started_at = None
+
+    def toggle_autopilot(self):
+        """开关自动驾驶；挂机期间影子蛇等按 SOAK_ENTITY_TTLS 到期清理，关掉后恢复默认"""
+        self.autopilot = None if self.autopilot else Autopilot(self)
+        self.entity_budget.set_ttls(SOAK_ENTITY_TTLS if self.autopilot else None)
+
+    def update_autopilot_session(self):
+        """自动驾驶时跳过开始界面和留名界面，结束后自动重开，便于长时间挂机"""
+        if self.autopilot is None:
+            return
+        if not self.started:
+            self.start_run()
+            return
+        if self.game_over and self.run_end_time is not None:
+            if get_ticks() - self.run_end_time >= AUTOPILOT_RESTART_DELAY_MS:
+                if self.entering_name:
+                    self.entering_name = False
+                    self.player_name_input = ""
+                    self.commit_pending_run()
+                self.reset(start_with_intro=False)
+
+    def press_direction(self, pressed, queue: bool = True):
+        """按下方向键：腐烂苹果期间方向反转，不能直接掉头（键盘、AI 共用这套规则）
+
+        queue=True（键盘）：转向进队列，每次移动消耗一个，一个移动间隔内连按两次也不会丢；
+        掉头判断相对于队尾（最后一次排队的方向），连按"上、左"不会被当成掉头。
+        queue=False（模拟 / 训练环境每步都给一个动作）：清空队列，只保留最新的转向，
+        减速期间蛇不动时动作也不会堆积、晚几步才生效。
+        """
+        now = get_ticks()
+        desired = pressed
+        if now < self.reverse_controls_until:
+            desired = (-pressed[0], -pressed[1])
+        if not queue:
+            self.input_queue.clear()
+            if desired != (-self.direction[0], -self.direction[1]):
+                self.next_direction = desired
+            return
+        last = self.input_queue[-1][0] if self.input_queue else self.direction
+        if desired == last or desired == (-last[0], -last[1]):
+            return
+        if len(self.input_queue) < INPUT_QUEUE_MAX:
+            self.input_queue.append((desired, now))
 
+    def quit_game(self):
+        """退出游戏：先把排行榜写完再关闭窗口"""
+        self.flush_leaderboard()
+        pygame.quit()
+        sys.exit()
 
     def toggle_ghost_mode(self):
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         # 已在幽灵模式：直接关闭
         if self.ghost_mode:
             self.ghost_mode = False
@@ -2109,20 +4421,23 @@ class SnakeGame:
         """触发游戏结束，判断是否进入排行榜"""
         self.game_over = True
         self.game_over_reason = reason
-        self.run_end_time = pygame.time.get_ticks()
+        self.run_end_time = get_ticks()
+        self.record_run()
         # 判断是否进入排行榜
         if self.score > 0 and self.is_high_score(self.score):
             self.entering_name = True
             self.player_name_input = ""
+        else:
+            self.commit_pending_run()
     
     def trigger_glow_effect(self, color):
         """触发身体刷光效果"""
         self.glow_effect_active = True
-        self.glow_effect_start = pygame.time.get_ticks()
+        self.glow_effect_start = get_ticks()
         self.glow_effect_color = color
 
     def trigger_score_damage_effect(self, old_score: int, new_score: int):
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         self.score_anim_from = int(old_score)
         self.score_anim_to = int(new_score)
         self.score_anim_start = now
@@ -2138,7 +4453,7 @@ class SnakeGame:
         return 1.0
 
     def trigger_boss_kill_effect(self):
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         self.boss_kill_slow_start = now
         self.boss_kill_slow_until = now + BOSS_KILL_SLOW_DURATION_MS
         self.boss_kill_flash_until = now + BOSS_KILL_FLASH_DURATION_MS
@@ -2146,12 +4461,12 @@ class SnakeGame:
 
     def trigger_shockwave(self, center_pos, color=(200, 255, 255)):
         self.shockwave_active = True
-        self.shockwave_start_time = pygame.time.get_ticks()
+        self.shockwave_start_time = get_ticks()
         self.shockwave_color = color
         self.shockwave_center = center_pos
 
     def apply_shrink(self, count: int, sfx_volume: float = None):
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         removed = 0
         while removed < count and len(self.snake) > 1:
             tail = self.snake.pop()
@@ -2167,63 +4482,29 @@ class SnakeGame:
     def shockwave_clear_and_refresh(self, center_pos):
         hx, hy = center_pos
         half = SHOCKWAVE_CLEAR_SIZE // 2
-        cell_set = set()
-        for x in range(hx - half, hx - half + SHOCKWAVE_CLEAR_SIZE):
-            for y in range(hy - half, hy - half + SHOCKWAVE_CLEAR_SIZE):
-                if 0 <= x < GRID_WIDTH and 0 <= y < GRID_HEIGHT:
-                    cell_set.add((x, y))
-
-        for c in list(cell_set):
-            if c in self.obstacles:
-                self.obstacles.remove(c)
-
-        if self.normal_foods:
-            for c in list(cell_set):
-                if c in self.normal_foods:
-                    self.normal_foods.remove(c)
-                    if c in self.normal_food_meta:
-                        del self.normal_food_meta[c]
-
-        if self.energy_foods:
-            for c in list(cell_set):
-                if c in self.energy_foods:
-                    self.energy_foods.remove(c)
-                    if c in self.energy_food_meta:
-                        del self.energy_food_meta[c]
-
-        if self.items:
-            self.items = [it for it in self.items if it["pos"] not in cell_set]
-
-        if self.ghost_hunters:
-            self.ghost_hunters = [gh for gh in self.ghost_hunters if gh.pos not in cell_set]
-
-        if self.shadow_snakes:
-            for ss in self.shadow_snakes[:]:
-                if any(seg in cell_set for seg in ss.snake):
-                    self.shadow_snakes.remove(ss)
-
-        if self.fog_zones:
-            self.fog_zones = [z for z in self.fog_zones if not (self.get_fog_zone_cells(z["center"]) & cell_set)]
-
-        if self.boss:
-            self.boss.bullets = [
-                b
-                for b in self.boss.bullets
-                if (int(round(b["x"])), int(round(b["y"]))) not in cell_set
-            ]
-
-        if self.spikes:
-            for sp in self.spikes:
-                if sp.pos in cell_set:
-                    new_pos = self.random_empty_cell_avoid_head(2)
-                    if new_pos is not None:
-                        sp.pos = new_pos
-                        sp.visible = True
-                        sp.last_toggle = pygame.time.get_ticks()
-
-        if self.portal_pairs:
+        x0, y0 = hx - half, hy - half
+        x1, y1 = x0 + SHOCKWAVE_CLEAR_SIZE - 1, y0 + SHOCKWAVE_CLEAR_SIZE - 1
+        area = self.bits.rect(x0, y0, x1, y1)
+        hits = self.query_area(x0, y0, x1, y1, (
+            SPATIAL_ITEM, SPATIAL_SPIKE, SPATIAL_PORTAL, SPATIAL_HUNTER, SPATIAL_SHADOW, SPATIAL_BULLET,
+        ))
+
+        self.clear_cell_layers(area)
+        self.remove_spatial_hits(hits, (SPATIAL_ITEM, SPATIAL_HUNTER, SPATIAL_SHADOW, SPATIAL_BULLET))
+        self.clear_fog_zones(area)
+
+        for sp in hits.get(SPATIAL_SPIKE, ()):
+            new_pos = self.random_empty_cell_avoid_head(2)
+            if new_pos is not None:
+                sp.pos = new_pos
+                sp.visible = True
+                sp.last_toggle = get_ticks()
+                self.index_entity(SPATIAL_SPIKE, sp)
+
+        if hits.get(SPATIAL_PORTAL):
+            hit_colors = {p.color_id for p in hits[SPATIAL_PORTAL]}
             for color_id, (p1, p2) in list(self.portal_pairs.items()):
-                if p1 in cell_set or p2 in cell_set:
+                if color_id in hit_colors:
                     np1 = self.random_empty_cell_avoid_head(2)
                     np2 = self.random_empty_cell_avoid_head(2)
                     if np1 is None or np2 is None:
@@ -2235,10 +4516,7 @@ class SnakeGame:
                     self.portal_pairs[color_id] = (np1, np2)
                     self.portal_lookup[np1] = color_id
                     self.portal_lookup[np2] = color_id
-            self.portals = []
-            for cid, (a, b) in self.portal_pairs.items():
-                self.portals.append(Portal(a, cid))
-                self.portals.append(Portal(b, cid))
+            self.rebuild_portals()
 
         self.spawn_food()
         while len(self.items) < ITEM_MAX_ON_MAP:
@@ -2247,7 +4525,7 @@ class SnakeGame:
             self.spawn_fog_zone(force=True)
 
     def apply_damage_burst(self, reason: str, center_pos, score_penalty: int = SCORE_DAMAGE_AMOUNT):
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         self.play_sfx("energy_shackwave")
         self.damage_slow_until = max(self.damage_slow_until, now + DAMAGE_SLOW_DURATION_MS)
         self.damage_blink_start = now
@@ -2272,7 +4550,7 @@ class SnakeGame:
         if self.game_over:
             return
 
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         time_scale = self.get_time_scale(now)
 
         if now >= self.next_portal_refresh_time:
@@ -2298,6 +4576,7 @@ class SnakeGame:
 
         if self.boss:
             self.boss.update(GRID_WIDTH, GRID_HEIGHT, time_scale=time_scale)
+            self.index_bullets()
             hx, hy = self.snake[0]
             if not self.ghost_mode:
                 for bullet in self.boss.bullets:
@@ -2321,6 +4600,8 @@ class SnakeGame:
             self.spawn_fog_zone(force=True)
             self.next_fog_zone_refresh_time = now + random.randint(FOG_ZONE_REFRESH_MIN_MS, FOG_ZONE_REFRESH_MAX_MS)
 
+        self.enforce_entity_budget(now)
+
         if now < self.magnet_active_until and now >= self.next_magnet_pull_time:
             self.try_magnet_pull(now)
             self.next_magnet_pull_time = now + MAGNET_PULL_CHECK_INTERVAL_MS
@@ -2369,9 +4650,16 @@ class SnakeGame:
         effective_step = self.step_interval_ms / max(0.05, time_scale)
         if now - self.last_move_time < effective_step:
             return
+        if self.rewind_buffer is not None:
+            self.rewind_buffer.record(self, now)
         self.last_move_time = now
 
-        # 更新方向
+        # 更新方向：先取一个排队的转向，自动驾驶再覆盖
+        if self.input_queue:
+            self.next_direction, pressed_at = self.input_queue.popleft()
+            self.input_latency.add(now - pressed_at)
+        if self.autopilot is not None:
+            self.autopilot.steer()
         self.direction = self.next_direction
 
         head_x, head_y = self.snake[0]
@@ -2451,8 +4739,7 @@ class SnakeGame:
                             cell = (x, y)
                             if cell in occupied:
                                 continue
-                            self.normal_foods.append(cell)
-                            self.normal_food_meta[cell] = {"counts_for_boss": False, "color": (255, 80, 0)}
+                            self.add_normal_food(cell, {"counts_for_boss": False, "color": (255, 80, 0)})
                             occupied.add(cell)
                             break
 
@@ -2465,12 +4752,12 @@ class SnakeGame:
                             cell = (x, y)
                             if cell in occupied:
                                 continue
-                            self.energy_foods.append(cell)
-                            self.energy_food_meta[cell] = {"counts_for_boss": False, "color": (255, 80, 0)}
+                            self.add_energy_food(cell, {"counts_for_boss": False, "color": (255, 80, 0)})
                             occupied.add(cell)
                             break
                     self.boss = None
                     self.boss_spawn_progress = 0
+                    self.index_bullets()
                 else:
                     self.play_sfx("energy_shackwave")
                     self.trigger_game_over("撞到Boss了！")
@@ -2495,8 +4782,9 @@ class SnakeGame:
 
         if self.fog_zones:
             hit_index = None
+            head_bit = self.bits.around(new_head, 0)
             for i, z in enumerate(self.fog_zones):
-                if new_head in self.get_fog_zone_cells(z["center"]):
+                if self.fog_zone_mask(z["center"]) & head_bit:
                     hit_index = i
                     break
             if hit_index is not None:
@@ -2510,11 +4798,7 @@ class SnakeGame:
         # 吃普通食物
         if new_head in self.normal_foods:
             ate_food = True
-            self.normal_foods.remove(new_head)
-            meta = None
-            if new_head in self.normal_food_meta:
-                meta = self.normal_food_meta[new_head]
-                del self.normal_food_meta[new_head]
+            meta = self.remove_normal_food(new_head)
             counts_for_boss = True
             color_override = None
             if meta:
@@ -2524,11 +4808,7 @@ class SnakeGame:
 
         # 吃能量食物
         if new_head in self.energy_foods:
-            self.energy_foods.remove(new_head)
-            meta = None
-            if new_head in self.energy_food_meta:
-                meta = self.energy_food_meta[new_head]
-                del self.energy_food_meta[new_head]
+            meta = self.remove_energy_food(new_head)
             color_override = meta.get("color") if meta else None
             self.on_energy_food_eaten(new_head, color_override=color_override)
 
@@ -2539,6 +4819,7 @@ class SnakeGame:
                 break
         if picked:
             self.items.remove(picked)
+            self.unindex_entity(SPATIAL_ITEM, picked)
             self.apply_item(picked["type"], new_head)
 
         # 如果没有吃普通食物，尾巴要前进（去掉最后一个块）
@@ -2553,45 +4834,103 @@ class SnakeGame:
             self.spawn_food()
 
     # -------------------- 绘制相关 --------------------
-    def draw_text_with_glow(self, text, font, color, pos, center=False):
-        """绘制带发光效果的文字"""
-        text_surf = font.render(text, True, color)
-        text_rect = text_surf.get_rect()
+    def update_camera(self, snap: bool = False):
+        """镜头跟随蛇头并限制在地图范围内；地图不比视口大时镜头固定在原点"""
+        hx, hy = self.snake[0]
+        max_x = (GRID_WIDTH - VIEW_WIDTH) * CELL_SIZE
+        max_y = (GRID_HEIGHT - VIEW_HEIGHT) * CELL_SIZE
+        target_x = max(0, min(max_x, hx * CELL_SIZE + CELL_SIZE // 2 - VIEW_WIDTH * CELL_SIZE // 2))
+        target_y = max(0, min(max_y, hy * CELL_SIZE + CELL_SIZE // 2 - VIEW_HEIGHT * CELL_SIZE // 2))
+        if snap or abs(target_x - self.camera_x) > VIEW_WIDTH * CELL_SIZE or abs(target_y - self.camera_y) > VIEW_HEIGHT * CELL_SIZE:
+            # 开局或穿墙 / 传送时直接跳过去
+            self.camera_x = float(target_x)
+            self.camera_y = float(target_y)
+        else:
+            self.camera_x += (target_x - self.camera_x) * CAMERA_FOLLOW
+            self.camera_y += (target_y - self.camera_y) * CAMERA_FOLLOW
+        cam_x = int(self.camera_x)
+        cam_y = int(self.camera_y)
+        self.view_cells = (
+            cam_x // CELL_SIZE,
+            cam_y // CELL_SIZE,
+            (cam_x + VIEW_WIDTH * CELL_SIZE - 1) // CELL_SIZE,
+            (cam_y + VIEW_HEIGHT * CELL_SIZE - 1) // CELL_SIZE,
+        )
+
+    def view_origin(self):
+        """地图格子 (0, 0) 左上角在屏幕上的像素坐标"""
+        return -int(self.camera_x), GAME_AREA_Y - int(self.camera_y)
+
+    def in_view(self, x, y, margin: int = 1):
+        """格子是否在视口内（margin 给发光等溢出格子的效果留余量）"""
+        x0, y0, x1, y1 = self.view_cells
+        return x0 - margin <= x <= x1 + margin and y0 - margin <= y <= y1 + margin
+
+    def bloom_active(self) -> bool:
+        return self.bloom_enabled and self.quality.tier["bloom"]
+
+    def entity_glow_step(self) -> int:
+        """实体自带发光层的间隔；整屏泛光开着时只画实心核心，光晕交给后处理"""
+        return 0 if self.bloom_active() else self.quality.tier["glow_step"]
+
+    def apply_bloom(self):
+        if self.bloom_active():
+            self.bloom.apply(self.screen, self.game_area_rect())
+
+    def game_area_rect(self):
+        return pygame.Rect(0, GAME_AREA_Y, SCREEN_WIDTH, VIEW_HEIGHT * CELL_SIZE)
+
+    def glow_text(self, text, font, color, glow_alpha=255):
+        """取缓存的发光文字图；文字、字体、颜色不变时不重新渲染"""
+        color = tuple(color)
+        return self.text_cache.get(
+            ("glow", id(font), text, color, glow_alpha),
+            lambda: render_glow_text(font, text, color, glow_alpha),
+        )
+
+    def plain_text(self, text, font, color):
+        """取缓存的普通文字图"""
+        color = tuple(color)
+        return self.text_cache.get(("plain", id(font), text, color), lambda: font.render(text, True, color))
+
+    def blit_glow_text(self, surf, pos, center):
+        pad = GLOW_TEXT_PAD
+        text_rect = pygame.Rect(0, 0, surf.get_width() - pad * 2, surf.get_height() - pad * 2)
         if center:
             text_rect.center = pos
         else:
             text_rect.topleft = pos
-        
-        # 绘制发光层
-        glow_color = tuple(max(0, c - 50) for c in color)
-        for offset in [(2,2), (-2,2), (2,-2), (-2,-2), (0,2), (0,-2), (2,0), (-2,0)]:
-            glow_surf = font.render(text, True, glow_color)
-            glow_pos = (text_rect.x + offset[0], text_rect.y + offset[1])
-            self.screen.blit(glow_surf, glow_pos)
-        
-        # 绘制主文字
-        self.screen.blit(text_surf, text_rect)
+        self.screen.blit(surf, (text_rect.x - pad, text_rect.y - pad))
         return text_rect
 
-    def draw_text_with_glow_alpha(self, text, font, color, pos, alpha: int, center=False):
-        alpha = max(0, min(255, int(alpha)))
-        text_surf = font.render(text, True, color)
-        text_surf.set_alpha(alpha)
-        text_rect = text_surf.get_rect()
+    def blit_plain_text(self, surf, pos, center):
+        text_rect = surf.get_rect()
         if center:
             text_rect.center = pos
         else:
             text_rect.topleft = pos
+        self.screen.blit(surf, text_rect)
+        return text_rect
 
-        glow_color = tuple(max(0, c - 50) for c in color)
-        for offset in [(2, 2), (-2, 2), (2, -2), (-2, -2), (0, 2), (0, -2), (2, 0), (-2, 0)]:
-            glow_surf = font.render(text, True, glow_color)
-            glow_surf.set_alpha(max(0, min(255, int(alpha * 0.85))))
-            glow_pos = (text_rect.x + offset[0], text_rect.y + offset[1])
-            self.screen.blit(glow_surf, glow_pos)
+    def draw_text_with_glow(self, text, font, color, pos, center=False):
+        """绘制带发光效果的文字（低画质时不画发光层）"""
+        if not self.quality.tier["text_glow"]:
+            surf = self.plain_text(text, font, color)
+            surf.set_alpha(None)
+            return self.blit_plain_text(surf, pos, center)
+        surf = self.glow_text(text, font, color)
+        return self.blit_glow_text(surf, pos, center)
 
-        self.screen.blit(text_surf, text_rect)
-        return text_rect
+    def draw_text_with_glow_alpha(self, text, font, color, pos, alpha: int, center=False):
+        alpha = max(0, min(255, int(alpha)))
+        if not self.quality.tier["text_glow"]:
+            surf = self.plain_text(text, font, color)
+            surf.set_alpha(alpha)
+            return self.blit_plain_text(surf, pos, center)
+        # 发光层比主文字淡一些（0.85），整张图再按 alpha 淡入淡出
+        surf = self.glow_text(text, font, color, glow_alpha=int(255 * 0.85))
+        surf.set_alpha(alpha)
+        return self.blit_glow_text(surf, pos, center)
     
     def draw_grid(self):
         """绘制赛博朋克风格的网格（在游戏区域内，不包括底部栏）"""
@@ -2604,25 +4943,30 @@ class SnakeGame:
         pygame.draw.line(self.screen, border_color, (0, game_area_end_y - 1), (SCREEN_WIDTH, game_area_end_y - 1), 2)  # 下边
         pygame.draw.line(self.screen, border_color, (SCREEN_WIDTH - 1, GAME_AREA_Y), (SCREEN_WIDTH - 1, game_area_end_y), 2)  # 右边
         
-        # 主网格线（在游戏区域内）
-        for x in range(0, SCREEN_WIDTH, CELL_SIZE):
+        # 主网格线（在游戏区域内，随镜头滚动）
+        view_x, view_y = self.view_origin()
+        first_x = view_x % CELL_SIZE
+        first_y = GAME_AREA_Y + (view_y - GAME_AREA_Y) % CELL_SIZE
+        for x in range(first_x, SCREEN_WIDTH, CELL_SIZE):
             pygame.draw.line(self.screen, GRID_COLOR, (x, GAME_AREA_Y), (x, game_area_end_y), 1)
-        for y in range(GAME_AREA_Y, game_area_end_y, CELL_SIZE):
+        for y in range(first_y, game_area_end_y, CELL_SIZE):
             pygame.draw.line(self.screen, GRID_COLOR, (0, y), (SCREEN_WIDTH, y), 1)
         
         # 每隔5格绘制高亮线
         bright_grid = (80, 40, 120)
-        for x in range(0, SCREEN_WIDTH, CELL_SIZE * 5):
+        for x in range(view_x % (CELL_SIZE * 5), SCREEN_WIDTH, CELL_SIZE * 5):
             pygame.draw.line(self.screen, bright_grid, (x, GAME_AREA_Y), (x, game_area_end_y), 2)
-        for y in range(GAME_AREA_Y, game_area_end_y, CELL_SIZE * 5):
+        for y in range(GAME_AREA_Y + (view_y - GAME_AREA_Y) % (CELL_SIZE * 5), game_area_end_y, CELL_SIZE * 5):
             pygame.draw.line(self.screen, bright_grid, (0, y), (SCREEN_WIDTH, y), 2)
 
     def draw_snake(self):
         """绘制蛇（圆球状，带渐变色、光泽效果和刷光效果）"""
+        view_x, view_y = self.view_origin()
+        glow_step = self.entity_glow_step()
         # 计算刷光效果进度
         glow_progress = -1  # -1表示无效，0-1表示从头到尾的进度
         if self.glow_effect_active:
-            elapsed = pygame.time.get_ticks() - self.glow_effect_start
+            elapsed = get_ticks() - self.glow_effect_start
             if elapsed < self.glow_effect_duration:
                 glow_progress = elapsed / self.glow_effect_duration
             else:
@@ -2634,7 +4978,7 @@ class SnakeGame:
         ghost_blink = False
         ghost_blink_interval = 200  # 默认200ms
         if self.ghost_mode:
-            time_left = max(0, self.ghost_end_time - pygame.time.get_ticks())
+            time_left = max(0, self.ghost_end_time - get_ticks())
             # 剩余时间越少，闪烁越快
             if time_left < 2000:  # 最后2秒
                 ghost_blink_interval = 50  # 很快
@@ -2642,19 +4986,37 @@ class SnakeGame:
                 ghost_blink_interval = 100  # 较快
             elif time_left < 4000:  # 最后4秒
                 ghost_blink_interval = 150  # 中等
-            ghost_blink = (pygame.time.get_ticks() // ghost_blink_interval) % 2 == 0
+            ghost_blink = (get_ticks() // ghost_blink_interval) % 2 == 0
         
-        rainbow_active = pygame.time.get_ticks() < self.rainbow_until
+        rainbow_active = get_ticks() < self.rainbow_until
 
         damage_blink = False
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         if now < getattr(self, "damage_blink_until", 0):
             t = now - getattr(self, "damage_blink_start", 0)
             damage_blink = (t // DAMAGE_BLINK_INTERVAL_MS) % 2 == 0
 
+        # 幽灵模式：半透明闪烁
+        alpha = 255
+        if self.ghost_mode:
+            if ghost_blink:
+                alpha = 120  # 半透明
+            else:
+                alpha = 200  # 稍微透明
+
+        if damage_blink:
+            alpha = min(alpha, 90)
+        alpha = quantize_alpha(alpha)
+
+        x0, y0, x1, y1 = self.view_cells
+        atlas_get = self.sprite_atlas.get
+        queue = self.render_queue
+        push = queue.push
         for i, (x, y) in enumerate(self.snake):
-            center_x = x * CELL_SIZE + CELL_SIZE // 2
-            center_y = GAME_AREA_Y + y * CELL_SIZE + CELL_SIZE // 2
+            if not (x0 - 1 <= x <= x1 + 1 and y0 - 1 <= y <= y1 + 1):
+                continue
+            center_x = view_x + x * CELL_SIZE + CELL_SIZE // 2
+            center_y = view_y + y * CELL_SIZE + CELL_SIZE // 2
             
             # 头部和身体大小不同
             if i == 0:
@@ -2687,81 +5049,34 @@ class SnakeGame:
                     )
                     glow_color = tuple(min(255, int(c * 1.2)) for c in self.glow_effect_color)
 
-            # 幽灵模式：半透明闪烁
-            alpha = 255
-            if self.ghost_mode:
-                if ghost_blink:
-                    alpha = 120  # 半透明
-                else:
-                    alpha = 200  # 稍微透明
-
-            if damage_blink:
-                alpha = min(alpha, 90)
-            
             # 渐变色：从头部到尾部颜色渐变
             if snake_length > 1:
                 gradient_factor = i / max(1, snake_length - 1)
                 # 从头部颜色渐变到尾部颜色（稍微变暗）
-                color = tuple(
-                    int(base_color[j] * (1 - gradient_factor * 0.3))
-                    for j in range(3)
-                )
+                shade = 1 - gradient_factor * 0.3
+                color = (int(base_color[0] * shade), int(base_color[1] * shade), int(base_color[2] * shade))
             else:
                 color = base_color
 
             if rainbow_active:
-                hue = ((pygame.time.get_ticks() * 0.0006) + (i * 0.05)) % 1.0
+                hue = ((now * 0.0006) + (i * 0.05)) % 1.0
                 r, g, b = colorsys.hsv_to_rgb(hue, 1.0, 1.0)
                 color = (int(r * 255), int(g * 255), int(b * 255))
                 glow_color = color
             
-            # 绘制发光层（多层圆形，越外越淡）
-            glow_intensity = 6 if is_glowing else 4  # 刷光时加强发光
-            for r in range(radius + glow_intensity, radius, -1):
-                alpha_glow = int((30 if is_glowing else 20) * (1 - (r - radius) / glow_intensity))
-                if self.ghost_mode:
-                    alpha_glow = int(alpha_glow * (alpha / 255))
-                s = pygame.Surface((r*2, r*2), pygame.SRCALPHA)
-                pygame.draw.circle(s, (*glow_color, alpha_glow), (r, r), r)
-                self.screen.blit(s, (center_x - r, center_y - r))
-            
-            # 绘制主体圆球（带渐变和光泽）
-            # 创建渐变表面
-            ball_surf = pygame.Surface((radius*2, radius*2), pygame.SRCALPHA)
-            
-            # 绘制基础圆球
-            pygame.draw.circle(ball_surf, (*color, alpha), (radius, radius), radius)
-            
-            # 添加光泽效果（高光）
-            highlight_radius = int(radius * 0.6)
-            highlight_offset_x = int(radius * 0.3)
-            highlight_offset_y = int(radius * 0.3)
-            highlight_color = tuple(min(c + 80, 255) for c in color)
-            if alpha < 255:
-                highlight_alpha = int(alpha * 0.8)
-            else:
-                highlight_alpha = 200
-            pygame.draw.circle(
-                ball_surf, (*highlight_color, highlight_alpha),
-                (radius - highlight_offset_x, radius - highlight_offset_y),
-                highlight_radius
-            )
-            
-            # 添加顶部小高光点
-            small_highlight_radius = int(radius * 0.3)
-            small_highlight_pos_x = int(radius * 0.4)
-            small_highlight_pos_y = int(radius * 0.4)
-            pygame.draw.circle(
-                ball_surf, (255, 255, 255, min(alpha, 180)),
-                (radius - small_highlight_pos_x, radius - small_highlight_pos_y),
-                small_highlight_radius
+            # 发光层 + 圆球 + 高光预渲染成一张图，按量化后的外观缓存
+            color = quantize_color(color)
+            glow_color = quantize_color(glow_color)
+            sprite = atlas_get(
+                ("snake", radius, color, glow_color, alpha, is_glowing, self.ghost_mode, glow_step),
+                lambda: render_snake_segment(radius, color, glow_color, alpha, is_glowing, self.ghost_mode, glow_step),
             )
+            half = sprite.get_width() // 2
+            push(sprite, (center_x - half, center_y - half))
             
-            # 绘制到屏幕
-            self.screen.blit(ball_surf, (center_x - radius, center_y - radius))
-            
-            # 头部添加眼睛
+            # 头部添加眼睛（先把头提交上去，眼睛直接画在它上面）
             if i == 0:
+                queue.flush(self.screen)
                 # 根据方向确定眼睛位置（眼睛在移动方向的前方，左右对称）
                 dx, dy = self.direction
                 eye_size = max(2, radius // 4)  # 眼睛大小
@@ -2791,14 +5106,11 @@ class SnakeGame:
                     eye2_y = center_y + eye_forward
                 
                 # 绘制眼睛（白色高光，带发光效果）
-                eye_alpha = min(alpha, 255)
                 # 眼睛发光层
-                for r in range(eye_size + 2, eye_size, -1):
-                    eye_glow_alpha = int(60 * (1 - (r - eye_size) / 2))
-                    s = pygame.Surface((r*2, r*2), pygame.SRCALPHA)
-                    pygame.draw.circle(s, (255, 255, 255, eye_glow_alpha), (r, r), r)
-                    self.screen.blit(s, (eye1_x - r, eye1_y - r))
-                    self.screen.blit(s, (eye2_x - r, eye2_y - r))
+                eye_glow = self.sprite_atlas.get(("eye_glow", eye_size), lambda: render_eye_glow(eye_size))
+                r = eye_glow.get_width() // 2
+                self.screen.blit(eye_glow, (eye1_x - r, eye1_y - r))
+                self.screen.blit(eye_glow, (eye2_x - r, eye2_y - r))
                 
                 # 绘制眼睛（白色）
                 pygame.draw.circle(self.screen, (255, 255, 255), (eye1_x, eye1_y), eye_size)
@@ -2808,12 +5120,17 @@ class SnakeGame:
                 pupil_size = max(1, eye_size // 2)
                 pygame.draw.circle(self.screen, (0, 0, 0), (eye1_x, eye1_y), pupil_size)
                 pygame.draw.circle(self.screen, (0, 0, 0), (eye2_x, eye2_y), pupil_size)
+        queue.flush(self.screen)
 
     def draw_foods(self):
         """绘制食物（带霓虹发光和脉冲效果）"""
-        pulse = abs((pygame.time.get_ticks() % 1000) / 500 - 1)  # 0-1-0 脉冲
+        view_x, view_y = self.view_origin()
+        pulse = abs((get_ticks() % 1000) / 500 - 1)  # 0-1-0 脉冲
+        glow_step = self.entity_glow_step()
         
         for x, y in self.normal_foods:
+            if not self.in_view(x, y):
+                continue
             meta = self.normal_food_meta.get((x, y))
             base_color = meta.get("color") if meta else FOOD_COLOR
             glow_color = (
@@ -2821,25 +5138,26 @@ class SnakeGame:
                 min(255, int(base_color[1] * 0.7 + 80)),
                 min(255, int(base_color[2] * 0.7 + 80)),
             )
-            cx = x * CELL_SIZE + CELL_SIZE // 2
-            cy = GAME_AREA_Y + y * CELL_SIZE + CELL_SIZE // 2
+            cx = view_x + x * CELL_SIZE + CELL_SIZE // 2
+            cy = view_y + y * CELL_SIZE + CELL_SIZE // 2
             pad = 4
             r0 = max(3, CELL_SIZE // 2 - pad)
             
-            # 发光层（脉冲效果）
+            # 发光层（脉冲效果）+ 实体 + 高光
             glow_radius = int(r0 + 10 + pulse * 6)
-            for r in range(glow_radius, r0, -2):
-                alpha = int(60 * (1 - (glow_radius - r) / max(1, glow_radius)))
-                s = pygame.Surface((r*2, r*2), pygame.SRCALPHA)
-                pygame.draw.circle(s, (*glow_color, alpha), (r, r), r)
-                self.screen.blit(s, (cx - r, cy - r))
-            
-            # 实体
-            pygame.draw.circle(self.screen, base_color, (cx, cy), r0)
-            # 高光
-            pygame.draw.circle(self.screen, (255, 150, 200), (cx - 3, cy - 3), max(2, r0 // 2))
+            sprite = self.sprite_atlas.get(
+                ("food", base_color, glow_color, r0, glow_radius, glow_step),
+                lambda: render_food(base_color, glow_color, r0, glow_radius, glow_step),
+            )
+            self.render_queue.push(sprite, (cx - glow_radius, cy - glow_radius))
+        self.render_queue.flush(self.screen)
 
+        now = get_ticks()
+        glow_size = int(pulse * 6)
+        queue = self.render_queue
         for x, y in self.energy_foods:
+            if not self.in_view(x, y):
+                continue
             meta = self.energy_food_meta.get((x, y))
             base_color = meta.get("color") if meta else ENERGY_FOOD_COLOR
             glow_color = (
@@ -2847,153 +5165,50 @@ class SnakeGame:
                 min(255, int(base_color[1] * 0.65 + 90)),
                 min(255, int(base_color[2] * 0.65 + 90)),
             )
-            rect = pygame.Rect(x * CELL_SIZE, GAME_AREA_Y + y * CELL_SIZE, CELL_SIZE, CELL_SIZE)
-            
+
             # 发光层（脉冲效果）
-            glow_size = int(pulse * 6)
-            for offset in range(6, 0, -1):
-                glow_rect = pygame.Rect(
-                    x * CELL_SIZE - offset - glow_size,
-                    GAME_AREA_Y + y * CELL_SIZE - offset - glow_size,
-                    CELL_SIZE + (offset + glow_size) * 2,
-                    CELL_SIZE + (offset + glow_size) * 2
-                )
-                alpha_surf = pygame.Surface((glow_rect.width, glow_rect.height), pygame.SRCALPHA)
-                alpha = 40 // offset
-                pygame.draw.rect(alpha_surf, (*glow_color, alpha), alpha_surf.get_rect(), border_radius=10)
-                self.screen.blit(alpha_surf, glow_rect)
-            
-            center_x = x * CELL_SIZE + CELL_SIZE // 2
-            center_y = GAME_AREA_Y + y * CELL_SIZE + CELL_SIZE // 2
+            glow = self.sprite_atlas.get(
+                ("energy_glow", glow_color, glow_size, glow_step),
+                lambda: render_energy_glow(glow_color, glow_size, glow_step),
+            )
+            edge = 6 + glow_size
+            queue.push(glow, (view_x + x * CELL_SIZE - edge, view_y + y * CELL_SIZE - edge))
+
+            center_x = view_x + x * CELL_SIZE + CELL_SIZE // 2
+            center_y = view_y + y * CELL_SIZE + CELL_SIZE // 2
             pad = 5
             rr = max(6, CELL_SIZE // 2 - pad)
 
-            now = pygame.time.get_ticks()
-            blink = 0.5 + 0.5 * math.sin(now / 85.0)
-            bright = 0.78 + 0.22 * blink
-            fill_col = (
-                min(255, int(base_color[0] * bright + 20)),
-                min(255, int(base_color[1] * bright + 20)),
-                min(255, int(base_color[2] * bright + 10)),
-                255,
+            # 闪电（随 sin(now / 85) 闪烁）
+            bolt = self.frame_cache.frame(
+                ("energy_bolt", base_color, rr), ENERGY_BLINK_PERIOD_MS, now,
+                lambda phase: render_energy_bolt(base_color, rr, phase),
             )
-            glow_a = int(60 + 160 * blink)
-
-            bolt_size = rr * 2 + 6
-            bolt = pygame.Surface((bolt_size, bolt_size), pygame.SRCALPHA)
-            bx = bolt_size // 2
-            by = bolt_size // 2
-
-            pts = [
-                (bx - int(rr * 0.10), by - int(rr * 1.10)),
-                (bx + int(rr * 0.55), by - int(rr * 0.10)),
-                (bx + int(rr * 0.15), by - int(rr * 0.10)),
-                (bx + int(rr * 0.10), by + int(rr * 1.10)),
-                (bx - int(rr * 0.55), by + int(rr * 0.05)),
-                (bx - int(rr * 0.20), by + int(rr * 0.05)),
-            ]
-
-            # glow outline (blink)
-            pygame.draw.polygon(bolt, (255, 255, 255, glow_a), pts, width=6)
-            pygame.draw.polygon(bolt, (255, 255, 180, max(0, glow_a - 40)), pts, width=3)
-
-            # solid fill
-            pygame.draw.polygon(bolt, fill_col, pts)
-
-            pygame.draw.polygon(bolt, (20, 20, 20, 170), pts, width=2)
-
-            self.screen.blit(bolt, (center_x - bx, center_y - by))
+            half = bolt.get_width() // 2
+            queue.push(bolt, (center_x - half, center_y - half))
+        queue.flush(self.screen)
 
     def draw_obstacles(self):
-        """绘制荆棘障碍（赛博朋克风格）"""
-        for x, y in self.obstacles:
-            center_x = x * CELL_SIZE + CELL_SIZE // 2
-            center_y = GAME_AREA_Y + y * CELL_SIZE + CELL_SIZE // 2
-            
-            # 发光层（圆形扩散）
-            for r in range(18, 8, -2):
-                alpha = int(60 * (18 - r) / 18)
-                s = pygame.Surface((r*2, r*2), pygame.SRCALPHA)
-                pygame.draw.circle(s, (*OBSTACLE_GLOW, alpha), (r, r), r)
-                self.screen.blit(s, (center_x - r, center_y - r))
-            
-            # 中心危险标志（X形）
-            danger_color = OBSTACLE_COLOR
-            line_width = 3
-            offset = CELL_SIZE // 3
-            
-            # X 的两条线
-            pygame.draw.line(
-                self.screen, danger_color,
-                (center_x - offset, center_y - offset),
-                (center_x + offset, center_y + offset),
-                line_width
-            )
-            pygame.draw.line(
-                self.screen, danger_color,
-                (center_x + offset, center_y - offset),
-                (center_x - offset, center_y + offset),
-                line_width
-            )
-            
-            # 四个方向的尖刺
-            spike_length = CELL_SIZE // 2 - 2
-            spike_width = 6
-            
-            # 上尖刺
-            spike_top = [
-                (center_x, center_y - spike_length),
-                (center_x - spike_width, center_y),
-                (center_x + spike_width, center_y)
-            ]
-            pygame.draw.polygon(self.screen, danger_color, spike_top)
-            pygame.draw.polygon(self.screen, (255, 100, 255), spike_top, 2)
-            
-            # 下尖刺
-            spike_bottom = [
-                (center_x, center_y + spike_length),
-                (center_x - spike_width, center_y),
-                (center_x + spike_width, center_y)
-            ]
-            pygame.draw.polygon(self.screen, danger_color, spike_bottom)
-            pygame.draw.polygon(self.screen, (255, 100, 255), spike_bottom, 2)
-            
-            # 左尖刺
-            spike_left = [
-                (center_x - spike_length, center_y),
-                (center_x, center_y - spike_width),
-                (center_x, center_y + spike_width)
-            ]
-            pygame.draw.polygon(self.screen, danger_color, spike_left)
-            pygame.draw.polygon(self.screen, (255, 100, 255), spike_left, 2)
-            
-            # 右尖刺
-            spike_right = [
-                (center_x + spike_length, center_y),
-                (center_x, center_y - spike_width),
-                (center_x, center_y + spike_width)
-            ]
-            pygame.draw.polygon(self.screen, danger_color, spike_right)
-            pygame.draw.polygon(self.screen, (255, 100, 255), spike_right, 2)
-            
-            # 中心圆点
-            pygame.draw.circle(self.screen, (255, 0, 200), (center_x, center_y), 4)
-            pygame.draw.circle(self.screen, (255, 150, 255), (center_x, center_y), 2)
+        """绘制荆棘障碍（赛博朋克风格），整层缓存在 ObstacleLayer 里"""
+        sprite = self.sprite_atlas.get(("obstacle",), render_obstacle)
+        self.obstacle_layer.draw(self.screen, self.view_origin(), self.view_cells, self.obstacles_in, sprite)
+
+    def obstacles_in(self, x0, y0, x1, y1):
+        return self.query_area(x0, y0, x1, y1, (SPATIAL_OBSTACLE,)).get(SPATIAL_OBSTACLE, ())
 
     def draw_hud(self):
         """绘制HUD（赛博朋克风格，显示在屏幕上方）"""
         # 绘制半透明背景条
         hud_height = 30
-        hud_surface = pygame.Surface((SCREEN_WIDTH, hud_height), pygame.SRCALPHA)
-        hud_surface.fill((10, 5, 20, 200))  # 半透明深色背景
+        hud_surface = self.overlays.get((SCREEN_WIDTH, hud_height), fill=(10, 5, 20, 200))  # 半透明深色背景
         self.screen.blit(hud_surface, (0, 0))
         
         # 左上角：分数 / 能量 / 幽灵剩余时间
         time_left = 0
         if self.ghost_mode:
-            time_left = max(0, (self.ghost_end_time - pygame.time.get_ticks()) // 1000)
+            time_left = max(0, (self.ghost_end_time - get_ticks()) // 1000)
 
-        now = pygame.time.get_ticks()
+        now = get_ticks()
         score_now = int(self.score)
         score_part = f"分数: {score_now}"
         score_part_old = None
@@ -3006,8 +5221,12 @@ class SnakeGame:
 
         ghost_part = f"幽灵模式: {time_left}秒" if self.ghost_mode else "幽灵模式: 关闭"
         rest_part = f"能量: {self.energy}   {ghost_part}"
+        if self.rewind_buffer is not None:
+            rest_part += f"   回溯: {self.rewind_charges}"
+        if self.autopilot is not None:
+            rest_part += "   自动驾驶"
 
-        text_height = self.font_small.render(score_part, True, TEXT_COLOR).get_height()
+        text_height = self.glow_text(score_part, self.font_small, TEXT_COLOR).get_height() - GLOW_TEXT_PAD * 2
         hud_center_y = (HUD_HEIGHT - text_height) // 2
 
         score_x = 8
@@ -3041,7 +5260,7 @@ class SnakeGame:
             t = max(0.0, min(1.0, t))
             cx = score_x + int(score_w * 0.55)
             cy = hud_center_y + text_height // 2
-            burst = pygame.Surface((SCREEN_WIDTH, HUD_HEIGHT), pygame.SRCALPHA)
+            burst = self.overlays.get((SCREEN_WIDTH, HUD_HEIGHT), slot="burst")
             base_a = int(160 * (1.0 - t))
             r0 = int(6 + 16 * t)
             for w in (10, 7, 4, 2):
@@ -3059,8 +5278,8 @@ class SnakeGame:
         # 右上角显示最高分
         if self.leaderboard:
             high_score_text = f"最高分: {self.leaderboard[0]['score']}"
-            high_score_surf = self.font_small.render(high_score_text, True, (255, 215, 0))
-            high_score_height = high_score_surf.get_height()
+            high_score_surf = self.glow_text(high_score_text, self.font_small, (255, 215, 0))
+            high_score_height = high_score_surf.get_height() - GLOW_TEXT_PAD * 2
             high_score_y = (HUD_HEIGHT - high_score_height) // 2
 
             high_score_w = self.font_small.size(high_score_text)[0]
@@ -3072,6 +5291,26 @@ class SnakeGame:
             time_x = max(8, SCREEN_WIDTH - 8 - time_w)
             self.draw_text_with_glow(time_text, self.font_small, (180, 220, 255), (time_x, hud_center_y))
 
+    def draw_debug_overlay(self):
+        """F3 调试面板：帧率、画质档位和各类实体的实时数量 / 上限 / 累计清理数"""
+        budget = self.entity_budget
+        lines = [
+            f"FPS {self.clock.get_fps():.0f}",
+            f"画质 {self.quality.tier['name']}  {self.quality.average_ms():.1f}/{self.quality.budget_ms:.1f} ms",
+            f"泛光 {'开' if self.bloom_active() else '关'}",
+            "输入 p50/95/99 " + "/".join("-" if v is None else str(v) for v in self.input_latency.percentiles(50, 95, 99)) + " ms",
+        ]
+        for kind, count in budget.live.items():
+            cap = budget.budgets[kind][0]
+            lines.append(f"{kind} {count}/{cap}  -{budget.despawned[kind]}")
+        lines.append(f"particle {len(self.particle_system.particles)}/{self.particle_system.max_particles}")
+
+        line_h = self.font_small.get_linesize()
+        panel = self.overlays.get((220, line_h * len(lines) + 8), fill=(10, 5, 20, 190), slot="debug")
+        self.screen.blit(panel, (4, HUD_HEIGHT + 4))
+        for i, line in enumerate(lines):
+            self.screen.blit(self.plain_text(line, self.font_small, (180, 255, 200)), (10, HUD_HEIGHT + 8 + i * line_h))
+
     def get_run_elapsed_ms(self, now: int) -> int:
         if not getattr(self, "run_start_time", 0):
             return 0
@@ -3091,6 +5330,11 @@ class SnakeGame:
                 "暂停: P",
                 "排行榜: Tab (同时暂停)",
                 "翻页: ← / →",
+                "自动驾驶: F2 (挂机测试)",
+                "调试面板: F3 (帧率 / 实体数量)",
+                "整屏泛光: F4",
+                "快速存档 / 读档: F5 / F9",
+                f"时光回溯: Backspace (退回5秒，每局{REWIND_CHARGES}次)",
                 "",
                 "开始界面: 空格开始  ESC退出",
                 "游戏结束: R重开  ESC回到开始",
@@ -3122,8 +5366,7 @@ class SnakeGame:
             return
         idx = max(0, min(int(self.help_page), len(pages) - 1))
         self.help_page = idx
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((10, 5, 20, 230))
+        overlay = self.overlays.get((SCREEN_WIDTH, SCREEN_HEIGHT), fill=(10, 5, 20, 230))
         self.screen.blit(overlay, (0, 0))
 
         center_x = SCREEN_WIDTH // 2
@@ -3158,8 +5401,7 @@ class SnakeGame:
                 y += 26
 
     def draw_pause_overlay(self):
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT), pygame.SRCALPHA)
-        overlay.fill((10, 5, 20, 120))
+        overlay = self.overlays.get((SCREEN_WIDTH, SCREEN_HEIGHT), fill=(10, 5, 20, 120))
         self.screen.blit(overlay, (0, 0))
         center_x = SCREEN_WIDTH // 2
         center_y = SCREEN_HEIGHT // 2
@@ -3168,16 +5410,15 @@ class SnakeGame:
 
     def draw_game_over(self):
         """绘制Game Over界面（赛博朋克风格）"""
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        overlay = self.overlays.get((SCREEN_WIDTH, SCREEN_HEIGHT), alpha=False, fill=(10, 5, 20))
         overlay.set_alpha(180)
-        overlay.fill((10, 5, 20))
         self.screen.blit(overlay, (0, 0))
 
         center_x = SCREEN_WIDTH // 2
         center_y = SCREEN_HEIGHT // 2
 
         # 标题带闪烁效果
-        blink = (pygame.time.get_ticks() // 500) % 2
+        blink = (get_ticks() // 500) % 2
         title_color = (255, 0, 127) if blink else (255, 50, 150)
         self.draw_text_with_glow("游戏结束", self.font_big, title_color, (center_x, center_y - 60), center=True)
         
@@ -3196,16 +5437,15 @@ class SnakeGame:
 
     def draw_start_screen(self):
         """绘制开始界面（赛博朋克风格）"""
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        overlay = self.overlays.get((SCREEN_WIDTH, SCREEN_HEIGHT), alpha=False, fill=(10, 5, 20))
         overlay.set_alpha(210)
-        overlay.fill((10, 5, 20))
         self.screen.blit(overlay, (0, 0))
 
         center_x = SCREEN_WIDTH // 2
         center_y = SCREEN_HEIGHT // 2
 
         # 标题带脉冲效果
-        pulse = abs((pygame.time.get_ticks() % 2000) / 1000 - 1)
+        pulse = abs((get_ticks() % 2000) / 1000 - 1)
         title_color = (
             int(255),
             int(100 + pulse * 100),
@@ -3222,7 +5462,7 @@ class SnakeGame:
             self.draw_text_with_glow("暂无记录", self.font_medium, (150, 150, 150), (center_x, center_y + 40), center=True)
         
         # 提示文字移到屏幕下方（带闪烁）
-        blink = (pygame.time.get_ticks() // 800) % 2
+        blink = (get_ticks() // 800) % 2
         tip_alpha = 220 if blink else 150
         tip_color = (tip_alpha, tip_alpha, 255)
         # 按空格开始提示
@@ -3232,9 +5472,8 @@ class SnakeGame:
 
     def draw_leaderboard(self):
         """绘制排行榜界面（赛博朋克风格）"""
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        overlay = self.overlays.get((SCREEN_WIDTH, SCREEN_HEIGHT), alpha=False, fill=(10, 5, 20))
         overlay.set_alpha(230)
-        overlay.fill((10, 5, 20))
         self.screen.blit(overlay, (0, 0))
 
         center_x = SCREEN_WIDTH // 2
@@ -3251,7 +5490,7 @@ class SnakeGame:
             self.draw_text_with_glow("暂无记录", self.font_small, TEXT_COLOR, (center_x, y_start + 40), center=True)
         else:
             y_offset = y_start
-            current_time = pygame.time.get_ticks()
+            current_time = get_ticks()
             for i, entry in enumerate(self.leaderboard[:MAX_LEADERBOARD_ENTRIES]):
                 rank_text = f"{i+1}. {entry['name']}"
                 score_text = f"{entry['score']}"
@@ -3265,27 +5504,28 @@ class SnakeGame:
                     else:
                         color = (200, 180, 0)  # 暗金色
                     # 添加发光边框
+                    glow_surf = self.plain_text(rank_text, self.font_small, (255, 200, 50))
+                    glow_surf2 = self.plain_text(score_text, self.font_small, (255, 200, 50))
                     for glow_offset in [(1,1), (-1,1), (1,-1), (-1,-1)]:
-                        glow_surf = self.font_small.render(rank_text, True, (255, 200, 50))
                         self.screen.blit(glow_surf, (center_x - 150 + glow_offset[0], y_offset + glow_offset[1]))
-                        glow_surf2 = self.font_small.render(score_text, True, (255, 200, 50))
                         self.screen.blit(glow_surf2, (center_x + 100 + glow_offset[0], y_offset + glow_offset[1]))
                 elif i == 1:
                     # 第二名：紫色，脉冲效果（与第一名交换，颜色改为紫色）
                     pulse = abs((current_time % 1500) / 750 - 1)
+                    pulse = round(pulse * ANIM_FRAMES) / ANIM_FRAMES  # 分档，颜色只有几十种，文字图可以缓存
                     color = (
                         int(200 + pulse * 55),
                         int(100 + pulse * 100),
                         int(255)
                     )
                     # 添加额外的发光效果
+                    glow_color = tuple(min(255, c + 50) for c in color)
+                    glow_surf = self.plain_text(rank_text, self.font_small, glow_color)
+                    glow_surf2 = self.plain_text(score_text, self.font_small, glow_color)
                     for glow_offset in range(3, 0, -1):
                         glow_alpha = int(40 * pulse / glow_offset)
-                        glow_color = tuple(min(255, c + 50) for c in color)
-                        glow_surf = self.font_small.render(rank_text, True, glow_color)
                         glow_surf.set_alpha(glow_alpha)
                         self.screen.blit(glow_surf, (center_x - 150 - glow_offset, y_offset - glow_offset))
-                        glow_surf2 = self.font_small.render(score_text, True, glow_color)
                         glow_surf2.set_alpha(glow_alpha)
                         self.screen.blit(glow_surf2, (center_x + 100 - glow_offset, y_offset - glow_offset))
                 elif i == 2:
@@ -3307,12 +5547,11 @@ class SnakeGame:
             bar_y = SCREEN_HEIGHT - BOTTOM_BAR_HEIGHT
             
             # 绘制半透明背景
-            bar_surface = pygame.Surface((SCREEN_WIDTH, BOTTOM_BAR_HEIGHT), pygame.SRCALPHA)
-            bar_surface.fill((10, 5, 20, 180))
+            bar_surface = self.overlays.get((SCREEN_WIDTH, BOTTOM_BAR_HEIGHT), fill=(10, 5, 20, 180))
             self.screen.blit(bar_surface, (0, bar_y))
 
             # 提示文字闪烁
-            blink = (pygame.time.get_ticks() // 400) % 2
+            blink = (get_ticks() // 400) % 2
             if blink:
                 prompt_text = "按空格使用幽灵模式技能"
                 prompt_color = (255, 255, 0) # Yellow
@@ -3322,16 +5561,15 @@ class SnakeGame:
 
     def draw_name_input(self):
         """绘制输入名字界面（赛博朋克风格）"""
-        overlay = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT))
+        overlay = self.overlays.get((SCREEN_WIDTH, SCREEN_HEIGHT), alpha=False, fill=(10, 5, 20))
         overlay.set_alpha(220)
-        overlay.fill((10, 5, 20))
         self.screen.blit(overlay, (0, 0))
 
         center_x = SCREEN_WIDTH // 2
         center_y = SCREEN_HEIGHT // 2
 
         # 恭喜文字带闪烁
-        blink = (pygame.time.get_ticks() // 300) % 2
+        blink = (get_ticks() // 300) % 2
         congrats_color = (255, 215, 0) if blink else (255, 255, 0)
         self.draw_text_with_glow("新纪录！", self.font_big, congrats_color, (center_x, center_y - 80), center=True)
         self.draw_text_with_glow("请输入你的名字：", self.font_small, TEXT_COLOR, (center_x, center_y - 30), center=True)
@@ -3350,24 +5588,90 @@ class SnakeGame:
         pygame.draw.rect(self.screen, (0, 255, 255), input_box, 2, border_radius=3)
         
         # 显示输入的文字
-        cursor_blink = "_" if (pygame.time.get_ticks() // 500) % 2 else " "
+        cursor_blink = "_" if (get_ticks() // 500) % 2 else " "
         self.draw_text_with_glow(self.player_name_input + cursor_blink, self.font_small, (255, 255, 255), (input_box.x + 10, input_box.y + 10))
 
         self.draw_text_with_glow("回车确认，ESC 跳过", self.font_small, (200, 200, 220), (center_x, center_y + 60), center=True)
 
+    # -------------------- 显示 --------------------
+    def open_display(self, mode: str, vsync: bool = False):
+        """打开窗口；self.screen 始终是逻辑分辨率的画面，所有绘制都画在它上面，present() 负责交给屏幕
+
+        vsync 需要 SDL 的渲染器：window 模式会带上 SCALED（窗口大小不变），smooth 模式是软件画面，不支持
+        """
+        self.display_mode = mode
+        self.window = None
+        if mode == DISPLAY_SCALED:
+            self.screen = self.set_display_mode(pygame.SCALED | pygame.FULLSCREEN, vsync)
+        elif mode == DISPLAY_SMOOTH:
+            self.window = pygame.display.set_mode((0, 0), pygame.FULLSCREEN)
+            ww, wh = self.window.get_size()
+            scale = min(ww / SCREEN_WIDTH, wh / SCREEN_HEIGHT)
+            self.present_rect = pygame.Rect(0, 0, int(SCREEN_WIDTH * scale), int(SCREEN_HEIGHT * scale))
+            self.present_rect.center = (ww // 2, wh // 2)
+            self.window.fill((0, 0, 0))
+            # 直接缩放进窗口的子图层，省掉中间图和一次整屏 blit
+            self.present_target = self.window.subsurface(self.present_rect)
+            self.screen = pygame.Surface((SCREEN_WIDTH, SCREEN_HEIGHT)).convert(self.window)
+        else:
+            self.screen = self.set_display_mode(pygame.SCALED if vsync else 0, vsync)
+
+    @staticmethod
+    def set_display_mode(flags: int, vsync: bool):
+        if vsync:
+            try:
+                return pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), flags, vsync=1)
+            except pygame.error as e:
+                print(f"垂直同步不可用，改为普通刷新: {e}")
+        return pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT), flags)
+
+    def is_static_screen(self) -> bool:
+        """画面上只有闪烁之类的小动画（开始界面、暂停、排行榜、输入名字、帮助），可以降帧"""
+        if self.autopilot is not None or self.particle_system.particles:
+            return False
+        return (not self.started or self.paused or self.game_over
+                or self.show_leaderboard or self.entering_name or self.show_help)
+
+    def present(self):
+        if self.window is not None:
+            pygame.transform.smoothscale(self.screen, self.present_rect.size, self.present_target)
+        pygame.display.flip()
+        if self.startup_trace is not None:
+            self.startup_trace.mark("首帧")
+            if self.trace_startup:
+                self.startup_trace.report("启动耗时（进程启动 → 第一帧）")
+            self.startup_trace = None
+
     # -------------------- 主循环 --------------------
+    def record_frame_time(self, frame_start: float):
+        """把这一帧更新 + 绘制的耗时交给画质调节，换档时同步粒子数量
+
+        在 present() 之前量：clock.get_rawtime() 会把 flip 等垂直同步的时间也算进去，
+        开了 vsync 时每帧都正好是一个刷新周期，画质只会往下掉
+        """
+        if self.quality.record((time.perf_counter() - frame_start) * 1000):
+            self.particle_system.density = self.quality.tier["particles"]
+
     def run(self):
         while True:
+            frame_start = time.perf_counter()
             self.handle_input()
+            self.update_autopilot_session()
 
             # 启动画面：未开始时仅渲染，不更新逻辑
             if not self.started:
-                self.screen.fill(BG_COLOR)
-                self.draw_grid()
-                self.draw_obstacles()
-                self.draw_foods()
-                self.draw_snake()
-                self.draw_hud()
+                # lazy 模式下对局还没建好；开始界面本身是不透明的整屏底图，不画棋盘看起来也一样
+                if not self.deferred_init:
+                    self.update_camera()
+                    self.screen.fill(BG_COLOR)
+                    self.screen.set_clip(self.game_area_rect())
+                    self.draw_grid()
+                    self.draw_obstacles()
+                    self.draw_foods()
+                    self.draw_snake()
+                    self.apply_bloom()
+                    self.screen.set_clip(None)
+                    self.draw_hud()
                 self.draw_start_screen()
                 
                 # 启动画面也可以查看排行榜
@@ -3377,8 +5681,9 @@ class SnakeGame:
                 if self.show_help:
                     self.draw_help_overlay()
                 
-                pygame.display.flip()
-                self.clock.tick(self.fps)
+                self.record_frame_time(frame_start)
+                self.present()
+                self.pacer.tick(self.fps, idle=self.is_static_screen())
                 continue
 
             # Game Over input is now handled in handle_input()
@@ -3392,7 +5697,10 @@ class SnakeGame:
             # 粒子系统始终更新（即使游戏暂停）
             self.particle_system.update()
 
+            self.update_camera()
             self.screen.fill(BG_COLOR)
+            # 地图内容只画在游戏区域里（镜头滚动时格子会跨出视口边缘）
+            self.screen.set_clip(self.game_area_rect())
             self.draw_grid()
             self.draw_obstacles()
             self.draw_fog_zone()
@@ -3407,9 +5715,11 @@ class SnakeGame:
             self.draw_snake()
             
             # 绘制粒子特效（在蛇上面）
-            self.particle_system.draw(self.screen)
+            self.particle_system.draw(self.screen, (-int(self.camera_x), -int(self.camera_y)))
 
             self.draw_bomb_explosions()
+            self.apply_bloom()
+            self.screen.set_clip(None)
 
             self.draw_shockwave()
             self.draw_boss_kill_freeze_overlay()
@@ -3421,6 +5731,9 @@ class SnakeGame:
             # 迷雾遮罩（放在HUD前后都可，这里放HUD后，保证HUD可见）
             self.draw_fog()
 
+            if self.show_debug:
+                self.draw_debug_overlay()
+
             if (not self.game_over) and self.paused and (not self.show_leaderboard) and (not self.entering_name):
                 self.draw_pause_overlay()
 
@@ -3438,13 +5751,50 @@ class SnakeGame:
             if self.show_help:
                 self.draw_help_overlay()
 
-            pygame.display.flip()
-            self.clock.tick(self.fps)
+            self.record_frame_time(frame_start)
+            self.present()
+            self.pacer.tick(self.fps, idle=self.is_static_screen())
+
+
+def parse_args(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="技能贪吃蛇")
+    parser.add_argument("--autopilot", action="store_true", help="启动即开启自动驾驶（无人值守压力测试）")
+    parser.add_argument("--qa", action="store_true", help="QA 模式：暂停时按 , 逐步回退")
+    parser.add_argument("--grid", type=parse_grid_size, default=None, metavar="WxH",
+                        help="地图大小，例如 200x200（超过窗口时镜头跟随蛇头滚动）")
+    parser.add_argument("--display", choices=DISPLAY_MODES, default=DISPLAY_WINDOW,
+                        help="window：原生窗口；scaled：全屏由显卡放大；smooth：全屏平滑缩放")
+    parser.add_argument("--bloom", action="store_true", help="开启整屏泛光（游戏中按 F4 切换）")
+    parser.add_argument("--vsync", action="store_true", help="开启垂直同步（smooth 显示方式下无效）")
+    parser.add_argument("--pacing", choices=PACING_MODES, default=PACING_SLEEP,
+                        help="sleep：睡眠等待，省电；busy：忙等，帧间隔更稳")
+    parser.add_argument("--lazy", action="store_true", help="先只初始化显示和字体，音频和对局状态等按下按键再准备")
+    parser.add_argument("--trace-startup", action="store_true", help="打印启动各阶段耗时")
+    return parser.parse_args(argv)
+
+
+def parse_grid_size(text):
+    import argparse
+    try:
+        w, h = (int(v) for v in text.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"地图大小格式应为 宽x高，例如 200x200: {text}")
+    if w < BOSS_SIZE + 2 or h < BOSS_SIZE + 2:
+        raise argparse.ArgumentTypeError(f"地图至少 {BOSS_SIZE + 2}x{BOSS_SIZE + 2}: {text}")
+    return w, h
 
 
 if __name__ == "__main__":
     # 防止多次导入时自动运行
-    game = SnakeGame()
+    args = parse_args()
+    if args.grid:
+        configure_board(*args.grid)
+    game = SnakeGame(display=args.display, bloom=args.bloom, vsync=args.vsync, pacing=args.pacing,
+                     lazy=args.lazy, trace_startup=args.trace_startup)
+    if args.autopilot:
+        game.toggle_autopilot()
+    game.qa_mode = args.qa
     game.run()
 
 
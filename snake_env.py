@@ -0,0 +1,212 @@
+"""
+批量训练环境：N 局无头 SnakeGame 同步推进，给 AI 训练用
+
+- 规则直接复用 SnakeGame.update（传送门、幽灵模式、连击、Boss 等全部一致）
+- 所有对局共用一个手动推进的时钟，每次 step 推进一个移动间隔
+- 每局有独立的随机数状态，同一个种子可完整复现
+- 接口仿照 Gym：reset() / step(actions)，观测和奖励都是 numpy 数组
+- 默认每次返回观测的副本，可以直接存进回放缓冲区；copy_obs=False 时返回内部数组本身，
+  省一次拷贝，但下一次 step / reset 会原地覆盖
+
+用法：
+    env = BatchSnakeEnv(num_envs=16, seed=0)
+    obs = env.reset()
+    obs, rewards, dones, infos = env.step(np.zeros(16, dtype=np.int64))
+"""
+
+import random
+
+import numpy as np
+
+import novel_snake as ns
+
+
+# 动作：0 上 / 1 下 / 2 左 / 3 右 / 4 保持方向 / 5 开关幽灵模式
+ACTION_DIRECTIONS = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+ACTION_NOOP = 4
+ACTION_GHOST = 5
+NUM_ACTIONS = 6
+
+# 棋盘观测通道
+CH_HEAD = 0
+CH_BODY = 1
+CH_OBSTACLE = 2
+CH_FOOD = 3
+CH_ENERGY = 4
+CH_ITEM = 5
+CH_PORTAL = 6
+CH_SPIKE = 7
+CH_SHADOW = 8
+CH_HUNTER = 9
+CH_BOSS = 10
+CH_FOG_ZONE = 11
+NUM_CHANNELS = 12
+
+# 道具在 CH_ITEM 通道里的编码
+ITEM_CODES = {
+    ns.ITEM_MAGNET: 1,
+    ns.ITEM_BOMB: 2,
+    ns.ITEM_SCISSORS: 3,
+    ns.ITEM_ROTTEN_APPLE: 4,
+}
+
+# 向量观测：能量、幽灵模式、幽灵剩余秒数、反向控制、Boss 护盾、长度、方向 dx / dy
+NUM_FEATURES = 8
+
+DEATH_PENALTY = 10.0  # 死亡时额外扣的奖励
+
+
+class BatchSnakeEnv:
+    """N 局无头贪吃蛇同步推进的向量化环境"""
+    def __init__(self, num_envs: int, seed: int = None, step_ms: int = ns.STEP_INTERVAL_MS, auto_reset: bool = True,
+                 copy_obs: bool = True):
+        self.num_envs = int(num_envs)
+        self.step_ms = int(step_ms)
+        self.auto_reset = auto_reset
+        self.copy_obs = copy_obs
+        self.width = ns.GRID_WIDTH
+        self.height = ns.GRID_HEIGHT
+
+        self.clock = ns.ManualClock()
+        ns.set_tick_source(self.clock)
+
+        seeder = random.Random(seed)
+        self.rng_states = []
+        for _ in range(self.num_envs):
+            self.rng_states.append(random.Random(seeder.getrandbits(64)).getstate())
+
+        self.games = [None] * self.num_envs
+        self.board = np.zeros((self.num_envs, NUM_CHANNELS, self.height, self.width), dtype=np.uint8)
+        self.features = np.zeros((self.num_envs, NUM_FEATURES), dtype=np.float32)
+        self.episode_steps = np.zeros(self.num_envs, dtype=np.int64)
+
+    # -------------------- 随机数隔离 --------------------
+    def _enter(self, i):
+        """切换到第 i 局的随机数状态；游戏代码使用全局 random 模块"""
+        random.setstate(self.rng_states[i])
+
+    def _leave(self, i):
+        self.rng_states[i] = random.getstate()
+
+    # -------------------- Gym 接口 --------------------
+    def reset(self):
+        outer = random.getstate()
+        for i in range(self.num_envs):
+            self._reset_one(i)
+        random.setstate(outer)
+        return self._observe_all()
+
+    def _reset_one(self, i):
+        self._enter(i)
+        if self.games[i] is None:
+            self.games[i] = ns.SnakeGame(headless=True)
+        else:
+            self.games[i].reset(start_with_intro=False)
+        self._leave(i)
+        self.episode_steps[i] = 0
+
+    def step(self, actions):
+        """推进一个移动间隔；返回 (obs, rewards, dones, infos)，结束的局自动重开"""
+        actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+        rewards = np.zeros(self.num_envs, dtype=np.float32)
+        dones = np.zeros(self.num_envs, dtype=bool)
+        infos = [{} for _ in range(self.num_envs)]
+
+        outer = random.getstate()
+        self.clock.advance(self.step_ms)
+        for i in range(self.num_envs):
+            game = self.games[i]
+            self._enter(i)
+            self.apply_action(game, int(actions[i]))
+            before = game.score
+            game.update()
+            self._leave(i)
+            self.episode_steps[i] += 1
+
+            rewards[i] = float(game.score - before)
+            if game.game_over:
+                rewards[i] -= DEATH_PENALTY
+                dones[i] = True
+                infos[i] = {
+                    "score": game.score,
+                    "length": len(game.snake),
+                    "cause": game.game_over_reason,
+                    "steps": int(self.episode_steps[i]),
+                    "elapsed_ms": game.get_run_elapsed_ms(self.clock.now),
+                }
+                if self.auto_reset:
+                    self._reset_one(i)
+        random.setstate(outer)
+        return self._observe_all(), rewards, dones, infos
+
+    def close(self):
+        ns.set_tick_source(None)
+
+    @staticmethod
+    def apply_action(game, action):
+        """与 handle_input 的按键规则一致：反向控制、禁止掉头、空格开关幽灵模式"""
+        if action == ACTION_GHOST:
+            game.toggle_ghost_mode()
+            return
+        if 0 <= action < len(ACTION_DIRECTIONS):
+            game.press_direction(ACTION_DIRECTIONS[action], queue=False)
+
+    # -------------------- 观测 --------------------
+    def _observe_all(self):
+        self.board.fill(0)
+        for i, game in enumerate(self.games):
+            self._observe(i, game)
+        if self.copy_obs:
+            return {"board": self.board.copy(), "features": self.features.copy()}
+        return {"board": self.board, "features": self.features}
+
+    def _observe(self, i, game):
+        b = self.board[i]
+        w = self.width
+        h = self.height
+
+        def put(channel, pos, value=1):
+            x, y = pos
+            if 0 <= x < w and 0 <= y < h:
+                b[channel, y, x] = value
+
+        for pos in game.snake[1:]:
+            put(CH_BODY, pos)
+        put(CH_HEAD, game.snake[0])
+        for pos in game.obstacles:
+            put(CH_OBSTACLE, pos)
+        for pos in game.normal_foods:
+            put(CH_FOOD, pos)
+        for pos in game.energy_foods:
+            put(CH_ENERGY, pos)
+        for it in game.items:
+            put(CH_ITEM, it["pos"], ITEM_CODES.get(it["type"], 1))
+        for p in game.portals:
+            put(CH_PORTAL, p.pos, p.color_id + 1)
+        for sp in game.spikes:
+            if sp.visible:
+                put(CH_SPIKE, sp.pos)
+        for ss in game.shadow_snakes:
+            for pos in ss.snake:
+                put(CH_SHADOW, pos)
+        for gh in game.ghost_hunters:
+            put(CH_HUNTER, gh.pos, 2 if gh.visible else 1)
+        if game.boss:
+            for pos in game.boss.get_cells():
+                put(CH_BOSS, pos, 1)
+            for bullet in game.boss.bullets:
+                put(CH_BOSS, (int(round(bullet["x"])), int(round(bullet["y"]))), 2)
+        for z in game.fog_zones:
+            for pos in game.get_fog_zone_cells(z["center"]):
+                put(CH_FOG_ZONE, pos)
+
+        now = self.clock.now
+        f = self.features[i]
+        f[0] = game.energy
+        f[1] = 1.0 if game.ghost_mode else 0.0
+        f[2] = max(0, game.ghost_end_time - now) / 1000.0 if game.ghost_mode else 0.0
+        f[3] = 1.0 if now < game.reverse_controls_until else 0.0
+        f[4] = 1.0 if (game.boss and game.boss.shield_active) else 0.0
+        f[5] = len(game.snake)
+        f[6] = game.direction[0]
+        f[7] = game.direction[1]
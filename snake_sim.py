@@ -0,0 +1,299 @@
+"""
+无头批量模拟：把大量带种子的对局分发到多进程里跑，用于调数值平衡
+
+用法：
+    python snake_sim.py --runs 100000 --policy greedy --out results.csv
+    python snake_sim.py --runs 10000 --policy autopilot
+    python snake_sim.py --runs 20000 --set BOSS_FOOD_THRESHOLD=5 --set ITEM_SPAWN_MIN=1500
+    python snake_sim.py --runs 1000 --policy my_bots:smart_policy
+    python snake_sim.py --runs 1000 --grid 200x200
+
+策略是一个函数 policy(game)，每个移动间隔调用一次，返回：
+    - (dx, dy)：按下对应方向键（规则与键盘一致）
+    - "ghost"：按空格开关幽灵模式
+    - None：不操作
+自定义策略用 "模块名:函数名" 指定。
+
+结果逐行写入 CSV（或安装了 pyarrow 时写 .parquet），每局一行：
+种子、分数、存活时间、步数、长度、死因等。
+"""
+
+import argparse
+import csv
+import importlib
+import os
+import random
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import novel_snake as ns
+
+
+DIRECTIONS = [(0, -1), (0, 1), (-1, 0), (1, 0)]
+
+RESULT_FIELDS = [
+    "seed",
+    "score",
+    "survival_ms",
+    "steps",
+    "length",
+    "max_length",
+    "food_eaten",
+    "cause",
+]
+
+TIMEOUT_CAUSE = "模拟超时"
+
+
+# -------------------- 内置策略 --------------------
+def random_policy(game):
+    """随机转向（不主动避险），作为基准"""
+    if random.random() < 0.15:
+        return random.choice(DIRECTIONS)
+    return None
+
+
+def greedy_policy(game):
+    """朝最近的食物走，只避开下一步必死的格子"""
+    hx, hy = game.snake[0]
+    targets = list(game.normal_foods) + list(game.energy_foods)
+    blocked = set(game.snake[:-1]) | game.obstacles
+    for sp in game.spikes:
+        if sp.visible:
+            blocked.add(sp.pos)
+    for ss in game.shadow_snakes:
+        blocked.update(ss.snake)
+    if game.boss:
+        blocked.update(game.boss.get_cells())
+
+    best = None
+    best_d = None
+    for d in DIRECTIONS:
+        if d == (-game.direction[0], -game.direction[1]):
+            continue
+        nx, ny = hx + d[0], hy + d[1]
+        if not (0 <= nx < ns.GRID_WIDTH and 0 <= ny < ns.GRID_HEIGHT):
+            continue
+        if (nx, ny) in blocked:
+            continue
+        dist = min((abs(fx - nx) + abs(fy - ny) for fx, fy in targets), default=0)
+        if best_d is None or dist < best_d:
+            best, best_d = d, dist
+    if best is None:
+        # 无路可走时尝试开幽灵模式保命
+        return "ghost" if (game.energy > 0 and not game.ghost_mode) else None
+    if ns.get_ticks() < game.reverse_controls_until:
+        # 腐烂苹果期间按键会被反转，这里先反一次抵消
+        best = (-best[0], -best[1])
+    return best
+
+
+def autopilot_policy(game):
+    """内置自动驾驶（BFS + 尾巴可达检查），在 update 内部直接决定方向"""
+    if game.autopilot is None:
+        game.toggle_autopilot()
+    return None
+
+
+BUILTIN_POLICIES = {
+    "random": random_policy,
+    "greedy": greedy_policy,
+    "autopilot": autopilot_policy,
+}
+
+
+def load_policy(spec):
+    if spec in BUILTIN_POLICIES:
+        return BUILTIN_POLICIES[spec]
+    module_name, _, attr = spec.partition(":")
+    if not attr:
+        raise ValueError(f"未知策略: {spec}（内置: {', '.join(BUILTIN_POLICIES)}，或使用 模块名:函数名）")
+    return getattr(importlib.import_module(module_name), attr)
+
+
+# -------------------- 单局模拟 --------------------
+def simulate_run(seed, policy, max_ms, step_ms=None):
+    """用手动时钟跑完一局，返回该局的汇总；step_ms 默认取当前的 ns.STEP_INTERVAL_MS（--set 覆盖后的值）"""
+    if step_ms is None:
+        step_ms = ns.STEP_INTERVAL_MS
+    clock = ns.ManualClock()
+    ns.set_tick_source(clock)
+    random.seed(seed)
+    game = ns.SnakeGame(headless=True)
+
+    steps = 0
+    max_length = len(game.snake)
+    while not game.game_over:
+        if game.get_run_elapsed_ms(clock.now) >= max_ms:
+            break
+        action = policy(game)
+        if action == "ghost":
+            game.toggle_ghost_mode()
+        elif action is not None:
+            game.press_direction(action, queue=False)
+        clock.advance(step_ms)
+        game.update()
+        steps += 1
+        max_length = max(max_length, len(game.snake))
+
+    return {
+        "seed": seed,
+        "score": game.score,
+        "survival_ms": game.get_run_elapsed_ms(clock.now),
+        "steps": steps,
+        "length": len(game.snake),
+        "max_length": max_length,
+        "food_eaten": game.normal_food_eaten,
+        "cause": game.game_over_reason if game.game_over else TIMEOUT_CAUSE,
+    }
+
+
+# -------------------- 进程池 --------------------
+_worker_policy = None
+
+
+def _init_worker(policy_spec, overrides, grid=None):
+    """子进程初始化：应用数值覆盖、地图大小并加载策略"""
+    global _worker_policy
+    for name, value in overrides:
+        setattr(ns, name, value)
+    if grid:
+        ns.configure_board(*grid)
+    _worker_policy = load_policy(policy_spec)
+
+
+def _run_chunk(seeds, max_ms):
+    return [simulate_run(seed, _worker_policy, max_ms) for seed in seeds]
+
+
+def parse_override(text):
+    name, sep, raw = text.partition("=")
+    name = name.strip()
+    if not sep or not hasattr(ns, name):
+        raise argparse.ArgumentTypeError(f"无效的数值覆盖: {text}（格式 NAME=VALUE，NAME 必须是 novel_snake 中的常量）")
+    try:
+        value = int(raw)
+    except ValueError:
+        try:
+            value = float(raw)
+        except ValueError:
+            value = raw
+    return name, value
+
+
+class ResultWriter:
+    """按行流式写结果；.parquet 按批写行组（需要 pyarrow），其余写 CSV"""
+    def __init__(self, path, batch_size=4096):
+        self.path = path
+        self.batch_size = batch_size
+        self.rows = []
+        self.parquet = path.endswith(".parquet")
+        if self.parquet:
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise SystemExit("写 .parquet 需要 pyarrow：pip install pyarrow（或改用 .csv）")
+            self._pa = pa
+            self._schema = pa.schema([
+                ("seed", pa.int64()),
+                ("score", pa.int64()),
+                ("survival_ms", pa.int64()),
+                ("steps", pa.int64()),
+                ("length", pa.int64()),
+                ("max_length", pa.int64()),
+                ("food_eaten", pa.int64()),
+                ("cause", pa.string()),
+            ])
+            self._writer = pq.ParquetWriter(path, self._schema)
+        else:
+            self._file = open(path, "w", encoding="utf-8", newline="")
+            self._writer = csv.DictWriter(self._file, fieldnames=RESULT_FIELDS)
+            self._writer.writeheader()
+
+    def write(self, row):
+        if self.parquet:
+            self.rows.append(row)
+            if len(self.rows) >= self.batch_size:
+                self._flush_parquet()
+        else:
+            self._writer.writerow(row)
+
+    def _flush_parquet(self):
+        if not self.rows:
+            return
+        columns = {name: [r[name] for r in self.rows] for name in RESULT_FIELDS}
+        self._writer.write_table(self._pa.table(columns, schema=self._schema))
+        self.rows = []
+
+    def close(self):
+        if self.parquet:
+            self._flush_parquet()
+            self._writer.close()
+        else:
+            self._file.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="无头批量模拟贪吃蛇对局")
+    parser.add_argument("--runs", type=int, default=1000, help="模拟局数")
+    parser.add_argument("--seed", type=int, default=0, help="起始种子，第 i 局使用 seed + i")
+    parser.add_argument("--workers", type=int, default=0, help="进程数，0 表示使用全部 CPU 核心")
+    parser.add_argument("--chunk", type=int, default=16, help="每个任务包含的局数")
+    parser.add_argument("--policy", default="greedy", help="策略：random / greedy / autopilot / 模块名:函数名")
+    parser.add_argument("--max-minutes", type=float, default=10.0, help="单局最长模拟时间（游戏内分钟）")
+    parser.add_argument("--out", default="sim_results.csv", help="结果文件（.csv 或 .parquet）")
+    parser.add_argument("--grid", type=ns.parse_grid_size, default=None, metavar="WxH", help="地图大小，例如 200x200")
+    parser.add_argument("--set", dest="overrides", action="append", type=parse_override, default=[],
+                        help="覆盖 novel_snake 中的常量，例如 --set BOSS_FOOD_THRESHOLD=5")
+    args = parser.parse_args(argv)
+
+    load_policy(args.policy)  # 提前校验，避免子进程里才报错
+    workers = args.workers or os.cpu_count() or 1
+    max_ms = int(args.max_minutes * 60_000)
+    chunk = max(1, args.chunk)
+    seeds = range(args.seed, args.seed + args.runs)
+    chunks = (seeds[i:i + chunk] for i in range(0, len(seeds), chunk))
+
+    writer = ResultWriter(args.out)
+    done = 0
+    score_sum = 0
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(args.policy, args.overrides, args.grid),
+        ) as pool:
+            in_flight = set()
+            # 限制在途任务数，百万局也不会一次性把任务全部堆进内存
+            max_in_flight = workers * 4
+            for seed_chunk in chunks:
+                if len(in_flight) >= max_in_flight:
+                    finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                    for fut in finished:
+                        for row in fut.result():
+                            writer.write(row)
+                            done += 1
+                            score_sum += row["score"]
+                    elapsed = time.perf_counter() - start
+                    print(f"\r{done}/{args.runs} 局  {done / max(elapsed, 1e-9):.0f} 局/秒", end="", file=sys.stderr)
+                in_flight.add(pool.submit(_run_chunk, list(seed_chunk), max_ms))
+            for fut in in_flight:
+                for row in fut.result():
+                    writer.write(row)
+                    done += 1
+                    score_sum += row["score"]
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"\r{done} 局完成，用时 {elapsed:.1f} 秒（{workers} 进程），平均分 {score_sum / max(1, done):.2f}", file=sys.stderr)
+    print(f"结果已写入 {args.out}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+import os
+import sys
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import novel_snake as ns
+
+
+def test_shadow_snakes_have_no_ttl_by_default():
+    """设计上影子蛇不会主动消失：默认只按数量上限清理"""
+    budget = ns.EntityBudget()
+    entries = [((i, 0), f"ss{i}", 0) for i in range(3)]
+    assert budget.pick(ns.SPATIAL_SHADOW, entries, now=10_000_000, head=(0, 0)) == []
+
+
+def test_soak_ttls_are_opt_in():
+    budget = ns.EntityBudget(ttls=ns.SOAK_ENTITY_TTLS)
+    ttl = ns.SOAK_ENTITY_TTLS[ns.SPATIAL_SHADOW]
+    entries = [((0, 0), "old", 0), ((1, 0), "new", ttl)]
+    assert budget.pick(ns.SPATIAL_SHADOW, entries, now=ttl, head=(0, 0)) == ["old"]
+    assert ns.ENTITY_BUDGETS[ns.SPATIAL_SHADOW][1] is None
+
+
+def test_autopilot_toggle_applies_and_restores_soak_ttls():
+    """F2 和 --autopilot 走同一个 toggle_autopilot：开启时用挂机存活时间，关闭后恢复默认"""
+    ns.set_tick_source(ns.ManualClock())
+    try:
+        game = ns.SnakeGame(headless=True)
+        ttl = ns.SOAK_ENTITY_TTLS[ns.SPATIAL_SHADOW]
+        game.toggle_autopilot()
+        assert game.entity_budget.budgets[ns.SPATIAL_SHADOW][1] == ttl
+        game.toggle_autopilot()
+        assert game.autopilot is None
+        assert game.entity_budget.budgets == ns.ENTITY_BUDGETS
+    finally:
+        ns.set_tick_source(None)
@@ -0,0 +1,60 @@
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import novel_snake as ns
+import snake_env
+
+UP, DOWN, LEFT, RIGHT = 0, 1, 2, 3
+
+
+def make_env():
+    env = snake_env.BatchSnakeEnv(num_envs=1, seed=0)
+    env.reset()
+    return env
+
+
+def test_env_actions_do_not_pile_up_during_slow_motion():
+    """减速期间蛇好几步不动，每步的动作只保留最新一个，不会排队晚几步才生效"""
+    env = make_env()
+    try:
+        game = env.games[0]
+        assert game.direction == (1, 0)
+        game.boss_kill_slow_until = env.clock.now + 10_000
+        head = game.snake[0]
+
+        for action in (UP, RIGHT, DOWN, LEFT):
+            env.step([action])
+            assert not game.input_queue
+
+        assert game.snake[0] == head  # 确认这几步里确实没有移动
+        # 最后一个 LEFT 相对当前方向是掉头，被忽略；生效的是最新的合法动作 DOWN
+        assert game.next_direction == (0, 1)
+
+        game.boss_kill_slow_until = 0
+        env.step([snake_env.ACTION_NOOP])
+        assert game.direction == (0, 1)
+        assert game.snake[0] == (head[0], head[1] + 1)
+    finally:
+        env.close()
+
+
+def test_keyboard_turns_still_queue():
+    """键盘：同一个移动间隔内连按两次转向，两次都按顺序生效"""
+    env = make_env()
+    try:
+        game = env.games[0]
+        game.press_direction((0, -1))
+        game.press_direction((-1, 0))
+        assert [d for d, _ in game.input_queue] == [(0, -1), (-1, 0)]
+
+        env.step([snake_env.ACTION_NOOP])
+        assert game.direction == (0, -1)
+        env.step([snake_env.ACTION_NOOP])
+        assert game.direction == (-1, 0)
+    finally:
+        env.close()
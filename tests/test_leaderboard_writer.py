@@ -0,0 +1,50 @@
+import os
+import sys
+import threading
+import time
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import novel_snake as ns
+
+
+def test_full_queue_never_writes_on_the_caller_thread():
+    """队列满时任务交给写线程补写，提交方不等磁盘；所有任务最终都写出"""
+    writer = ns.LeaderboardWriter(maxsize=1)
+    caller = threading.get_ident()
+    done = []
+    threads = set()
+
+    def job(i):
+        def run():
+            time.sleep(0.01)
+            threads.add(threading.get_ident())
+            done.append(i)
+        return run
+
+    try:
+        start = time.perf_counter()
+        for i in range(20):
+            writer.submit(("run", i), job(i))
+        assert time.perf_counter() - start < 0.05
+        writer.flush()
+        assert sorted(done) == list(range(20))
+        assert caller not in threads
+    finally:
+        writer.close()
+
+
+def test_same_key_is_coalesced():
+    writer = ns.LeaderboardWriter(maxsize=1)
+    gate = threading.Event()
+    done = []
+    try:
+        writer.submit("block", gate.wait)
+        for i in range(5):
+            writer.submit("json", lambda i=i: done.append(i))
+        gate.set()
+        writer.flush()
+        assert done == [4]
+    finally:
+        writer.close()
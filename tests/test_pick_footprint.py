@@ -0,0 +1,51 @@
+import os
+import random
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import novel_snake as ns
+
+
+@pytest.fixture
+def game():
+    clock = ns.ManualClock()
+    ns.set_tick_source(clock)
+    random.seed(0)
+    yield ns.SnakeGame(headless=True)
+    ns.set_tick_source(None)
+
+
+def brute_force(k, hard, soft):
+    """每个 k×k 窗口的代价：压到 hard 不合法，否则数压到的 soft 格子"""
+    costs = {}
+    for y in range(ns.GRID_HEIGHT - k + 1):
+        for x in range(ns.GRID_WIDTH - k + 1):
+            cells = {(x + i, y + j) for i in range(k) for j in range(k)}
+            if not cells & hard:
+                costs[(x, y)] = len(cells & soft)
+    return costs
+
+
+@pytest.mark.parametrize("k", [1, 3, 16, ns.GRID_WIDTH])
+def test_pick_footprint_returns_a_cheapest_window(game, k):
+    rng = random.Random(k)
+    cells = [(x, y) for x in range(ns.GRID_WIDTH) for y in range(ns.GRID_HEIGHT)]
+    for _ in range(20):
+        hard = set(rng.sample(cells, rng.randrange(0, 4)))
+        soft = set(rng.sample(cells, rng.randrange(0, 60))) - hard
+        costs = brute_force(k, hard, soft)
+        pos = game.pick_footprint(k, hard, soft)
+        if not costs:
+            assert pos is None
+        else:
+            assert costs.get(pos) == min(costs.values())
+
+
+def test_pick_footprint_too_large(game):
+    assert game.pick_footprint(ns.GRID_WIDTH + 1, set(), set()) is None
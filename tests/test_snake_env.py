@@ -0,0 +1,36 @@
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import snake_env
+
+
+def test_observations_are_not_overwritten_by_later_steps():
+    """默认返回副本：存下来的观测不会被下一次 step 原地改掉"""
+    env = snake_env.BatchSnakeEnv(num_envs=2, seed=0)
+    try:
+        first = env.reset()
+        saved = {k: v.copy() for k, v in first.items()}
+        second, _, _, _ = env.step(np.full(2, snake_env.ACTION_NOOP))
+        assert second["board"] is not first["board"]
+        assert second["features"] is not first["features"]
+        for k in saved:
+            np.testing.assert_array_equal(first[k], saved[k])
+    finally:
+        env.close()
+
+
+def test_copy_obs_false_returns_internal_arrays():
+    env = snake_env.BatchSnakeEnv(num_envs=1, seed=0, copy_obs=False)
+    try:
+        first = env.reset()
+        second, _, _, _ = env.step([snake_env.ACTION_NOOP])
+        assert second["board"] is first["board"] is env.board
+    finally:
+        env.close()
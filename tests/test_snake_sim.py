@@ -0,0 +1,45 @@
+import argparse
+import csv
+import os
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import novel_snake as ns
+import snake_sim
+
+
+def test_step_interval_override_reaches_simulate_run(monkeypatch):
+    """--set STEP_INTERVAL_MS=... 在导入之后才生效，simulate_run 要用覆盖后的值"""
+    monkeypatch.setattr(ns, "STEP_INTERVAL_MS", 40)
+    try:
+        row = snake_sim.simulate_run(seed=1, policy=lambda game: None, max_ms=400)
+    finally:
+        ns.set_tick_source(None)
+    assert row["steps"] > 0
+    assert row["survival_ms"] == row["steps"] * 40
+
+
+def test_main_writes_one_csv_row_per_run(tmp_path):
+    out = tmp_path / "r.csv"
+    snake_sim.main(["--runs", "4", "--workers", "1", "--max-minutes", "0.05", "--out", str(out)])
+    with open(out, encoding="utf-8", newline="") as f:
+        reader = csv.DictReader(f)
+        rows = list(reader)
+    assert reader.fieldnames == snake_sim.RESULT_FIELDS
+    assert sorted(int(r["seed"]) for r in rows) == [0, 1, 2, 3]
+
+
+def test_parse_override():
+    assert snake_sim.parse_override("BOSS_FOOD_THRESHOLD=5") == ("BOSS_FOOD_THRESHOLD", 5)
+    assert snake_sim.parse_override(" STEP_INTERVAL_MS = 1.5") == ("STEP_INTERVAL_MS", 1.5)
+    assert snake_sim.parse_override("LEADERBOARD_BACKEND=sqlite") == ("LEADERBOARD_BACKEND", "sqlite")
+    with pytest.raises(argparse.ArgumentTypeError):
+        snake_sim.parse_override("NOT_A_CONSTANT=1")
+    with pytest.raises(argparse.ArgumentTypeError):
+        snake_sim.parse_override("BOSS_FOOD_THRESHOLD")
@@ -0,0 +1,57 @@
+import os
+import random
+import sys
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import novel_snake as ns
+import snake_sim
+
+
+def assert_index_matches(game):
+    for kind in ns.SPATIAL_OBJECT_KINDS:
+        expected = {}
+        for obj in game.entity_list(kind):
+            for pos, key in game.entity_cells(kind, obj):
+                expected[key] = pos
+        assert game.spatial.where.get(kind, {}) == expected, kind
+
+
+def test_index_follows_spawn_move_and_despawn():
+    """实体在生成 / 移动 / 消失时自己登记，任何时刻索引都和实体列表一致"""
+    clock = ns.ManualClock()
+    ns.set_tick_source(clock)
+    policy = snake_sim.load_policy("autopilot")
+    try:
+        random.seed(3)
+        game = ns.SnakeGame(headless=True)
+        for step in range(1500):
+            if game.game_over:
+                break
+            action = policy(game)
+            if action == "ghost":
+                game.toggle_ghost_mode()
+            elif action is not None:
+                game.press_direction(action, queue=False)
+            clock.advance(ns.STEP_INTERVAL_MS)
+            game.update()
+            if step % 10 == 0:
+                assert_index_matches(game)
+        assert_index_matches(game)
+    finally:
+        ns.set_tick_source(None)
+
+
+def test_spikes_spawned_together_never_share_a_cell():
+    ns.set_tick_source(ns.ManualClock())
+    try:
+        for seed in range(20):
+            random.seed(seed)
+            game = ns.SnakeGame(headless=True)
+            cells = [sp.pos for sp in game.spikes]
+            assert len(cells) == len(set(cells))
+    finally:
+        ns.set_tick_source(None)